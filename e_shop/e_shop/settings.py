@@ -37,6 +37,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_API",
     "rest_framework",
     "rest_framework.authtoken",
@@ -44,11 +45,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Метрики запросов для /metrics/ (rest_API/instrumentation.py); первым, чтобы учитывать весь стек
+    "rest_API.instrumentation.PerformanceMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    # Чтение с основной базы после записи (rest_API/replicas.py); без реплик отключается
+    "rest_API.replicas.ReplicaPinMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -88,6 +93,59 @@ DATABASES = {
     }
 }
 
+# Реплики только для чтения (rest_API/replicas.py): хосты через запятую в DB_REPLICA_HOSTS.
+# Без них все запросы идут в "default"; отдельные тестовые базы для реплик не создаются (MIRROR).
+DATABASE_REPLICAS = []
+for number, host in enumerate(filter(None, os.environ.get("DB_REPLICA_HOSTS", "").split(",")), 1):
+    DATABASES[f"replica{number}"] = {**DATABASES["default"], "HOST": host.strip(), "TEST": {"MIRROR": "default"}}
+    DATABASE_REPLICAS.append(f"replica{number}")
+
+DATABASE_ROUTERS = ["rest_API.replicas.ReplicaRouter"]
+REPLICA_PIN_SECONDS = 5  # секунд чтения из основной базы после записи; должно превышать отставание реплик
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Кэш ответов каталога (rest_API/cache.py); при недоступности Redis используется "local"
+    "catalog": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": "redis://localhost:6379/2",
+        "OPTIONS": {"socket_connect_timeout": 0.5, "socket_timeout": 0.5},
+    },
+    "local": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "catalog-fallback",
+    },
+    # Общий кэш токенов аутентификации (rest_API/authentication.py)
+    "auth": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": "redis://localhost:6379/3",
+        "OPTIONS": {"socket_connect_timeout": 0.5, "socket_timeout": 0.5},
+    },
+    # Закрепление чтений за основной базой после записи (rest_API/replicas.py)
+    "routing": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": "redis://localhost:6379/4",
+        "OPTIONS": {"socket_connect_timeout": 0.5, "socket_timeout": 0.5},
+    },
+}
+
+CATALOG_CACHE_TIMEOUT = 10 * 60  # секунд
+CATALOG_CACHE_FALLBACK_TIMEOUT = 5  # секунд; локальный кэш не видит версий других процессов
+
+PERF_METRICS_SAMPLE_RATE = 1.0  # доля запросов с замерами; 0 - middleware отключена
+PERF_SLOW_REQUEST_MS = 500  # запросы дольше пишутся в журнал вместе с SQL
+PERF_SLOW_SQL_LIMIT = 5  # самых долгих SQL-запросов в записи журнала
+
+AUTH_TOKEN_CACHE_TIMEOUT = 60  # секунд в Redis
+AUTH_TOKEN_LOCAL_TIMEOUT = 5  # секунд в памяти процесса; инвалидация не доходит до других процессов
+AUTH_TOKEN_LOCAL_SIZE = 10000  # токенов в LRU процесса
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -137,10 +195,75 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 
+CELERY_BEAT_SCHEDULE = {
+    'inventory-flush': {
+        'task': 'rest_API.tasks.flush_inventory',
+        'schedule': 5.0,
+    },
+    'inventory-release-expired': {
+        'task': 'rest_API.tasks.release_expired_reservations',
+        'schedule': 60.0,
+    },
+    'inventory-reconcile': {
+        'task': 'rest_API.tasks.reconcile_inventory',
+        'schedule': 15 * 60.0,
+    },
+    'order-emails': {
+        'task': 'rest_API.tasks.send_order_emails',
+        'schedule': 10.0,
+    },
+    'order-events': {
+        'task': 'rest_API.tasks.publish_order_events',
+        'schedule': 30.0,
+    },
+    'create-partitions': {
+        'task': 'rest_API.tasks.create_partitions',
+        'schedule': 24 * 60 * 60.0,
+    },
+    'archive-orders': {
+        'task': 'rest_API.tasks.archive_orders',
+        'schedule': 24 * 60 * 60.0,
+    },
+}
+
+# Резервирование остатков в Redis (rest_API/inventory.py)
+INVENTORY_RESERVATIONS_ENABLED = False
+INVENTORY_REDIS_URL = 'redis://localhost:6379/1'
+INVENTORY_RESERVATION_TTL = 15 * 60  # секунд
+INVENTORY_FLUSH_BATCH_SIZE = 500
+
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 DEFAULT_FROM_EMAIL = 'admin@e-shop.com'
 
+# Очередь писем по заказам (rest_API/emails.py)
+EMAIL_OUTBOX_BATCH_SIZE = 100
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_RETRY_DELAY = 60  # секунд до первой повторной попытки, далее вдвое больше
+
+# Публикация событий заказов (rest_API/events.py)
+ORDER_EVENTS_BATCH_SIZE = 500
+ORDER_EVENTS_ASYNC_RELAY = True  # False - публиковать в потоке запроса сразу после коммита
+
+# Массовая переоценка (rest_API/repricing.py)
+REPRICING_CHUNK_SIZE = 5000  # товаров в одной транзакции
+
+# Секционирование по месяцам (rest_API/partitions.py)
+PARTITION_MONTHS_AHEAD = 3  # секций, создаваемых заранее после текущего месяца
+
+# Архивирование заказов (rest_API/archive.py)
+ORDER_ARCHIVE_AFTER_MONTHS = 24  # месяцы старше этого выгружаются в файлы и удаляются из БД
+ORDER_ARCHIVE_DIR = BASE_DIR / 'archive'
+
+# Списки админки для больших таблиц (rest_API/pagination.py, EstimatedCountPaginator):
+# при оценке от этого числа строк точный COUNT(*) не выполняется
+ADMIN_EXACT_COUNT_LIMIT = 100_000
+
 REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_API.authentication.CachedTokenAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+    ],
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
 
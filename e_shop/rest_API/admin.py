@@ -1,26 +1,66 @@
 from django.contrib import admin
-from django.urls import path
+from django.urls import path, reverse
 from django.shortcuts import render, redirect
 from django.contrib import messages
-from .models import Supplier, Product, Cart, Contact, Order
-from .forms import ProductAdminForm, BulkUpdateForm
+from django.db import transaction
+from .models import Supplier, Product, Cart, Contact, Order, RepricingJob
+from .forms import ProductAdminForm, RepricingForm
+from .pagination import EstimatedCountPaginator
+from .replicas import choose_replica, replica_reads
+from .repricing import cancel_job, preview, start_job
+from .search import build_search_query
 
-@admin.action(description="Массовое обновление цен")
-def bulk_update_price(modeladmin, request, queryset):
-    # Здесь логика обновления цены. Для примера:
-    queryset.update(price=1000)
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Список для таблиц на миллионы строк: число строк берется из оценки Postgres
+    (EstimatedCountPaginator), без второго COUNT(*) по всей таблице, сортировка только
+    по индексированным колонкам. Поиск: число - по id, иначе search_by_text.
+    Список (GET) читается с реплики, если администратор недавно ничего не менял (см. replicas.py).
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    sortable_by = ['id']
+    search_help_text = "Число - поиск по id"
+
+    def changelist_view(self, request, extra_context=None):
+        if request.method != 'GET':
+            return super().changelist_view(request, extra_context)
+        with replica_reads(choose_replica(request.user)):
+            response = super().changelist_view(request, extra_context)
+            # Шаблон читает строки списка при отрисовке - она должна пройти на той же базе
+            if hasattr(response, 'render'):
+                response.render()
+        return response
+
+    def search_by_text(self, queryset, term):
+        return queryset.none()
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        if term.isdigit():
+            return queryset.filter(pk=int(term)), False
+        return self.search_by_text(queryset, term), False
 
 @admin.register(Supplier)
 class SupplierAdmin(admin.ModelAdmin):
     list_display = [field.name for field in Supplier._meta.fields]
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(LargeTableAdmin):
     form = ProductAdminForm
-    list_display = [field.name for field in Product._meta.fields]
+    list_display = ['id', 'title', 'supplier', 'category', 'price', 'quantity', 'is_active']
+    list_select_related = ['supplier', 'category']
+    list_filter = ['is_active', 'supplier']
+    sortable_by = ['id', 'price']
+    search_fields = ['title']
+    search_help_text = "Число - поиск по id, иначе полнотекстовый поиск по названию и описанию"
 
-    # Подключаем экшен
-    actions = [bulk_update_price]
+    def search_by_text(self, queryset, term):
+        query = build_search_query(term)
+        return queryset.filter(search_vector=query) if query is not None else queryset.none()
 
     def get_urls(self):
         urls = super().get_urls()
@@ -30,36 +70,121 @@ class ProductAdmin(admin.ModelAdmin):
         return custom_urls + urls
 
     def changelist_view(self, request, extra_context=None):
-        print("=== ProductAdmin changelist_view called ===")
         extra_context = extra_context or {}
         extra_context['bulk_update_url'] = 'bulk-update/'
         return super().changelist_view(request, extra_context=extra_context)
 
     def bulk_update_view(self, request):
+        """
+        Массовая переоценка: кнопка "Предпросмотр" показывает итоги правила,
+        "Запустить" создает задачу переоценки и открывает страницу с ее ходом.
+        """
+        preview_totals = None
         if request.method == 'POST':
-            form = BulkUpdateForm(request.POST)
+            form = RepricingForm(request.POST)
             if form.is_valid():
-                new_price = form.cleaned_data['new_price']
-                updated_count = Product.objects.update(price=new_price)
-                self.message_user(request, f"Обновлено товаров: {updated_count}")
-                return redirect("..")
+                if 'start' in request.POST:
+                    with transaction.atomic():
+                        job = form.save()
+                        start_job(job)
+                    self.message_user(request, f"Переоценка {job} запущена: товаров {job.total}")
+                    return redirect(reverse('admin:rest_API_repricingjob_change', args=[job.id]))
+                preview_totals = preview(form.save(commit=False))
         else:
-            form = BulkUpdateForm()
+            form = RepricingForm()
         context = dict(
             self.admin_site.each_context(request),
             form=form,
-            title="Массовое обновление цен товаров",
+            preview=preview_totals,
+            title="Массовая переоценка товаров",
         )
         return render(request, "admin/bulk_update.html", context)
 
 @admin.register(Cart)
-class CartAdmin(admin.ModelAdmin):
-    list_display = [field.name for field in Cart._meta.fields]
+class CartAdmin(LargeTableAdmin):
+    list_display = ['id', 'owner']
+    list_select_related = ['owner']
+    raw_id_fields = ['owner']
+    search_fields = ['owner__username']
+    search_help_text = "Число - поиск по id, иначе точное имя пользователя"
+
+    def search_by_text(self, queryset, term):
+        return queryset.filter(owner__username=term)
 
 @admin.register(Contact)
 class ContactAdmin(admin.ModelAdmin):
     list_display = [field.name for field in Contact._meta.fields]
+    list_select_related = ['user']
+    raw_id_fields = ['user']
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
-    list_display = [field.name for field in Order._meta.fields]
\ No newline at end of file
+class OrderAdmin(LargeTableAdmin):
+    list_display = ['id', 'buyer', 'status', 'total_amount', 'item_count', 'created_timestamp']
+    list_select_related = ['buyer']
+    # Таблица секционирована по created_timestamp: фильтр по дате читает только секции периода
+    list_filter = ['status', 'created_timestamp']
+    ordering = ['-created_timestamp', '-id']
+    sortable_by = ['created_timestamp']
+    raw_id_fields = ['buyer', 'contact_info']
+    search_fields = ['buyer__username']
+    search_help_text = "Число - поиск по id, иначе точное имя покупателя"
+
+    def search_by_text(self, queryset, term):
+        return queryset.filter(buyer__username=term)
+
+
+@admin.register(RepricingJob)
+class RepricingJobAdmin(admin.ModelAdmin):
+    """
+    Задачи переоценки: ход выполнения и предпросмотр для черновиков.
+    """
+    RULE_FIELDS = ['base', 'percent', 'rounding', 'supplier', 'category', 'parameters']
+    PROGRESS_FIELDS = ['status', 'progress_display', 'total', 'processed', 'updated', 'last_id', 'error',
+                       'created_at', 'started_at', 'finished_at']
+
+    form = RepricingForm
+    list_display = ['id', '__str__', 'supplier', 'status', 'progress_display', 'updated', 'created_at']
+    list_select_related = ['supplier']
+    list_filter = ['status']
+    actions = ['start_jobs', 'cancel_jobs']
+
+    def get_fields(self, request, obj=None):
+        if obj is None:
+            return self.RULE_FIELDS
+        return [*self.RULE_FIELDS, *self.PROGRESS_FIELDS, 'preview_display']
+
+    def get_readonly_fields(self, request, obj=None):
+        if obj is None:
+            return []
+        if obj.status == RepricingJob.DRAFT:
+            return [*self.PROGRESS_FIELDS, 'preview_display']
+        return [*self.RULE_FIELDS, *self.PROGRESS_FIELDS, 'preview_display']
+
+    @admin.display(description="Выполнено")
+    def progress_display(self, obj):
+        return f"{obj.progress}% ({obj.processed} из {obj.total})"
+
+    @admin.display(description="Предпросмотр")
+    def preview_display(self, obj):
+        if obj.status != RepricingJob.DRAFT:
+            return "-"
+        totals = preview(obj)
+        return (
+            f"Товаров: {totals['products']}, изменится: {totals['changed']} "
+            f"(выше: {totals['raised']}, ниже: {totals['lowered']}), "
+            f"сумма цен: {totals['old_total'] or 0} -> {totals['new_total'] or 0} ({totals['change_percent']:+}%)"
+        )
+
+    @admin.action(description="Запустить переоценку")
+    def start_jobs(self, request, queryset):
+        started = 0
+        with transaction.atomic():
+            for job in queryset.select_for_update().exclude(status__in=[RepricingJob.RUNNING, RepricingJob.DONE]):
+                start_job(job)
+                started += 1
+        self.message_user(request, f"Запущено задач: {started}")
+
+    @admin.action(description="Отменить переоценку")
+    def cancel_jobs(self, request, queryset):
+        canceled = sum(cancel_job(job) for job in queryset)
+        self.message_user(request, f"Отменено задач: {canceled}")
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'rest_API'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .instrumentation import instrument_connections, instrument_serializers
+
+        instrument_connections()
+        instrument_serializers()
@@ -0,0 +1,121 @@
+"""
+Архивирование старых заказов.
+
+Заказы и их позиции секционированы по месяцам created_timestamp (partitions.py). Месяцы
+старше ORDER_ARCHIVE_AFTER_MONTHS выгружаются в ORDER_ARCHIVE_DIR файлами
+orders-YYYYMM.jsonl.gz (строка - заказ с позициями), после чего секции месяца
+отсоединяются от таблиц и удаляются - без DELETE по строкам и без раздувания таблиц.
+
+Месяц архивируется в одной транзакции: секции блокируются от записи на время выгрузки,
+отсоединяются и удаляются только после того, как файл записан. При ошибке транзакция
+откатывается, секции остаются на месте, а следующий запуск перезапишет файл.
+
+Сводка заказов (OrderSummary) при архивировании не меняется, письма и события
+архивированных заказов остаются в своих таблицах.
+"""
+import logging
+import os
+import re
+from datetime import date
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .export import encode_export
+from .partitions import list_partitions
+
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_TABLES = ('rest_API_order', 'rest_API_orderitem')
+ARCHIVE_CHUNK_SIZE = 2000
+PARTITION_MONTH_RE = re.compile(r'_p(\d{4})(\d{2})$')
+
+ARCHIVE_QUERY = """
+SELECT jsonb_build_object(
+    'id', o.id, 'buyer', o.buyer_id, 'contact_info', o.contact_info_id, 'status', o.status,
+    'created_timestamp', o.created_timestamp, 'updated_timestamp', o.updated_timestamp,
+    'total_amount', o.total_amount, 'item_count', o.item_count,
+    'items', coalesce((
+        SELECT jsonb_agg(
+            jsonb_build_object('id', item.id, 'product', item.product_id, 'quantity', item.quantity,
+                               'price', item.price)
+            ORDER BY item.id
+        )
+        FROM {items} item WHERE item.order_id = o.id
+    ), '[]'::jsonb)
+)::text
+FROM {orders} o
+ORDER BY o.id
+"""
+
+
+def archivable_months(after_months=None, today=None):
+    """
+    Месяцы (первые числа), секции которых старше after_months полных месяцев.
+    """
+    after_months = settings.ORDER_ARCHIVE_AFTER_MONTHS if after_months is None else after_months
+    today = today or timezone.now().date()
+    cutoff = today.year * 12 + today.month - 1 - after_months
+    months = []
+    for name, _ in list_partitions(ARCHIVE_TABLES[0]):
+        match = PARTITION_MONTH_RE.search(name)
+        if match and int(match[1]) * 12 + int(match[2]) - 1 < cutoff:
+            months.append(date(int(match[1]), int(match[2]), 1))
+    return months
+
+
+def archive_path(month, directory=None):
+    return os.path.join(directory or settings.ORDER_ARCHIVE_DIR, f'orders-{month:%Y%m}.jsonl.gz')
+
+
+def _archive_lines(orders, items):
+    cursor = connection.chunked_cursor()
+    try:
+        cursor.execute(ARCHIVE_QUERY.format(orders=orders, items=items))
+        while rows := cursor.fetchmany(ARCHIVE_CHUNK_SIZE):
+            yield ''.join(f'{row[0]}\n' for row in rows)
+    finally:
+        cursor.close()
+
+
+def archive_month(month, directory=None):
+    """
+    Выгружает заказы месяца в файл и удаляет их секции. Возвращает (путь, число заказов).
+    """
+    path = archive_path(month, directory)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    quote = connection.ops.quote_name
+    partitions = [f'{table}_p{month:%Y%m}' for table in ARCHIVE_TABLES]
+    orders, items = (quote(name) for name in partitions)
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            # Отложенные проверки внешних ключей не дают удалить секцию в той же транзакции
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+            cursor.execute(f'LOCK TABLE {orders}, {items} IN SHARE MODE')
+            cursor.execute(f'SELECT count(*) FROM {orders}')
+            count = cursor.fetchone()[0]
+
+        temporary = f'{path}.tmp'
+        with open(temporary, 'wb') as file:
+            for data in encode_export(_archive_lines(orders, items), compress=True):
+                file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, path)
+
+        with connection.cursor() as cursor:
+            for table, partition in zip(ARCHIVE_TABLES, partitions):
+                cursor.execute(f'ALTER TABLE {quote(table)} DETACH PARTITION {quote(partition)}')
+                cursor.execute(f'DROP TABLE {quote(partition)}')
+    logger.info(f"Заказы за {month:%Y-%m} ({count}) перенесены в архив {path}")
+    return path, count
+
+
+def archive_orders(after_months=None, directory=None):
+    """
+    Архивирует все месяцы старше after_months. Возвращает [(месяц, путь, число заказов), ...].
+    """
+    return [(month, *archive_month(month, directory)) for month in archivable_months(after_months)]
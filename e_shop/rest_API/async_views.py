@@ -0,0 +1,125 @@
+"""
+Асинхронные (ASGI) эндпоинты каталога только для чтения.
+
+Представления - обычные async-функции Django: запросы к базе выполняются через
+асинхронный ORM (aiterator, aget), поэтому под ASGI (e_shop.asgi.application)
+ожидание Postgres не занимает поток воркера. Списки отдаются потоком JSON:
+строки сериализуются пачками по мере чтения курсора и не накапливаются в памяти.
+
+Формат ответа совпадает с синхронными /products/ и /suppliers/, но страницы
+списка товаров задаются параметром after=<id> (keyset по id), ссылка на следующую
+страницу - в поле next в конце ответа.
+"""
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+
+from .models import Product, Supplier
+from .search import search_products
+from .serializers import ProductSerializer, SupplierSerializer
+
+
+PRODUCT_FIELDS = ProductSerializer.Meta.fields
+SUPPLIER_FIELDS = SupplierSerializer.Meta.fields
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+SEARCH_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+STREAM_CHUNK_SIZE = 100  # строк на одно чтение курсора и один фрагмент ответа
+
+
+def _encode(row):
+    return json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False)
+
+
+async def stream_results(rows, next_url=None, limit=None):
+    """
+    Отдает {"results": [...], "next": ...} по частям. next_url(последняя строка) строит
+    ссылку на следующую страницу, если прочитано limit строк.
+    """
+    yield '{"results": ['
+    count, last, chunk = 0, None, []
+    async for row in rows.aiterator(chunk_size=STREAM_CHUNK_SIZE):
+        chunk.append(_encode(row))
+        count, last = count + 1, row
+        if len(chunk) == STREAM_CHUNK_SIZE:
+            yield (',' if count > len(chunk) else '') + ','.join(chunk)
+            chunk = []
+    if chunk:
+        yield (',' if count > len(chunk) else '') + ','.join(chunk)
+    next_link = next_url(last) if next_url is not None and limit is not None and count == limit else None
+    yield f'], "next": {_encode(next_link)}}}'
+
+
+def _int_param(request, name, default, maximum=None):
+    raw = request.GET.get(name)
+    if raw in (None, ''):
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        raise ValueError(f'{name} должен быть числом')
+    if value < 0:
+        raise ValueError(f'{name} должен быть неотрицательным')
+    return min(value, maximum) if maximum else value
+
+
+def _bad_request(exc):
+    return JsonResponse({'error': str(exc)}, status=400)
+
+
+def _products():
+    return Product.objects.filter(is_active=True)
+
+
+async def product_list(request):
+    """
+    Список активных товаров по возрастанию id; параметры supplier, after, page_size.
+    """
+    try:
+        after = _int_param(request, 'after', 0)
+        page_size = max(_int_param(request, 'page_size', PAGE_SIZE, MAX_PAGE_SIZE), 1)
+        supplier_id = _int_param(request, 'supplier', None)
+    except ValueError as exc:
+        return _bad_request(exc)
+
+    queryset = _products().filter(id__gt=after)
+    if supplier_id is not None:
+        queryset = queryset.filter(supplier_id=supplier_id)
+    rows = queryset.order_by('id').values(*PRODUCT_FIELDS)[:page_size]
+
+    def next_url(last):
+        params = request.GET.copy()
+        params['after'] = last['id']
+        return request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
+
+    return StreamingHttpResponse(stream_results(rows, next_url, page_size), content_type='application/json')
+
+
+async def product_detail(request, pk):
+    try:
+        product = await _products().values(*PRODUCT_FIELDS).aget(id=pk)
+    except Product.DoesNotExist:
+        raise Http404
+    return JsonResponse(product, json_dumps_params={'ensure_ascii': False})
+
+
+async def product_search(request):
+    """
+    Полнотекстовый поиск (см. search.py); параметры q и limit.
+    """
+    text = request.GET.get('q', '').strip()
+    if not text:
+        return _bad_request('Не указан поисковый запрос q')
+    try:
+        limit = max(_int_param(request, 'limit', SEARCH_LIMIT, SEARCH_MAX_LIMIT), 1)
+    except ValueError as exc:
+        return _bad_request(exc)
+    rows = search_products(_products(), text).values(*PRODUCT_FIELDS)[:limit]
+    return StreamingHttpResponse(stream_results(rows), content_type='application/json')
+
+
+async def supplier_list(request):
+    rows = Supplier.objects.order_by('id').values(*SUPPLIER_FIELDS)
+    return StreamingHttpResponse(stream_results(rows), content_type='application/json')
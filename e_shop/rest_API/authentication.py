@@ -0,0 +1,195 @@
+"""
+Аутентификация по токену с кэшем.
+
+TokenAuthentication из DRF на каждый запрос читает authtoken_token вместе с auth_user.
+CachedTokenAuthentication сначала ищет токен в двух уровнях кэша:
+
+- локальный LRU процесса (AUTH_TOKEN_LOCAL_SIZE записей, TTL AUTH_TOKEN_LOCAL_TIMEOUT);
+- общий Redis (CACHES['auth'], TTL AUTH_TOKEN_CACHE_TIMEOUT).
+
+Кэшируются только действующие токены активных пользователей. Удаление токена,
+изменение и удаление пользователя (смена пароля, деактивация) удаляют запись из
+Redis и локального кэша своего процесса (см. signals.py); локальные кэши других
+процессов устаревают не позже чем через AUTH_TOKEN_LOCAL_TIMEOUT секунд.
+Если Redis недоступен, общий уровень пропускается на FALLBACK_RETRY_AFTER секунд.
+
+Удаление из Redis выполняется всегда, без учета этой паузы. Если оно не удалось, процесс
+запоминает ключи и не берет токены из Redis, пока удаление не пройдет при повторе
+(не чаще раза в INVALIDATION_RETRY_AFTER секунд), - отозванный токен не примется из кэша.
+Записи в Redis живут не дольше AUTH_TOKEN_CACHE_TIMEOUT, поэтому ключи хранятся не дольше.
+"""
+import logging
+import pickle
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.authentication import TokenAuthentication
+
+from .cache import FALLBACK_RETRY_AFTER
+
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'auth:token:'
+INVALIDATION_RETRY_AFTER = 1  # секунд между повторами неудавшегося удаления из Redis
+
+
+class TokenCache:
+    """
+    Двухуровневый кэш токенов со счетчиками попаданий и промахов.
+    Записи хранятся в pickle, поэтому каждый запрос получает свой экземпляр пользователя.
+    """
+    def __init__(self, alias='auth'):
+        self.alias = alias
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = Counter()
+        self._shared_down_until = 0.0
+        self._pending = {}  # ключ Redis -> момент, после которого запись в Redis точно истекла
+        self._pending_retry_at = 0.0
+
+    def _shared(self, method, *args):
+        if self._shared_down_until > time.monotonic():
+            return None
+        try:
+            return getattr(caches[self.alias], method)(*args)
+        except Exception as exc:
+            logger.warning(f"Кэш токенов в Redis недоступен: {exc}")
+            self._shared_down_until = time.monotonic() + FALLBACK_RETRY_AFTER
+            return None
+
+    def _delete_shared(self, keys):
+        """
+        Удаляет ключи из Redis без учета паузы после ошибок. Неудаленные ключи
+        запоминаются, и до их удаления токены из Redis не берутся.
+        """
+        now = time.monotonic()
+        try:
+            caches[self.alias].delete_many(keys)
+        except Exception as exc:
+            with self._lock:
+                if any(key not in self._pending for key in keys):
+                    logger.error(f"Отозванные токены не удалены из Redis, общий кэш отключен до повтора: {exc}")
+                for key in keys:
+                    self._pending.setdefault(key, now + settings.AUTH_TOKEN_CACHE_TIMEOUT)
+                self._pending_retry_at = now + INVALIDATION_RETRY_AFTER
+            self._shared_down_until = now + FALLBACK_RETRY_AFTER
+            return False
+        with self._lock:
+            for key in keys:
+                self._pending.pop(key, None)
+        return True
+
+    def _shared_trusted(self):
+        """
+        Можно ли брать токены из Redis: да, если нет неудаленных отозванных токенов.
+        """
+        if not self._pending:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            for key, expires in list(self._pending.items()):
+                if expires <= now:
+                    del self._pending[key]
+            keys = list(self._pending)
+            if not keys or self._pending_retry_at > now:
+                return not keys
+            self._pending_retry_at = now + INVALIDATION_RETRY_AFTER
+        if not self._delete_shared(keys):
+            return False
+        self._shared_down_until = 0.0
+        return not self._pending
+
+    def _set_local(self, key, data):
+        with self._lock:
+            self._local[key] = (time.monotonic() + settings.AUTH_TOKEN_LOCAL_TIMEOUT, data)
+            self._local.move_to_end(key)
+            while len(self._local) > settings.AUTH_TOKEN_LOCAL_SIZE:
+                self._local.popitem(last=False)
+
+    def get(self, key):
+        """
+        Возвращает токен (с загруженным пользователем) или None.
+        """
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._local[key]
+                entry = None
+            if entry is not None:
+                self._local.move_to_end(key)
+                self._counters['local_hits'] += 1
+                return pickle.loads(entry[1])
+
+        data = self._shared('get', KEY_PREFIX + key) if self._shared_trusted() else None
+        if data is None:
+            with self._lock:
+                self._counters['misses'] += 1
+            return None
+        self._set_local(key, data)
+        with self._lock:
+            self._counters['shared_hits'] += 1
+        return pickle.loads(data)
+
+    def set(self, token):
+        data = pickle.dumps(token, pickle.HIGHEST_PROTOCOL)
+        self._set_local(token.key, data)
+        self._shared('set', KEY_PREFIX + token.key, data, settings.AUTH_TOKEN_CACHE_TIMEOUT)
+
+    def invalidate(self, keys):
+        """
+        Удаляет токены из кэша сразу и еще раз после коммита: запрос, прочитавший
+        токен до коммита, мог успеть положить в кэш старые данные. Из Redis токены
+        удаляются всегда, даже если он недавно был недоступен.
+        """
+        keys = list(keys)
+        if not keys:
+            return
+
+        def delete():
+            with self._lock:
+                for key in keys:
+                    self._local.pop(key, None)
+            self._delete_shared([KEY_PREFIX + key for key in keys])
+
+        delete()
+        transaction.on_commit(delete)
+
+    def clear(self):
+        """
+        Сбрасывает состояние процесса: локальный уровень, счетчики, отметку о недоступности Redis
+        и неудаленные из него ключи.
+        """
+        with self._lock:
+            self._local.clear()
+            self._counters.clear()
+            self._shared_down_until = 0.0
+            self._pending.clear()
+            self._pending_retry_at = 0.0
+
+    def stats(self):
+        with self._lock:
+            stats = {name: self._counters[name] for name in ('local_hits', 'shared_hits', 'misses')}
+        lookups = sum(stats.values())
+        stats['hit_ratio'] = (stats['local_hits'] + stats['shared_hits']) / lookups if lookups else 0.0
+        return stats
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication, которая обращается к базе только при промахе кэша.
+    """
+    def authenticate_credentials(self, key):
+        token = token_cache.get(key)
+        if token is not None:
+            return token.user, token
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(token)
+        return user, token
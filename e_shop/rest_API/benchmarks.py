@@ -0,0 +1,503 @@
+"""
+Бенчмарки горячих путей магазина.
+
+Сценарий - функция, зарегистрированная декоратором @scenario, которая готовит
+данные и возвращает список Measurement. Команда `manage.py benchmark` запускает
+сценарии внутри транзакции, которая в конце откатывается, поэтому рабочие данные
+не изменяются.
+
+Результаты можно сохранить как базовые (save_baseline) и сравнивать с ними
+последующие прогоны (compare_with_baseline): рост числа запросов и падение
+пропускной способности сверх допуска считаются регрессией. p50 зависит от машины,
+поэтому сравнивается только по запросу (check_latency) с базовыми результатами,
+записанными там же, где идет проверка.
+"""
+import json
+import os
+import statistics
+import tempfile
+import time
+import uuid
+from dataclasses import dataclass, field
+
+import yaml
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Q
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APIRequestFactory
+
+from .authentication import CachedTokenAuthentication, token_cache
+from .importer import ProductImporter
+from .carts import cart_items, get_cart, set_item
+from .checkout import checkout
+from .models import CartItem, Contact, Product, Supplier
+from .replicas import pins, routed_reads
+from .search import search_products
+from .tasks import flush_inventory
+from .views import ContactView, ProductViewSet
+
+
+SCENARIOS = {}
+
+
+def scenario(name):
+    """
+    Регистрирует сценарий бенчмарка под заданным именем.
+    """
+    def decorator(func):
+        SCENARIOS[name] = func
+        return func
+    return decorator
+
+
+@dataclass
+class Measurement:
+    """
+    Результат замера: длительности прогонов (в секундах), число SQL-запросов
+    за прогон и число строк, обрабатываемых за прогон (для строк в секунду).
+    notes - дополнительные строки отчета, в базовые результаты не попадают.
+    """
+    name: str
+    samples: list = field(default_factory=list)
+    queries: int = 0
+    rows: int = 0
+    notes: list = field(default_factory=list)
+
+    def percentile(self, percent):
+        ordered = sorted(self.samples)
+        if not ordered:
+            return 0.0
+        index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+    @property
+    def p50(self):
+        return statistics.median(self.samples) if self.samples else 0.0
+
+    @property
+    def p99(self):
+        return self.percentile(99)
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.p50 if self.rows and self.p50 else 0.0
+
+    def as_dict(self):
+        return {'p50': self.p50, 'p99': self.p99, 'queries': self.queries, 'rows_per_sec': self.rows_per_sec}
+
+    def __str__(self):
+        throughput = f", {self.rows_per_sec:.0f} строк/с" if self.rows else ''
+        return (
+            f"{self.name}: p50 {self.p50 * 1000:.2f} мс, p99 {self.p99 * 1000:.2f} мс, "
+            f"запросов {self.queries}, прогонов {len(self.samples)}{throughput}"
+        )
+
+
+def measure(name, func, repeat=10, setup=None, rows=0):
+    """
+    Выполняет func repeat раз (перед каждым прогоном - setup) и замеряет время и запросы.
+    """
+    result = Measurement(name, rows=rows)
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            func()
+            result.samples.append(time.perf_counter() - started)
+        result.queries = len(queries)
+    return result
+
+
+def save_baseline(path, measurements):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump({measurement.name: measurement.as_dict() for measurement in measurements}, file,
+                  ensure_ascii=False, indent=2, sort_keys=True)
+        file.write('\n')
+
+
+def load_baseline(path):
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def compare_with_baseline(measurements, baseline, tolerance=0.2, noise=0.001, check_latency=False):
+    """
+    Возвращает описания регрессий относительно базовых результатов: больше SQL-запросов
+    или строк в секунду меньше на tolerance. С check_latency также p50 выше базового больше
+    чем на tolerance (и больше чем на noise секунд - быстрые замеры шумят). Замеры, которых
+    нет в базовых результатах, не проверяются.
+    """
+    regressions = []
+    for measurement in measurements:
+        base = baseline.get(measurement.name)
+        if base is None:
+            continue
+        if measurement.queries > base['queries']:
+            regressions.append(f"{measurement.name}: запросов {measurement.queries} (было {base['queries']})")
+        if check_latency and measurement.p50 > base['p50'] * (1 + tolerance) and measurement.p50 - base['p50'] > noise:
+            regressions.append(
+                f"{measurement.name}: p50 {measurement.p50 * 1000:.2f} мс (было {base['p50'] * 1000:.2f} мс)"
+            )
+        if base['rows_per_sec'] and measurement.rows_per_sec < base['rows_per_sec'] * (1 - tolerance):
+            regressions.append(
+                f"{measurement.name}: {measurement.rows_per_sec:.0f} строк/с (было {base['rows_per_sec']:.0f})"
+            )
+    return regressions
+
+
+def make_user(prefix='bench'):
+    return User.objects.create_user(username=f'{prefix}-{uuid.uuid4().hex[:12]}', password=None)
+
+
+def make_supplier():
+    return Supplier.objects.create(name=f'bench-{uuid.uuid4().hex[:8]}')
+
+
+BRANDS = ['Apple', 'Samsung', 'Xiaomi', 'Huawei', 'Honor', 'Realme', 'Sony', 'LG', 'Philips', 'Vizio']
+KINDS = ['Смартфон', 'Телевизор', 'Планшет', 'Ноутбук', 'Наушники', 'Флешка', 'Чехол', 'Кабель']
+COLORS = ['черный', 'белый', 'красный', 'синий', 'золотистый', 'серебристый', 'зеленый']
+
+
+def generate_catalog(supplier, rows):
+    """
+    Заполняет каталог поставщика синтетическими товарами одним INSERT ... SELECT generate_series.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO "rest_API_product"
+                (title, description, supplier_id, external_id, price, quantity, parameters, is_active, fingerprint)
+            SELECT
+                kinds[1 + n %% array_length(kinds, 1)] || ' ' || brands[1 + (n / 7) %% array_length(brands, 1)]
+                    || ' модель ' || n || ' (' || colors[1 + (n / 3) %% array_length(colors, 1)] || ')',
+                'Описание товара ' || n || ': ' || colors[1 + n %% array_length(colors, 1)] || ' корпус, гарантия '
+                    || (1 + n %% 3) || ' года',
+                %s, n, 100 + (n * 37) %% 200000, n %% 50,
+                jsonb_build_object(
+                    'Цвет', colors[1 + (n / 3) %% array_length(colors, 1)],
+                    'Встроенная память (Гб)', (ARRAY[32, 64, 128, 256, 512])[1 + n %% 5],
+                    'Диагональ (дюйм)', 5 + (n %% 60) / 10.0
+                ),
+                true, ''
+            FROM generate_series(1, %s) AS n,
+                 (SELECT %s::text[] AS kinds, %s::text[] AS brands, %s::text[] AS colors) AS words
+            """,
+            [supplier.id, rows, KINDS, BRANDS, COLORS],
+        )
+        cursor.execute('ANALYZE "rest_API_product"')
+
+
+def generate_orders(supplier, users, orders_per_user, items_per_order=2):
+    """
+    Создает users покупателей с контактом и корзиной и по orders_per_user заказов;
+    позиции заказов и корзин - товары поставщика. Возвращает id созданных пользователей.
+    """
+    prefix = f'bench-{uuid.uuid4().hex[:8]}'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO auth_user (password, is_superuser, username, first_name, last_name, email,
+                                   is_staff, is_active, date_joined)
+            SELECT '!', false, %s || '-' || n, '', '', '', false, true, now()
+            FROM generate_series(1, %s) AS n
+            RETURNING id
+            """,
+            [prefix, users],
+        )
+        user_ids = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            """
+            INSERT INTO "rest_API_contact" (user_id, fname, lname, email, phone, address)
+            SELECT id, 'Bench', 'User', 'bench@example.com', '+70000000000', '-' FROM unnest(%s::int[]) AS id;
+            INSERT INTO "rest_API_cart" (owner_id) SELECT id FROM unnest(%s::int[]) AS id;
+            """,
+            [user_ids, user_ids],
+        )
+        cursor.execute(
+            """
+            INSERT INTO "rest_API_order"
+                (buyer_id, contact_info_id, created_timestamp, updated_timestamp, status, total_amount, item_count)
+            SELECT contact.user_id, contact.id, now() - n * interval '1 hour', now(),
+                   (ARRAY['pending', 'confirmed', 'shipped', 'delivered', 'canceled'])[1 + n %% 5],
+                   %s * 100, %s
+            FROM "rest_API_contact" AS contact, generate_series(1, %s) AS n
+            WHERE contact.user_id = ANY(%s)
+            """,
+            [items_per_order, items_per_order, orders_per_user, user_ids],
+        )
+        cursor.execute(
+            """
+            INSERT INTO "rest_API_orderitem" (order_id, product_id, quantity, price, created_timestamp)
+            SELECT o.id, product.id, 1, 100, o.created_timestamp
+            FROM "rest_API_order" AS o
+            CROSS JOIN LATERAL (
+                SELECT id FROM "rest_API_product" WHERE supplier_id = %s
+                ORDER BY id OFFSET o.id %% 100 LIMIT %s
+            ) AS product
+            WHERE o.buyer_id = ANY(%s);
+
+            INSERT INTO "rest_API_cartitem" (cart_id, product_id, quantity)
+            SELECT cart.id, product.id, 1
+            FROM "rest_API_cart" AS cart
+            CROSS JOIN LATERAL (
+                SELECT id FROM "rest_API_product" WHERE supplier_id = %s
+                ORDER BY id OFFSET cart.id %% 100 LIMIT %s
+            ) AS product
+            WHERE cart.owner_id = ANY(%s);
+            """,
+            [supplier.id, items_per_order, user_ids, supplier.id, items_per_order, user_ids],
+        )
+        cursor.execute('ANALYZE')
+    return user_ids
+
+
+@scenario('checkout')
+def checkout_scenario(repeat=10, sizes=(1, 10, 100), **options):
+    """
+    Оформление заказа из корзин разного размера: число запросов не должно зависеть от размера.
+    """
+    user = make_user()
+    contact = Contact.objects.create(user=user, fname='Bench', lname='User', email='bench@example.com',
+                                     phone='+70000000000', address='-')
+    supplier = make_supplier()
+    products = Product.objects.bulk_create([
+        Product(title=f'Bench product {number}', description='', supplier=supplier,
+                price=100, quantity=repeat * 10, parameters={})
+        for number in range(max(sizes))
+    ])
+
+    cart = get_cart(user)
+    results = []
+    for size in sizes:
+        def fill_cart(size=size):
+            CartItem.objects.bulk_create([CartItem(cart=cart, product=product, quantity=1) for product in products[:size]])
+
+        results.append(measure(f'checkout[{size}]', lambda: checkout(user, cart, contact), repeat, fill_cart))
+    return results
+
+
+@scenario('cart')
+def cart_scenario(repeat=10, sizes=(1, 10, 100), **options):
+    """
+    Операции с корзиной: добавление нового товара, изменение количества уже добавленного
+    и чтение корзины разного размера (число запросов чтения не должно зависеть от размера).
+    """
+    user = make_user()
+    supplier = make_supplier()
+    products = Product.objects.bulk_create([
+        Product(title=f'Bench product {number}', description='', supplier=supplier,
+                price=100, quantity=1000, parameters={})
+        for number in range(max(sizes) + repeat)
+    ])
+    cart = get_cart(user)
+
+    added = iter(products[max(sizes):])
+    results = [
+        measure('cart-add', lambda: set_item(cart, next(added).id, 1), repeat),
+        measure('cart-update', lambda: set_item(cart, products[0].id, 2), repeat),
+    ]
+    for size in sizes:
+        CartItem.objects.filter(cart=cart).delete()
+        CartItem.objects.bulk_create([CartItem(cart=cart, product=product, quantity=1) for product in products[:size]])
+        results.append(measure(f'cart-get[{size}]', lambda: list(cart_items(cart)), repeat))
+    return results
+
+
+@scenario('search')
+def search_scenario(repeat=10, rows=None, **options):
+    """
+    Полнотекстовый поиск по search_vector против сканирования title/description через icontains.
+    """
+    supplier = make_supplier()
+    generate_catalog(supplier, rows or 1_000_000)
+    products = Product.objects.filter(supplier=supplier, is_active=True).only('id', 'title', 'price')
+
+    results = []
+    for term in ('смартфон samsung', 'золотист', 'модель 123456'):
+        results.append(measure(f'search-fts[{term}]', lambda term=term: list(search_products(products, term)[:20]), repeat))
+        condition = Q()
+        for word in term.split():
+            condition &= Q(title__icontains=word) | Q(description__icontains=word)
+        results.append(measure(f'search-icontains[{term}]', lambda condition=condition: list(
+            products.filter(condition).order_by('id')[:20]
+        ), repeat))
+    return results
+
+
+@scenario('auth')
+def auth_scenario(repeat=10, **options):
+    """
+    GET /contacts/ с токеном: TokenAuthentication (запрос токена в базу на каждый вызов)
+    против CachedTokenAuthentication с прогретым кэшем.
+    """
+    user = make_user()
+    Contact.objects.create(user=user, fname='Bench', lname='User', email='bench@example.com',
+                           phone='+70000000000', address='-')
+    token = Token.objects.create(user=user)
+    request = APIRequestFactory().get('/contacts/', HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    token_cache.clear()
+    results = []
+    for name, authentication in (('auth-db', TokenAuthentication), ('auth-cached', CachedTokenAuthentication)):
+        view = ContactView.as_view(authentication_classes=[authentication])
+        view(request)  # прогрев; для auth-cached - первый промах, заполняющий кэш
+        results.append(measure(name, lambda view=view: view(request), repeat))
+    results[-1].notes.append(f"попаданий в кэш токенов {token_cache.stats()['hit_ratio']:.0%}")
+    return results
+
+
+@scenario('browse')
+def browse_scenario(repeat=10, rows=None, **options):
+    """
+    Просмотр каталога через API: страницы списка (по id, по цене, по поставщику, с фильтром
+    по атрибуту) и карточка товара. Уникальный параметр _ обходит кэш ответов; замер
+    browse-cached - повтор одного и того же запроса из кэша.
+    """
+    supplier = make_supplier()
+    generate_catalog(supplier, rows or 100_000)
+    product = Product.objects.filter(supplier=supplier).order_by('id').first()
+    # Ссылки на страницы строятся по Host, он должен быть разрешен в ALLOWED_HOSTS
+    factory = APIRequestFactory(SERVER_NAME=settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost')
+    list_view = ProductViewSet.as_view({'get': 'list'})
+    detail_view = ProductViewSet.as_view({'get': 'retrieve'})
+
+    def get(view, path, params, **kwargs):
+        response = view(factory.get(path, params), **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+
+    def uncached(view, path, params, **kwargs):
+        return lambda: get(view, path, {**params, '_': uuid.uuid4().hex}, **kwargs)
+
+    pages = {
+        'browse-list': {},
+        'browse-price': {'ordering': '-price'},
+        'browse-supplier': {'supplier': supplier.id},
+        'browse-filter': {'param.Цвет': 'черный', 'price_max': 50000},
+    }
+    results = [measure(name, uncached(list_view, '/products/', params), repeat) for name, params in pages.items()]
+    results.append(measure('browse-detail', uncached(detail_view, f'/products/{product.id}/', {}, pk=product.id), repeat))
+    get(list_view, '/products/', {})
+    results.append(measure('browse-cached', lambda: get(list_view, '/products/', {}), repeat))
+    return results
+
+
+@scenario('replica')
+def replica_scenario(repeat=10, rows=None, buyers=5, **options):
+    """
+    Нагрузка на основную базу при чтении с реплик (replicas.py). Прогон: каждый покупатель
+    открывает общий список товаров, товары другого поставщика, список поставщиков и свои
+    заказы, затем первый из них оформляет заказ (при резервировании остатки сразу
+    списываются в базу, как задача flush_inventory) и снова читает каталог. Заказ меняет
+    остатки, поэтому общий список товаров следующего прогона читается из основной базы.
+    replica-off - без реплик, replica-on - с DATABASE_REPLICAS; queries - число чтений,
+    выполненных основной базой за прогон (записи не учитываются).
+
+    Если реплики не настроены, роль реплики играет сама основная база - замер показывает,
+    сколько чтений ушло бы с основной базы, но не выигрыш по времени. Закрепления после
+    записи хранятся в CACHES['routing']: если он недоступен, все чтения идут в основную базу.
+    """
+    supplier = make_supplier()
+    generate_catalog(supplier, rows or 1000)
+    other_supplier = make_supplier()
+    generate_catalog(other_supplier, 100)
+    users = list(User.objects.filter(id__in=generate_orders(supplier, users=buyers, orders_per_user=2)).order_by('id'))
+    contact = Contact.objects.get(user=users[0])
+    product = Product.objects.filter(supplier=supplier).order_by('id').first()
+    Product.objects.filter(id=product.id).update(quantity=2 * repeat + 10)
+    server_name = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost'
+
+    def workload(replicas):
+        # Клиент создается внутри override_settings: middleware закрепления читает настройки при загрузке
+        with override_settings(DATABASE_REPLICAS=replicas):
+            pins.clear()
+            clients = []
+            for user in users:
+                client = APIClient(SERVER_NAME=server_name)
+                client.force_authenticate(user)
+                clients.append(client)
+            primary_reads = []
+
+            def run():
+                before = routed_reads().get('primary', 0)
+                for client in clients:
+                    client.get('/products/', {'_': uuid.uuid4().hex})
+                    client.get('/products/', {'supplier': other_supplier.id, '_': uuid.uuid4().hex})
+                    client.get('/suppliers/', {'_': uuid.uuid4().hex})
+                    client.get('/orders/')
+                clients[0].post('/cart/', {'product': product.id, 'quantity': 1}, format='json')
+                # Сценарий идет в откатываемой транзакции: обработчики on_commit (смена версий кэша
+                # и закрепление каталога) выполняются сразу, как после настоящего коммита
+                with TestCase.captureOnCommitCallbacks(execute=True):
+                    clients[0].post('/orders/confirm/', {'contact_id': contact.id}, format='json')
+                    flush_inventory()
+                clients[0].get('/products/', {'_': uuid.uuid4().hex})
+                primary_reads.append(routed_reads().get('primary', 0) - before)
+
+            result = measure(f'replica-{"on" if replicas else "off"}', run, repeat)
+            result.queries = primary_reads[-1]
+            return result
+
+    return [workload([]), workload(settings.DATABASE_REPLICAS or [DEFAULT_DB_ALIAS])]
+
+
+def write_feed(path, shop, rows):
+    """
+    Записывает синтетический прайс-лист в формате data/shop1.yaml.
+    """
+    goods = [
+        {
+            'id': number,
+            'category': 1 + number % 5,
+            'name': f'{KINDS[number % len(KINDS)]} {BRANDS[number // 7 % len(BRANDS)]} модель {number}',
+            'price': 100 + number * 37 % 200000,
+            'price_rrc': 120 + number * 37 % 200000,
+            'quantity': number % 50,
+            'parameters': {
+                'Цвет': COLORS[number // 3 % len(COLORS)],
+                'Встроенная память (Гб)': [32, 64, 128, 256, 512][number % 5],
+                'Диагональ (дюйм)': 5 + number % 60 / 10,
+            },
+        }
+        for number in range(1, rows + 1)
+    ]
+    categories = [{'id': number, 'name': f'Категория {number}'} for number in range(1, 6)]
+    with open(path, 'w', encoding='utf-8') as file:
+        yaml.safe_dump({'shop': shop, 'categories': categories, 'goods': goods}, file,
+                       allow_unicode=True, sort_keys=False)
+
+
+@scenario('import')
+def import_scenario(repeat=3, rows=None, **options):
+    """
+    Импорт прайс-листа: первичная загрузка (все товары новые), повторный импорт
+    без изменений и синхронизация по отпечаткам; результат - строк в секунду.
+    """
+    rows = rows or 10_000
+    shop = f'bench-{uuid.uuid4().hex[:8]}'
+    handle, path = tempfile.mkstemp(suffix='.yaml')
+    os.close(handle)
+    try:
+        write_feed(path, shop, rows)
+        importer = ProductImporter()
+
+        def rename_previous():
+            # Следующий прогон создает нового поставщика и все товары заново
+            Supplier.objects.filter(name=shop).update(name=f'{shop}-{uuid.uuid4().hex[:8]}')
+
+        return [
+            measure('import-create', lambda: importer.import_path(path), repeat, rename_previous, rows=rows),
+            measure('import-unchanged', lambda: importer.import_path(path), repeat, rows=rows),
+            measure('import-sync', lambda: importer.import_path(path, sync=True), repeat, rows=rows),
+        ]
+    finally:
+        os.remove(path)
@@ -0,0 +1,210 @@
+"""
+Кэш ответов каталога с версионными ключами.
+
+Ключ ответа включает путь, параметры запроса и текущие версии данных, от которых ответ
+зависит: общую версию каталога, версию каталога поставщика (для ?supplier=) или версию
+списка поставщиков. Любое изменение товаров поставщика увеличивает его версию и общую
+версию после коммита транзакции - старые записи перестают запрашиваться и вытесняются
+по TTL, поэтому кэш никогда не сбрасывается целиком. По той же версии строится ETag.
+
+Основное хранилище - Redis (CACHES['catalog']); если он недоступен, используется
+локальный кэш процесса с коротким TTL. Новые версии всегда записываются в Redis: если
+запись не удалась, после восстановления Redis меняется общая версия GENERATION, которая
+входит в каждый ключ, - так устаревают ответы, сохраненные другими процессами.
+"""
+import hashlib
+import logging
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+
+from . import replicas
+
+
+logger = logging.getLogger(__name__)
+
+VERSION_PREFIX = 'catalog:version:'
+ALL_PRODUCTS = 'products'
+SUPPLIERS = 'suppliers'
+GENERATION = 'generation'  # общая версия всех ответов
+FALLBACK_RETRY_AFTER = 30  # секунд до повторной попытки обратиться к Redis
+GENERATION_RETRY_AFTER = 1  # секунд между попытками сменить общую версию после сбоя
+
+
+def supplier_scope(supplier_id):
+    return f'supplier:{supplier_id}'
+
+
+class CatalogCache:
+    """
+    Обертка над двумя кэшами: при ошибке основного на FALLBACK_RETRY_AFTER секунд
+    используется запасной локальный кэш.
+    """
+    def __init__(self, primary='catalog', fallback='local', generation_key=VERSION_PREFIX + GENERATION):
+        self.primary = primary
+        self.fallback = fallback
+        self.generation_key = generation_key
+        self._primary_down_until = 0.0
+        self._generation_pending = False
+        self._generation_retry_at = 0.0
+
+    def _backend(self):
+        if self._primary_down_until > time.monotonic():
+            return caches[self.fallback], True
+        return caches[self.primary], False
+
+    def _call(self, method, *args, **kwargs):
+        if self._generation_pending and self._generation_retry_at <= time.monotonic():
+            self._bump_generation()
+        backend, is_fallback = self._backend()
+        if is_fallback:
+            return getattr(backend, method)(*args, **kwargs), True
+        try:
+            return getattr(backend, method)(*args, **kwargs), False
+        except Exception as exc:
+            logger.warning(f"Кэш каталога недоступен, используется локальный: {exc}")
+            self._primary_down_until = time.monotonic() + FALLBACK_RETRY_AFTER
+            return getattr(caches[self.fallback], method)(*args, **kwargs), True
+
+    def get(self, key):
+        return self._call('get', key)[0]
+
+    def get_many(self, keys):
+        return self._call('get_many', keys)[0]
+
+    def set(self, key, value, timeout):
+        _, is_fallback = self._backend()
+        if is_fallback and timeout is not None:
+            timeout = min(timeout, settings.CATALOG_CACHE_FALLBACK_TIMEOUT)
+        self._call('set', key, value, timeout)
+
+    def add(self, key, value, timeout):
+        return self._call('add', key, value, timeout)[0]
+
+    def clear(self):
+        self._call('clear')
+
+    def set_versions(self, versions):
+        """
+        Записывает новые версии в оба кэша. В Redis запись идет всегда, даже если процесс
+        сейчас работает с локальным кэшем: версия, измененная только локально, не видна
+        другим процессам. При ошибке общая версия меняется, как только Redis ответит.
+        """
+        caches[self.fallback].set_many(versions, None)
+        try:
+            caches[self.primary].set_many(versions, None)
+        except Exception as exc:
+            if not self._generation_pending:
+                logger.error(
+                    f"Версии кэша каталога не записаны в Redis, другие процессы могут отдавать старые ответы: {exc}"
+                )
+            self._primary_down_until = time.monotonic() + FALLBACK_RETRY_AFTER
+            self._generation_pending = True
+
+    def _bump_generation(self):
+        try:
+            caches[self.primary].set(self.generation_key, uuid.uuid4().hex, None)
+        except Exception:
+            self._generation_retry_at = time.monotonic() + GENERATION_RETRY_AFTER
+            return
+        logger.info("Redis снова доступен, общая версия кэша каталога сменена")
+        self._generation_pending = False
+        self._primary_down_until = 0.0
+
+
+catalog_cache = CatalogCache()
+
+
+def get_versions(scopes):
+    """
+    Возвращает текущие версии областей кэша; отсутствующие версии создаются.
+    Версия - случайный токен, а не счетчик, поэтому вытеснение ключа версии
+    не может вернуть к жизни старые записи. Первой всегда идет общая версия GENERATION.
+    """
+    keys = [VERSION_PREFIX + scope for scope in [GENERATION, *scopes]]
+    versions = catalog_cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            catalog_cache.add(key, uuid.uuid4().hex, None)
+            versions[key] = catalog_cache.get(key) or uuid.uuid4().hex
+    return [versions[key] for key in keys]
+
+
+def bump_versions(scopes):
+    catalog_cache.set_versions({VERSION_PREFIX + scope: uuid.uuid4().hex for scope in scopes})
+
+
+def invalidate_catalog(supplier_ids=(), suppliers=False):
+    """
+    Делает устаревшими ответы о товарах указанных поставщиков (и общие списки товаров).
+    suppliers=True - также список поставщиков.
+
+    Версии меняются сразу и еще раз после коммита транзакции: иначе параллельный запрос,
+    прочитавший данные до коммита, мог бы сохранить их под уже новой версией. По той же
+    причине перед второй сменой версий чтения измененных областей закрепляются за основной
+    базой: отстающая реплика еще может вернуть старые данные (см. replicas.py).
+    """
+    scopes = [ALL_PRODUCTS, *(supplier_scope(supplier_id) for supplier_id in set(supplier_ids))]
+    if suppliers:
+        scopes.append(SUPPLIERS)
+    bump_versions(scopes)
+    transaction.on_commit(lambda: _bump_after_commit(scopes))
+
+
+def _bump_after_commit(scopes):
+    replicas.pin_catalog(scopes)
+    bump_versions(scopes)
+
+
+class CachedResponseMixin:
+    """
+    Кэширует успешные GET-ответы представления с версионным ключом и поддерживает ETag / 304.
+
+    Наследник определяет get_cache_scopes(request, kwargs) - список областей, от версий
+    которых зависит ответ.
+    """
+    cache_timeout = None
+
+    def get_cache_scopes(self, request, kwargs):
+        raise NotImplementedError
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+
+        versions = get_versions(self.get_cache_scopes(request, kwargs))
+        fingerprint = '|'.join([
+            request.path,
+            '&'.join(f'{key}={value}' for key, value in sorted(request.GET.lists())),
+            request.META.get('HTTP_ACCEPT', ''),
+            *versions,
+        ])
+        digest = hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()
+        etag = f'"{digest}"'
+        if etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            return response
+
+        cache_key = f'catalog:response:{digest}'
+        cached = catalog_cache.get(cache_key)
+        if cached is not None:
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+            response['ETag'] = etag
+            response['X-Cache'] = 'HIT'
+            return response
+
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming:
+            if hasattr(response, 'render'):
+                response.render()
+            catalog_cache.set(cache_key, (response.content, response['Content-Type']),
+                              self.cache_timeout or settings.CATALOG_CACHE_TIMEOUT)
+            response['ETag'] = etag
+            response['X-Cache'] = 'MISS'
+        return response
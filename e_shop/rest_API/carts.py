@@ -0,0 +1,97 @@
+"""
+Корзина покупателя.
+
+У пользователя одна корзина (Cart.owner - OneToOne), позиция корзины уникальна
+по (cart, product). Добавление и изменение количества - один
+INSERT ... ON CONFLICT (cart_id, product_id) DO UPDATE, без предварительного
+чтения позиции, поэтому параллельные запросы не создают дублей.
+
+При INVENTORY_RESERVATIONS_ENABLED изменение позиции одновременно резервирует
+остаток в Redis (см. inventory.py); если остатка не хватает, изменение откатывается.
+"""
+from django.db import transaction
+
+from .inventory import ReservationError, get_inventory, reservations_enabled
+from .models import Cart, CartItem, Product
+
+
+class CartError(Exception):
+    """
+    Изменение корзины невозможно.
+    """
+    def __init__(self, message, details=None):
+        super().__init__(message)
+        self.message = message
+        self.details = details or {}
+
+
+class ProductUnavailableError(CartError):
+    def __init__(self, product_id):
+        super().__init__("Товар не найден или снят с продажи.", {'product': product_id})
+
+
+class InsufficientStockError(CartError):
+    def __init__(self, product_id, requested, available):
+        super().__init__("Недостаточно товара на складе.",
+                         {'product': product_id, 'requested': requested, 'available': available})
+
+
+def get_cart(user):
+    """
+    Возвращает корзину пользователя, создавая ее при первом обращении.
+    """
+    cart, _ = Cart.objects.get_or_create(owner=user)
+    return cart
+
+
+def cart_items(cart):
+    """
+    Позиции корзины вместе с названием и ценой товара - один запрос.
+    """
+    return (
+        CartItem.objects.filter(cart=cart)
+        .select_related('product')
+        .only('id', 'quantity', 'product__id', 'product__title', 'product__price')
+        .order_by('id')
+    )
+
+
+def set_item(cart, product_id, quantity):
+    """
+    Устанавливает количество товара в корзине (позиция создается или обновляется)
+    и возвращает позицию.
+    """
+    product = Product.objects.filter(id=product_id, is_active=True).only('id', 'title', 'price').first()
+    if product is None:
+        raise ProductUnavailableError(product_id)
+
+    with transaction.atomic():
+        item, = CartItem.objects.bulk_create(
+            [CartItem(cart=cart, product=product, quantity=quantity)],
+            update_conflicts=True,
+            unique_fields=['cart', 'product'],
+            update_fields=['quantity'],
+        )
+        if reservations_enabled():
+            try:
+                get_inventory().reserve(cart.id, product.id, quantity)
+            except ReservationError as exc:
+                raise InsufficientStockError(product.id, quantity, exc.available)
+    return item
+
+
+def remove_item(cart, product_id=None):
+    """
+    Удаляет товар из корзины (без product_id - очищает корзину). Возвращает число удаленных позиций.
+    """
+    items = CartItem.objects.filter(cart=cart)
+    if product_id is not None:
+        items = items.filter(product_id=product_id)
+    deleted, _ = items.delete()
+    if deleted and reservations_enabled():
+        inventory = get_inventory()
+        if product_id is None:
+            inventory.release(cart.id)
+        else:
+            inventory.reserve(cart.id, product_id, 0)
+    return deleted
@@ -0,0 +1,124 @@
+"""
+Оформление заказа из корзины.
+
+Весь checkout выполняется в одной транзакции за постоянное число запросов,
+независимо от размера корзины: строки товаров блокируются (SELECT ... FOR UPDATE)
+в порядке id, остатки проверяются и уменьшаются одним UPDATE, позиции заказа
+создаются одним INSERT, корзина очищается одним DELETE, письмо покупателю
+ставится в очередь (emails.py) и записывается событие order_confirmed (events.py)
+в той же транзакции.
+
+При INVENTORY_RESERVATIONS_ENABLED остатки списываются в Redis (см. inventory.py),
+строки Product не блокируются, а Product.quantity обновляется фоновой задачей.
+"""
+from django.db import models, transaction
+from django.db.models import Case, F, When
+
+from .cache import invalidate_catalog
+from .emails import enqueue_order_email
+from .events import record_event
+from .inventory import ReservationError, get_inventory, reservations_enabled
+from .models import CartItem, Order, OrderEvent, OrderItem, Product
+
+
+class CheckoutError(Exception):
+    """
+    Заказ не может быть оформлен.
+    """
+    def __init__(self, message, details=None):
+        super().__init__(message)
+        self.message = message
+        self.details = details or []
+
+
+class EmptyCartError(CheckoutError):
+    def __init__(self):
+        super().__init__("Корзина пуста.")
+
+
+class InsufficientStockError(CheckoutError):
+    def __init__(self, shortages):
+        super().__init__("Недостаточно товара на складе.", shortages)
+
+
+def checkout(user, cart, contact):
+    """
+    Создает заказ по содержимому корзины и возвращает его.
+
+    Бросает EmptyCartError, если корзина пуста, и InsufficientStockError,
+    если какого-то товара не хватает (в этом случае база не изменяется).
+    """
+    use_reservations = reservations_enabled()
+    committed = None
+    try:
+        with transaction.atomic():
+            requested = {}
+            for product_id, quantity in CartItem.objects.filter(cart=cart).values_list('product_id', 'quantity'):
+                requested[product_id] = requested.get(product_id, 0) + quantity
+            if not requested:
+                raise EmptyCartError()
+
+            products = Product.objects.filter(id__in=requested).only('id', 'supplier_id', 'price', 'quantity', 'is_active')
+            if not use_reservations:
+                # Блокировка в порядке id исключает взаимные блокировки параллельных оформлений
+                products = products.select_for_update().order_by('id')
+            products = {product.id: product for product in products}
+            shortages = [
+                _shortage(product_id, quantity, products)
+                for product_id, quantity in requested.items()
+                if product_id not in products
+                or not products[product_id].is_active
+                or (not use_reservations and products[product_id].quantity < quantity)
+            ]
+            if shortages:
+                raise InsufficientStockError(shortages)
+
+            if use_reservations:
+                try:
+                    get_inventory().commit(cart.id, requested)
+                except ReservationError as exc:
+                    raise InsufficientStockError([
+                        {'product': exc.product_id, 'requested': requested[exc.product_id], 'available': exc.available}
+                    ])
+                committed = requested
+
+            order = Order.objects.create(
+                buyer=user, contact_info=contact, status='confirmed',
+                total_amount=sum(products[product_id].price * quantity for product_id, quantity in requested.items()),
+                item_count=sum(requested.values()),
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product_id=product_id, quantity=quantity, price=products[product_id].price,
+                          created_timestamp=order.created_timestamp)
+                for product_id, quantity in requested.items()
+            ])
+            if not use_reservations:
+                Product.objects.filter(id__in=requested).update(
+                    quantity=Case(
+                        *[When(id=product_id, then=F('quantity') - quantity)
+                          for product_id, quantity in requested.items()],
+                        default=F('quantity'),
+                        output_field=models.PositiveIntegerField(),
+                    )
+                )
+                # Остатки в каталоге изменились
+                invalidate_catalog({product.supplier_id for product in products.values()})
+            CartItem.objects.filter(cart=cart).delete()
+            # Письмо отправит задача send_order_emails, событие опубликует реле после коммита
+            enqueue_order_email(order.id, contact.email)
+            record_event(order, OrderEvent.ORDER_CONFIRMED, buyer=user.id,
+                         total_amount=str(order.total_amount), item_count=order.item_count)
+    except Exception:
+        if committed:
+            get_inventory().revert(committed)
+        raise
+    return order
+
+
+def _shortage(product_id, quantity, products):
+    product = products.get(product_id)
+    return {
+        'product': product_id,
+        'requested': quantity,
+        'available': product.quantity if product is not None and product.is_active else 0,
+    }
@@ -0,0 +1,140 @@
+"""
+Письма по заказам через outbox.
+
+Оформление заказа не отправляет письмо, а добавляет строку OrderEmail в той же
+транзакции. Периодическая задача send_order_emails выбирает готовые к отправке
+письма пачками (SELECT ... FOR UPDATE SKIP LOCKED, поэтому параллельные воркеры
+не берут одни и те же строки), рендерит их по шаблону с позициями и суммой заказа
+и отправляет всю пачку через одно соединение get_connection().
+
+Письмо, которое не удалось отправить, повторяется с экспоненциальной задержкой,
+после EMAIL_OUTBOX_MAX_ATTEMPTS попыток помечается как failed. Ключ идемпотентности
+не дает поставить одно письмо дважды, а отправленная строка больше не выбирается,
+поэтому повторная доставка задачи не приводит к повторной отправке.
+"""
+import hashlib
+import logging
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Prefetch
+from django.template.loader import get_template
+from django.utils import timezone
+
+from .models import OrderEmail, OrderItem
+
+
+logger = logging.getLogger(__name__)
+
+ORDER_CONFIRMED = 'emails/order_confirmed'
+ORDER_ITEMS = (
+    OrderItem.objects.select_related('product')
+    .only('id', 'order_id', 'quantity', 'price', 'product__id', 'product__title')
+    .order_by('id')
+)
+
+
+def idempotency_key(template, order_id, recipient):
+    return hashlib.sha1(f'{template}:{order_id}:{recipient}'.encode('utf-8')).hexdigest()
+
+
+def enqueue_order_email(order_id, recipient, template=ORDER_CONFIRMED):
+    """
+    Ставит письмо по заказу в очередь; повторный вызов с теми же аргументами ничего не делает.
+    """
+    OrderEmail.objects.bulk_create([
+        OrderEmail(order_id=order_id, recipient=recipient, template=template,
+                   idempotency_key=idempotency_key(template, order_id, recipient))
+    ], ignore_conflicts=True)
+
+
+@lru_cache(maxsize=None)
+def get_email_templates(name):
+    """
+    Шаблоны темы и текста письма; компилируются один раз на процесс.
+    """
+    return get_template(f'{name}_subject.txt'), get_template(f'{name}.txt')
+
+
+def render_email(email):
+    """
+    Собирает EmailMessage; позиции заказа должны быть выбраны заранее (см. drain_outbox).
+    """
+    subject_template, body_template = get_email_templates(email.template)
+    order = email.order
+    context = {'order': order, 'items': order.items.all(), 'contact': order.contact_info}
+    domain = settings.DEFAULT_FROM_EMAIL.rpartition('@')[2] or 'localhost'
+    return EmailMessage(
+        subject=subject_template.render(context).strip(),
+        body=body_template.render(context),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[email.recipient],
+        # Постоянный Message-ID позволяет почтовым системам отбросить дубль
+        headers={'Message-ID': f'<{email.idempotency_key}@{domain}>'},
+    )
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=settings.EMAIL_OUTBOX_RETRY_DELAY * 2 ** (attempts - 1))
+
+
+def drain_outbox(batch_size=None, now=None):
+    """
+    Отправляет одну пачку писем, срок отправки которых наступил.
+    Возвращает {'sent': n, 'retried': n, 'failed': n}.
+    """
+    batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+    now = now or timezone.now()
+    result = {'sent': 0, 'retried': 0, 'failed': 0}
+
+    with transaction.atomic():
+        emails = list(
+            OrderEmail.objects.filter(status=OrderEmail.PENDING, next_attempt_at__lte=now)
+            .select_for_update(skip_locked=True, of=('self',))
+            .select_related('order', 'order__contact_info')
+            .prefetch_related(Prefetch('order__items', queryset=ORDER_ITEMS))
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if not emails:
+            return result
+
+        mail_connection = get_connection()
+        try:
+            mail_connection.open()
+        except Exception as exc:
+            # Почтовый сервер недоступен: переносится вся пачка
+            for email in emails:
+                email.attempts += 1
+                _schedule_retry(email, exc, now, result)
+        else:
+            try:
+                for email in emails:
+                    email.attempts += 1
+                    try:
+                        mail_connection.send_messages([render_email(email)])
+                    except Exception as exc:
+                        _schedule_retry(email, exc, now, result)
+                    else:
+                        email.status = OrderEmail.SENT
+                        email.sent_at = now
+                        email.last_error = ''
+                        result['sent'] += 1
+            finally:
+                mail_connection.close()
+
+        OrderEmail.objects.bulk_update(emails, ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at'])
+    return result
+
+
+def _schedule_retry(email, exc, now, result):
+    logger.warning(f"Письмо {email.id} по заказу {email.order_id} не отправлено (попытка {email.attempts}): {exc}")
+    email.last_error = str(exc)
+    if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        email.status = OrderEmail.FAILED
+        result['failed'] += 1
+    else:
+        email.next_attempt_at = now + retry_delay(email.attempts)
+        result['retried'] += 1
@@ -0,0 +1,114 @@
+"""
+События заказов через transactional outbox.
+
+record_event пишет строку OrderEvent в той же транзакции, что и изменение заказа,
+поэтому событие появляется тогда и только тогда, когда изменение закоммичено.
+После коммита (transaction.on_commit) реле публикует накопившиеся события в Celery
+одним сообщением на пачку - задачу process_order_events. Реле работает в фоновом
+потоке, поэтому время ответа API не зависит от брокера; если брокер недоступен,
+события остаются неопубликованными и их отправит периодическая задача
+publish_order_events.
+
+Доставка "хотя бы один раз": при сбое между отправкой пачки и отметкой published_at
+пачка будет отправлена повторно, получатели различают события по id.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from celery import current_app
+from django.conf import settings
+from django.db import connections, transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import OrderEvent
+
+
+logger = logging.getLogger(__name__)
+
+PROCESS_TASK = 'rest_API.tasks.process_order_events'
+
+# Сигнал для получателей событий в воркере Celery: sender=OrderEvent, event=сообщение
+order_event = Signal()
+
+_executor = None
+_relay_lock = threading.Lock()
+_relay_scheduled = False
+
+
+def record_event(order, event_type, **payload):
+    """
+    Добавляет событие заказа; публикация - после коммита текущей транзакции.
+    """
+    event = OrderEvent.objects.create(order=order, event_type=event_type, payload=payload)
+    transaction.on_commit(schedule_relay)
+    return event
+
+
+def as_message(event):
+    return {
+        'id': event.id,
+        'order': event.order_id,
+        'type': event.event_type,
+        'payload': event.payload,
+        'created_at': event.created_at.isoformat(),
+    }
+
+
+def publish_pending(batch_size=None):
+    """
+    Публикует неопубликованные события пачками по batch_size. Возвращает число событий.
+    """
+    batch_size = batch_size or settings.ORDER_EVENTS_BATCH_SIZE
+    published = 0
+    while True:
+        with transaction.atomic():
+            events = list(
+                OrderEvent.objects.filter(published_at__isnull=True)
+                .select_for_update(skip_locked=True)
+                .order_by('id')[:batch_size]
+            )
+            if not events:
+                return published
+            current_app.send_task(PROCESS_TASK, args=[[as_message(event) for event in events]])
+            OrderEvent.objects.filter(id__in=[event.id for event in events]).update(published_at=timezone.now())
+        published += len(events)
+        if len(events) < batch_size:
+            return published
+
+
+def schedule_relay():
+    """
+    Запускает публикацию событий в фоновом потоке; запуски, пришедшие
+    до начала уже запланированного, объединяются с ним.
+    """
+    global _executor, _relay_scheduled
+    if not settings.ORDER_EVENTS_ASYNC_RELAY:
+        _relay()
+        return
+    with _relay_lock:
+        if _relay_scheduled:
+            return
+        _relay_scheduled = True
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='order-events')
+    _executor.submit(_run_relay)
+
+
+def _run_relay():
+    global _relay_scheduled
+    with _relay_lock:
+        _relay_scheduled = False
+    try:
+        _relay()
+    finally:
+        connections.close_all()
+
+
+def _relay():
+    try:
+        publish_pending()
+    except Exception as exc:
+        # События останутся в outbox до следующего запуска или периодической задачи
+        logger.warning(f"Не удалось опубликовать события заказов: {exc}")
@@ -0,0 +1,167 @@
+"""
+Потоковая выгрузка каталога поставщика.
+
+Активные товары читаются серверным курсором (iterator(chunk_size=...)) и сразу
+превращаются в текст, поэтому память не растет с размером каталога. Форматы:
+
+- jsonl - по товару на строку;
+- csv - колонки, которые читает импорт (см. importer._read_csv);
+- yaml - прайс-лист в формате data/shop1.yaml (shop, categories, goods),
+  который принимает import_products.
+
+Товар выгружается с внешним id поставщика, а если его нет (товар заведен
+вручную) - с id в магазине. Поток можно сжать gzip (encode_export).
+Одним и тем же кодом пользуются эндпоинт /suppliers/<id>/export/ и команда
+export_products.
+"""
+import csv
+import io
+import json
+import zlib
+from decimal import Decimal
+
+import yaml
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Category, Product
+
+try:
+    from yaml import CSafeDumper as BaseDumper
+except ImportError:  # PyYAML собран без libyaml
+    from yaml import SafeDumper as BaseDumper
+
+
+EXPORT_FORMATS = ('jsonl', 'csv', 'yaml')
+CONTENT_TYPES = {
+    'jsonl': 'application/jsonl; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+    'yaml': 'application/yaml; charset=utf-8',
+}
+EXPORT_CHUNK_SIZE = 2000  # строк на одно чтение курсора и один фрагмент вывода
+CSV_COLUMNS = ('shop', 'id', 'category', 'name', 'price', 'price_rrc', 'quantity', 'parameters')
+
+
+class ExportDumper(BaseDumper):
+    """
+    Decimal записывается числом без потери точности (110000.00, а не строкой).
+    """
+
+
+ExportDumper.add_representer(
+    Decimal, lambda dumper, value: dumper.represent_scalar('tag:yaml.org,2002:float', str(value))
+)
+
+
+def export_goods(supplier):
+    """
+    Активные товары поставщика в виде словарей с ключами товара из прайс-листа.
+    """
+    rows = (
+        Product.objects.filter(supplier=supplier, is_active=True)
+        .order_by('id')
+        .values_list('external_id', 'id', 'category__external_id', 'title', 'price', 'price_rrc',
+                     'quantity', 'parameters')
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    for external_id, product_id, category, title, price, price_rrc, quantity, parameters in rows:
+        yield {
+            'id': external_id if external_id is not None else product_id,
+            'category': category,
+            'name': title,
+            'price': price,
+            'price_rrc': price_rrc,
+            'quantity': quantity,
+            'parameters': parameters,
+        }
+
+
+def export_categories(supplier):
+    return list(
+        Category.objects.filter(products__supplier=supplier, products__is_active=True)
+        .distinct().order_by('external_id').values('external_id', 'name')
+    )
+
+
+def _chunks(rows, render):
+    chunk = []
+    for row in rows:
+        chunk.append(render(row))
+        if len(chunk) == EXPORT_CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def _jsonl(supplier):
+    return _chunks(
+        export_goods(supplier),
+        lambda row: json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n',
+    )
+
+
+def _csv(supplier):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def render(values):
+        writer.writerow(values)
+        line = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return line
+
+    yield render(CSV_COLUMNS)
+    yield from _chunks(export_goods(supplier), lambda row: render([
+        supplier.name, row['id'], row['category'], row['name'], row['price'], row['price_rrc'],
+        row['quantity'], json.dumps(row['parameters'], ensure_ascii=False),
+    ]))
+
+
+def _yaml_dump(data):
+    return yaml.dump(data, Dumper=ExportDumper, allow_unicode=True, sort_keys=False, default_flow_style=False)
+
+
+def _yaml(supplier):
+    categories = [{'id': row['external_id'], 'name': row['name']} for row in export_categories(supplier)]
+    yield _yaml_dump({'shop': supplier.name, 'categories': categories})
+    # Товары дописываются элементами блочного списка goods по мере чтения курсора
+    yield 'goods:'
+    empty = True
+    for chunk in _chunks(export_goods(supplier), lambda row: _yaml_dump([row])):
+        yield ('\n' if empty else '') + chunk
+        empty = False
+    if empty:
+        yield ' []\n'
+
+
+EXPORTERS = {'jsonl': _jsonl, 'csv': _csv, 'yaml': _yaml}
+
+
+def iter_export(supplier, export_format):
+    """
+    Текст выгрузки каталога поставщика по частям.
+    """
+    if export_format not in EXPORTERS:
+        raise ValueError(f"Неподдерживаемый формат выгрузки: {export_format}")
+    return EXPORTERS[export_format](supplier)
+
+
+def encode_export(chunks, compress=False):
+    """
+    Кодирует части выгрузки в UTF-8 и при compress=True сжимает их потоком в gzip.
+    """
+    if not compress:
+        for chunk in chunks:
+            yield chunk.encode('utf-8')
+        return
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_filename(supplier, export_format, compress=False):
+    return f"supplier-{supplier.id}.{export_format}{'.gz' if compress else ''}"
@@ -0,0 +1,122 @@
+"""
+Фасетная фильтрация каталога по атрибутам из Product.parameters.
+
+Параметры запроса:
+
+* param.<ключ>=a,b - значение атрибута равно одному из перечисленных;
+* param.<ключ>__min=x, param.<ключ>__max=y - диапазон для числовых атрибутов;
+* price_min, price_max - диапазон цены;
+* category=1,2 - id категорий.
+
+Равенство проверяется оператором @> (parameters @> '{"ключ": значение}'), который
+обслуживается GIN-индексом jsonb_path_ops; диапазоны сравнивают jsonb-значение
+(parameters -> 'ключ'), для которого у частых атрибутов есть индексы по выражению.
+"""
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db import connections
+from django.db.models import CharField, Func, Q
+from django.db.models.fields.json import KeyTransform
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+
+PARAM_PREFIX = 'param.'
+RANGE_SUFFIXES = {'__min': 'gte', '__max': 'lte'}
+
+
+def _value_candidates(raw):
+    """
+    Значение из строки запроса может храниться в JSON числом, логическим значением или строкой.
+    """
+    candidates = [raw]
+    if raw in ('true', 'false'):
+        candidates.append(raw == 'true')
+    else:
+        number = _parse_number(raw)
+        if number is not None:
+            candidates.append(int(number) if number == number.to_integral_value() else float(number))
+    return candidates
+
+
+def _parse_number(raw):
+    try:
+        number = Decimal(raw)
+    except InvalidOperation:
+        return None
+    return number if number.is_finite() else None
+
+
+def _require_number(name, raw):
+    number = _parse_number(raw)
+    if number is None:
+        raise ValidationError({name: 'Ожидается число'})
+    return number
+
+
+class ProductFacetFilterBackend(BaseFilterBackend):
+    """
+    Фильтр каталога по категории, цене и атрибутам товара.
+    """
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+
+        if params.get('category'):
+            try:
+                categories = [int(value) for value in params['category'].split(',') if value]
+            except ValueError:
+                raise ValidationError({'category': 'Ожидается список id через запятую'})
+            queryset = queryset.filter(category_id__in=categories)
+        if params.get('price_min'):
+            queryset = queryset.filter(price__gte=_require_number('price_min', params['price_min']))
+        if params.get('price_max'):
+            queryset = queryset.filter(price__lte=_require_number('price_max', params['price_max']))
+
+        for number, name in enumerate(sorted(params)):
+            if not name.startswith(PARAM_PREFIX) or not params[name]:
+                continue
+            key = name[len(PARAM_PREFIX):]
+            suffix = next((suffix for suffix in RANGE_SUFFIXES if key.endswith(suffix)), None)
+            if suffix is None:
+                condition = Q()
+                for raw in params[name].split(','):
+                    for candidate in _value_candidates(raw):
+                        condition |= Q(parameters__contains={key: candidate})
+                queryset = queryset.filter(condition)
+            else:
+                key = key[:-len(suffix)]
+                bound = _require_number(name, params[name])
+                value, value_type = f'param_{number}', f'param_{number}_type'
+                queryset = queryset.alias(**{
+                    value: KeyTransform(key, 'parameters'),
+                    value_type: Func(KeyTransform(key, 'parameters'), function='jsonb_typeof', output_field=CharField()),
+                }).filter(**{
+                    value_type: 'number',
+                    f'{value}__{RANGE_SUFFIXES[suffix]}': float(bound),
+                })
+        return queryset
+
+
+def facet_counts(queryset, keys=None):
+    """
+    Считает число товаров для каждого значения каждого атрибута одним агрегирующим запросом.
+
+    Возвращает {ключ: [{'value': значение, 'count': n}, ...]} (значения по убыванию count).
+    """
+    subquery, params = queryset.order_by().values('parameters').query.sql_with_params()
+    sql = (
+        f"SELECT kv.key, kv.value::text, COUNT(*) "
+        f"FROM ({subquery}) AS filtered, jsonb_each(filtered.parameters) AS kv "
+    )
+    if keys:
+        sql += "WHERE kv.key = ANY(%s) "
+        params = (*params, list(keys))
+    sql += "GROUP BY kv.key, kv.value ORDER BY kv.key, COUNT(*) DESC"
+
+    facets = {}
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        for key, value, count in cursor.fetchall():
+            facets.setdefault(key, []).append({'value': json.loads(value), 'count': count})
+    return facets
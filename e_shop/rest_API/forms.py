@@ -1,5 +1,5 @@
 from django import forms
-from .models import Product
+from .models import Product, RepricingJob
 
 class ProductAdminForm(forms.ModelForm):
     """
@@ -13,12 +13,28 @@ class ProductAdminForm(forms.ModelForm):
             # можно добавить дополнительные настройки для других полей
         }
 
-class BulkUpdateForm(forms.Form):
+class RepricingForm(forms.ModelForm):
     """
-    Форма для массового обновления цены товаров.
+    Правило массовой переоценки товаров.
     """
-    new_price = forms.DecimalField(
-        max_digits=10,
-        decimal_places=2,
-        label="Новая цена"
-    )
\ No newline at end of file
+    class Meta:
+        model = RepricingJob
+        fields = ['base', 'percent', 'rounding', 'supplier', 'category', 'parameters']
+        labels = {
+            'base': "База",
+            'percent': "Наценка, %",
+            'rounding': "Округление",
+            'supplier': "Поставщик",
+            'category': "Категория",
+            'parameters': "Атрибуты товара",
+        }
+        help_texts = {
+            'percent': "Отрицательное значение - скидка; 0 вместе с базой price_rrc - цена равна рекомендованной",
+            'parameters': 'JSON, например {"Цвет": "черный"}',
+        }
+
+    def clean_parameters(self):
+        parameters = self.cleaned_data['parameters'] or {}
+        if not isinstance(parameters, dict):
+            raise forms.ValidationError("Ожидается JSON-объект")
+        return parameters
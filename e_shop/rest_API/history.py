@@ -0,0 +1,56 @@
+"""
+История цен и остатков товаров (PriceHistory) и состояние каталога на момент времени.
+
+Историю пишет триггер БД при каждом создании товаров и изменении price / quantity
+(миграция 0015), поэтому она полна независимо от того, кто меняет товар: импорт,
+переоценка, админка или оформление заказа.
+
+Состояние товара на момент at: если после at товар менялся, это old_price / old_quantity
+первой строки истории после at (строка без old_price означает, что товар создан позже at);
+иначе - текущие значения товара. Читаются только строки после at, поэтому секции более
+ранних месяцев планировщик отбрасывает, и чем ближе at, тем дешевле запрос.
+"""
+from .models import PriceHistory
+
+
+def product_history(product_id, since=None, until=None):
+    """
+    Изменения товара в интервале [since, until).
+    """
+    queryset = PriceHistory.objects.filter(product_id=product_id)
+    if since is not None:
+        queryset = queryset.filter(recorded_at__gte=since)
+    if until is not None:
+        queryset = queryset.filter(recorded_at__lt=until)
+    return queryset
+
+
+def first_changes_after(product_ids, at):
+    """
+    Первое изменение после at для каждого из товаров: {product_id: {'old_price': ..., 'old_quantity': ...}}.
+    """
+    rows = (
+        PriceHistory.objects.filter(product_id__in=product_ids, recorded_at__gt=at)
+        .order_by('product_id', 'recorded_at', 'id')
+        .distinct('product_id')
+        .values('product_id', 'old_price', 'old_quantity')
+    )
+    return {row['product_id']: row for row in rows}
+
+
+def catalog_snapshot(products, at):
+    """
+    Товары, существовавшие на момент at, с ценой и остатком на тот момент.
+    Экземпляры товаров изменяются на месте.
+    """
+    products = list(products)
+    changes = first_changes_after([product.id for product in products], at)
+    result = []
+    for product in products:
+        change = changes.get(product.id)
+        if change is not None:
+            if change['old_price'] is None:
+                continue
+            product.price, product.quantity = change['old_price'], change['old_quantity']
+        result.append(product)
+    return result
@@ -0,0 +1,607 @@
+"""
+Движок импорта прайс-листов поставщиков.
+
+Товары читаются из файла потоково (YAML, JSON или CSV) и применяются к базе
+пачками: существующие товары сопоставляются по внешнему id поставщика,
+новые создаются через bulk_create, изменившиеся обновляются через bulk_update.
+Строки, у которых не поменялись цена, остаток или параметры, не перезаписываются.
+
+В режиме синхронизации (sync_feed) каждая строка сравнивается по отпечатку:
+из базы читаются только пары (внешний id, отпечаток), а записываются лишь
+новые и изменившиеся товары; пропавшие из прайс-листа товары деактивируются.
+
+ParallelImportRunner обрабатывает много прайс-листов сразу: разбор идет в пуле
+процессов, запись - в нескольких потоках с отдельной транзакцией на каждый файл.
+"""
+import csv
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import Manager
+from dataclasses import asdict, dataclass, field
+from decimal import Decimal, InvalidOperation
+from itertools import chain, islice
+from typing import Iterator
+
+import yaml
+from queue import Queue
+
+import django
+from django.apps import apps
+from django.db import connection, connections, transaction
+
+from .cache import invalidate_catalog
+from .models import Category, Product, Supplier
+
+try:
+    from yaml import CSafeLoader as FeedLoader
+except ImportError:  # PyYAML собран без libyaml
+    from yaml import SafeLoader as FeedLoader
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+FEED_FORMATS = ('yaml', 'json', 'csv')
+
+
+class FeedError(ValueError):
+    """
+    Ошибка формата прайс-листа.
+    """
+
+
+@dataclass
+class Feed:
+    """
+    Прайс-лист поставщика: название магазина, категории и поток товаров.
+    """
+    shop: str
+    categories: list
+    goods: Iterator[dict]
+    source: str = ''
+
+
+@dataclass
+class ImportStats:
+    """
+    Итоги импорта одного прайс-листа.
+    """
+    supplier: str
+    source: str = ''
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    deactivated: int = 0
+    elapsed: float = 0.0
+    dry_run: bool = False
+    # Внешние id по видам изменений; заполняется только в dry-run
+    diff: dict = field(default_factory=dict)
+
+    @property
+    def total(self):
+        return self.created + self.updated + self.unchanged
+
+    @property
+    def rows_per_sec(self):
+        return self.total / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return (
+            f"{self.supplier} ({os.path.basename(self.source)}){' [dry-run]' if self.dry_run else ''}: "
+            f"создано {self.created}, обновлено {self.updated}, без изменений {self.unchanged}, "
+            f"деактивировано {self.deactivated} "
+            f"за {self.elapsed:.2f} с ({self.rows_per_sec:.0f} строк/с)"
+        )
+
+    def as_dict(self):
+        return {**asdict(self), 'rows_per_sec': self.rows_per_sec}
+
+    def record(self, kind, external_ids):
+        setattr(self, kind, getattr(self, kind) + len(external_ids))
+        if self.dry_run:
+            self.diff.setdefault(kind, []).extend(external_ids)
+
+
+def detect_format(path):
+    ext = os.path.splitext(path)[1].lower().lstrip('.')
+    if ext == 'yml':
+        return 'yaml'
+    if ext in FEED_FORMATS:
+        return ext
+    raise FeedError(f"Не удалось определить формат файла {path}")
+
+
+def open_feed(path, feed_format=None):
+    """
+    Открывает прайс-лист и возвращает Feed с ленивым итератором товаров.
+    """
+    feed_format = feed_format or detect_format(path)
+    readers = {'yaml': _read_yaml, 'json': _read_json, 'csv': _read_csv}
+    if feed_format not in readers:
+        raise FeedError(f"Неподдерживаемый формат: {feed_format}")
+    feed = readers[feed_format](path)
+    feed.source = path
+    return feed
+
+
+def _read_yaml(path):
+    """
+    Разбирает YAML по событиям: заголовок (shop, categories) читается целиком,
+    а элементы списка goods, идущего после shop, собираются и отдаются по одному,
+    не загружая файл в память.
+    """
+    stream = open(path, 'r', encoding='utf-8')
+    loader = FeedLoader(stream)
+    try:
+        for event_class in (yaml.StreamStartEvent, yaml.DocumentStartEvent, yaml.MappingStartEvent):
+            if not loader.check_event(event_class):
+                raise FeedError(f"{path}: ожидался словарь верхнего уровня")
+            loader.get_event()
+
+        header = {}
+        while not loader.check_event(yaml.MappingEndEvent):
+            key = loader.construct_document(_compose(loader))
+            if key == 'goods' and 'shop' in header:
+                if not loader.check_event(yaml.SequenceStartEvent):
+                    raise FeedError(f"{path}: goods должен быть списком")
+                loader.get_event()
+                goods = _iter_yaml_goods(loader, stream)
+                break
+            # goods перед shop (например, после yaml.dump с сортировкой ключей) читаются целиком
+            header[key] = loader.construct_document(_compose(loader))
+        else:
+            goods = iter(header.pop('goods', None) or [])
+            stream.close()
+    except (yaml.YAMLError, FeedError):
+        stream.close()
+        raise
+
+    if 'shop' not in header:
+        raise FeedError(f"{path}: не указан shop")
+    return Feed(shop=header['shop'], categories=header.get('categories') or [], goods=goods)
+
+
+def _iter_yaml_goods(loader, stream):
+    try:
+        while not loader.check_event(yaml.SequenceEndEvent):
+            yield loader.construct_document(_compose(loader))
+    finally:
+        stream.close()
+
+
+def _compose(loader, anchors=None):
+    """
+    Собирает узел YAML из потока событий (CSafeLoader не предоставляет compose_node).
+    """
+    anchors = {} if anchors is None else anchors
+    event = loader.get_event()
+    if isinstance(event, yaml.AliasEvent):
+        if event.anchor not in anchors:
+            raise FeedError(f"Неизвестный якорь YAML: {event.anchor}")
+        return anchors[event.anchor]
+    if isinstance(event, yaml.ScalarEvent):
+        tag = event.tag
+        if tag is None or tag == '!':
+            tag = loader.resolve(yaml.ScalarNode, event.value, event.implicit)
+        node = yaml.ScalarNode(tag, event.value, event.start_mark, event.end_mark, style=event.style)
+    elif isinstance(event, yaml.SequenceStartEvent):
+        tag = event.tag
+        if tag is None or tag == '!':
+            tag = loader.resolve(yaml.SequenceNode, None, event.implicit)
+        node = yaml.SequenceNode(tag, [], event.start_mark, None)
+        while not loader.check_event(yaml.SequenceEndEvent):
+            node.value.append(_compose(loader, anchors))
+        node.end_mark = loader.get_event().end_mark
+    elif isinstance(event, yaml.MappingStartEvent):
+        tag = event.tag
+        if tag is None or tag == '!':
+            tag = loader.resolve(yaml.MappingNode, None, event.implicit)
+        node = yaml.MappingNode(tag, [], event.start_mark, None)
+        while not loader.check_event(yaml.MappingEndEvent):
+            node.value.append((_compose(loader, anchors), _compose(loader, anchors)))
+        node.end_mark = loader.get_event().end_mark
+    else:
+        raise FeedError(f"Неожиданное событие YAML: {event}")
+    if getattr(event, 'anchor', None):
+        anchors[event.anchor] = node
+    return node
+
+
+def _read_json(path):
+    with open(path, 'r', encoding='utf-8') as file:
+        data = json.load(file)
+    if not isinstance(data, dict) or 'shop' not in data:
+        raise FeedError(f"{path}: не указан shop")
+    return Feed(shop=data['shop'], categories=data.get('categories') or [], goods=iter(data.get('goods') or []))
+
+
+def _read_csv(path):
+    """
+    CSV с колонками shop, id, category, name, price, price_rrc, quantity, parameters
+    (parameters - JSON-объект). Название магазина берется из первой строки.
+    """
+    stream = open(path, 'r', encoding='utf-8', newline='')
+    reader = csv.DictReader(stream)
+    first = next(reader, None)
+    if first is None:
+        stream.close()
+        raise FeedError(f"{path}: файл пуст")
+    if not first.get('shop'):
+        stream.close()
+        raise FeedError(f"{path}: не указан shop")
+
+    def rows():
+        try:
+            for row in chain([first], reader):
+                try:
+                    row['parameters'] = json.loads(row['parameters']) if row.get('parameters') else {}
+                except ValueError as exc:
+                    raise FeedError(f"{path}: некорректные parameters товара {row.get('id')}") from exc
+                yield row
+        finally:
+            stream.close()
+
+    return Feed(shop=first['shop'], categories=[], goods=rows())
+
+
+def normalize_good(item, categories=None):
+    """
+    Приводит товар из прайс-листа к значениям полей модели Product.
+    """
+    try:
+        category = item.get('category')
+        category = int(category) if category not in (None, '') else None
+        price_rrc = item.get('price_rrc')
+        parameters = item.get('parameters') or {}
+        if not isinstance(parameters, dict):
+            raise FeedError(f"parameters товара {item.get('id')} должен быть словарем")
+        good = {
+            'external_id': int(item['id']),
+            'title': str(item['name']),
+            'category_id': categories.get(category) if categories and category is not None else None,
+            'price': Decimal(str(item['price'])),
+            'price_rrc': Decimal(str(price_rrc)) if price_rrc not in (None, '') else None,
+            'quantity': int(item['quantity']),
+            'parameters': parameters,
+            'is_active': True,
+        }
+    except (KeyError, TypeError, ValueError, InvalidOperation) as exc:
+        raise FeedError(f"Некорректный товар {item.get('id', '?')}: {exc!r}") from exc
+    good['fingerprint'] = fingerprint(good, category)
+    return good
+
+
+def fingerprint(good, category):
+    """
+    Отпечаток значимых полей товара. Категория учитывается по внешнему id,
+    чтобы отпечаток не зависел от первичных ключей конкретной базы.
+    """
+    payload = [
+        good['title'],
+        f"{good['price']:.2f}",
+        f"{good['price_rrc']:.2f}" if good['price_rrc'] is not None else None,
+        good['quantity'],
+        good['parameters'],
+        category,
+    ]
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class ProductImporter:
+    """
+    Применяет прайс-листы к базе пачками upsert-операций.
+
+    Каждый прайс-лист импортируется в отдельной транзакции.
+    """
+    update_fields = ('title', 'category', 'price', 'price_rrc', 'quantity', 'parameters', 'fingerprint', 'is_active')
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE):
+        self.batch_size = batch_size
+
+    def import_path(self, path, feed_format=None, sync=False, dry_run=False):
+        feed = open_feed(path, feed_format)
+        if sync or dry_run:
+            return self.sync_feed(feed, dry_run=dry_run)
+        return self.import_feed(feed)
+
+    def import_feed(self, feed):
+        started = time.perf_counter()
+        stats = ImportStats(supplier=feed.shop, source=feed.source)
+        with transaction.atomic():
+            supplier = Supplier.objects.get_or_create(name=feed.shop)[0]
+            categories = self.sync_categories(feed.categories)
+            for batch in batched(feed.goods, self.batch_size):
+                goods = [normalize_good(item, categories) for item in batch]
+                self.apply_batch(supplier, goods, stats)
+            if stats.created or stats.updated:
+                invalidate_catalog([supplier.id])
+        stats.elapsed = time.perf_counter() - started
+        logger.info(str(stats))
+        return stats
+
+    def sync_categories(self, categories):
+        """
+        Создает или переименовывает категории и возвращает словарь {внешний id: pk}.
+        """
+        rows = {}
+        for category in categories:
+            try:
+                rows[int(category['id'])] = str(category['name'])
+            except (KeyError, TypeError, ValueError) as exc:
+                raise FeedError(f"Некорректная категория {category!r}") from exc
+        if rows:
+            Category.objects.bulk_create(
+                [Category(external_id=external_id, name=name) for external_id, name in rows.items()],
+                update_conflicts=True,
+                unique_fields=['external_id'],
+                update_fields=['name'],
+            )
+        return dict(Category.objects.filter(external_id__in=rows).values_list('external_id', 'id'))
+
+    def apply_batch(self, supplier, goods, stats):
+        # Повтор одного id внутри пачки - побеждает последняя запись
+        goods = {good['external_id']: good for good in goods}
+        existing = Product.objects.filter(supplier=supplier, external_id__in=goods).only(
+            'id', 'external_id', *self.update_fields
+        )
+        existing = {product.external_id: product for product in existing}
+
+        to_create, to_update = [], []
+        for external_id, good in goods.items():
+            product = existing.get(external_id)
+            if product is None:
+                to_create.append(Product(supplier=supplier, description='', **good))
+            elif self.has_changes(product, good):
+                for name, value in good.items():
+                    setattr(product, name, value)
+                to_update.append(product)
+            else:
+                stats.unchanged += 1
+
+        if to_create:
+            Product.objects.bulk_create(to_create, batch_size=self.batch_size)
+            stats.created += len(to_create)
+        if to_update:
+            Product.objects.bulk_update(to_update, self.update_fields, batch_size=self.batch_size)
+            stats.updated += len(to_update)
+
+    @staticmethod
+    def has_changes(product, good):
+        return any(getattr(product, name) != value for name, value in good.items())
+
+    def sync_feed(self, feed, dry_run=False):
+        """
+        Применяет к базе только разницу между прайс-листом и последним импортом.
+
+        Из базы читаются кортежи (внешний id, pk, отпечаток, активность) без создания
+        объектов Product; товары, отсутствующие в прайс-листе, деактивируются.
+        В режиме dry_run база не изменяется, а в stats.diff возвращаются внешние id изменений.
+        """
+        started = time.perf_counter()
+        stats = ImportStats(supplier=feed.shop, source=feed.source, dry_run=dry_run)
+        with transaction.atomic():
+            if dry_run:
+                supplier = Supplier.objects.filter(name=feed.shop).first()
+                categories = None
+            else:
+                supplier = Supplier.objects.get_or_create(name=feed.shop)[0]
+                categories = self.sync_categories(feed.categories)
+
+            known = {}
+            if supplier is not None:
+                rows = Product.objects.filter(supplier=supplier, external_id__isnull=False).values_list(
+                    'external_id', 'id', 'fingerprint', 'is_active'
+                )
+                for external_id, pk, product_fingerprint, is_active in rows.iterator(chunk_size=self.batch_size * 10):
+                    known[external_id] = (pk, product_fingerprint, is_active)
+
+            seen = set()
+            for batch in batched(feed.goods, self.batch_size):
+                to_create, to_update = [], []
+                for good in (normalize_good(item, categories) for item in batch):
+                    external_id = good['external_id']
+                    if external_id in seen:
+                        continue
+                    seen.add(external_id)
+                    current = known.get(external_id)
+                    if current is None:
+                        to_create.append(good)
+                    elif current[1] != good['fingerprint'] or not current[2]:
+                        to_update.append(Product(id=current[0], supplier=supplier, **good))
+                    else:
+                        stats.unchanged += 1
+                if not dry_run:
+                    Product.objects.bulk_create(
+                        [Product(supplier=supplier, description='', **good) for good in to_create],
+                        batch_size=self.batch_size,
+                    )
+                    Product.objects.bulk_update(to_update, self.update_fields, batch_size=self.batch_size)
+                stats.record('created', [good['external_id'] for good in to_create])
+                stats.record('updated', [product.external_id for product in to_update])
+
+            missing = [
+                (external_id, pk) for external_id, (pk, _, is_active) in known.items()
+                if is_active and external_id not in seen
+            ]
+            if not dry_run:
+                for chunk in batched(missing, self.batch_size):
+                    Product.objects.filter(id__in=[pk for _, pk in chunk]).update(is_active=False)
+            stats.record('deactivated', [external_id for external_id, _ in missing])
+            if not dry_run and (stats.created or stats.updated or stats.deactivated):
+                invalidate_catalog([supplier.id])
+
+        stats.elapsed = time.perf_counter() - started
+        logger.info(str(stats))
+        return stats
+
+
+@dataclass
+class ImportSummary:
+    """
+    Сводные итоги параллельного импорта нескольких прайс-листов.
+    """
+    results: list = field(default_factory=list)
+    failures: list = field(default_factory=list)  # пары (файл, текст ошибки)
+    elapsed: float = 0.0
+
+    @property
+    def total(self):
+        return sum(stats.total for stats in self.results)
+
+    @property
+    def rows_per_sec(self):
+        return self.total / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        lines = [str(stats) for stats in self.results]
+        lines += [f"{os.path.basename(path)}: ОШИБКА {error}" for path, error in self.failures]
+        lines.append(
+            f"Итого: файлов {len(self.results)}, с ошибками {len(self.failures)}, строк {self.total} "
+            f"за {self.elapsed:.2f} с ({self.rows_per_sec:.0f} строк/с)"
+        )
+        return '\n'.join(lines)
+
+
+CHANNEL_BATCHES = 4  # пачек товаров одного прайс-листа, ожидающих писателя
+
+
+def parse_feed_file(path, channel, feed_format=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Разбирает прайс-лист в рабочем процессе и потоково передает его писателю через
+    channel: заголовок ('header', {shop, categories}), пачки товаров ('goods', [...])
+    по batch_size строк и ('end', None). Ошибка разбора передается как ('error', текст).
+    Канал ограничен CHANNEL_BATCHES пачками, поэтому в памяти не больше нескольких пачек.
+    """
+    try:
+        feed = open_feed(path, feed_format)
+        channel.put(('header', {'shop': feed.shop, 'categories': feed.categories}))
+        for batch in batched(feed.goods, batch_size):
+            channel.put(('goods', batch))
+    except Exception as exc:
+        channel.put(('error', str(exc)))
+    else:
+        channel.put(('end', None))
+
+
+class FeedChannel:
+    """
+    Чтение канала parse_feed_file писателем.
+    """
+    def __init__(self, queue):
+        self.queue = queue
+        self.finished = False
+
+    def get(self):
+        kind, payload = self.queue.get()
+        self.finished = kind in ('end', 'error')
+        return kind, payload
+
+    def goods(self):
+        while True:
+            kind, payload = self.get()
+            if kind == 'goods':
+                yield from payload
+            elif kind == 'end':
+                return
+            else:
+                raise FeedError(payload)
+
+    def drain(self):
+        # После ошибки записи канал дочитывается, иначе рабочий процесс зависнет на put
+        while not self.finished:
+            self.get()
+
+
+def _init_parse_worker():
+    # При запуске процессов через spawn Django в них еще не настроен
+    if not apps.ready:
+        django.setup()
+
+
+class ParallelImportRunner:
+    """
+    Параллельный импорт: прайс-листы разбираются в пуле процессов, и каждый передает
+    писателю пачки товаров через свой ограниченный канал, поэтому файл не загружается
+    в память целиком. Писатели берут файлы в том же порядке, в котором они отданы пулу,
+    - процесс ждет на заполненном канале только того файла, который уже читает писатель.
+
+    Каждый писатель держит одно соединение с БД на все свои прайс-листы, каждый
+    прайс-лист применяется в отдельной транзакции, поэтому ошибка в одном файле
+    не откатывает остальные.
+    """
+    def __init__(self, workers=None, writers=2, batch_size=DEFAULT_BATCH_SIZE, sync=False):
+        self.workers = workers
+        self.writers = writers
+        self.batch_size = batch_size
+        self.sync = sync
+
+    def run(self, paths, feed_format=None):
+        started = time.perf_counter()
+        summary = ImportSummary()
+        files = Queue()
+
+        # Дочерние процессы не должны наследовать открытые соединения с БД
+        connections.close_all()
+        with Manager() as manager:
+            channels = [manager.Queue(maxsize=CHANNEL_BATCHES) for _ in paths]
+            for item in zip(paths, channels):
+                files.put(item)
+            threads = [
+                threading.Thread(target=self._write, args=(files, summary), name=f'import-writer-{number}')
+                for number in range(self.writers)
+            ]
+            for _ in threads:
+                files.put(None)
+            for thread in threads:
+                thread.start()
+            try:
+                with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_parse_worker) as pool:
+                    futures = {
+                        pool.submit(parse_feed_file, path, channel, feed_format, self.batch_size): channel
+                        for path, channel in zip(paths, channels)
+                    }
+                    for future in as_completed(futures):
+                        try:
+                            future.result()
+                        except Exception as exc:
+                            # Процесс упал, не закончив файл: писатель получит ошибку вместо конца
+                            futures[future].put(('error', str(exc)))
+            finally:
+                for thread in threads:
+                    thread.join()
+
+        summary.elapsed = time.perf_counter() - started
+        return summary
+
+    def _write(self, files, summary):
+        importer = ProductImporter(batch_size=self.batch_size)
+        try:
+            while (item := files.get()) is not None:
+                path, channel = item[0], FeedChannel(item[1])
+                kind, payload = channel.get()
+                if kind != 'header':
+                    logger.error(f"Не удалось разобрать {path}: {payload}")
+                    summary.failures.append((path, payload))
+                    continue
+                feed = Feed(**payload, goods=channel.goods(), source=path)
+                try:
+                    stats = importer.sync_feed(feed) if self.sync else importer.import_feed(feed)
+                except Exception as exc:
+                    logger.exception(f"Ошибка импорта {feed.source}")
+                    summary.failures.append((feed.source, str(exc)))
+                else:
+                    summary.results.append(stats)
+                channel.drain()
+        finally:
+            connection.close()
@@ -0,0 +1,190 @@
+"""
+Инструментирование запросов.
+
+PerformanceMiddleware для доли запросов PERF_METRICS_SAMPLE_RATE записывает в гистограммы
+(metrics.py) по имени маршрута: время ответа, число и время SQL-запросов, время
+Serializer.data и размер ответа. Запрос дольше PERF_SLOW_REQUEST_MS пишется в журнал
+вместе с самыми долгими SQL-запросами. Метрики отдаются в формате Prometheus на /metrics/.
+
+SQL-запросы считает обертка execute_wrapper, которая ставится на каждое соединение
+с базой при его открытии (сигнал connection_created) и пишет в замер текущего запроса
+из ContextVar. Под ASGI представление и sync_to_async выполняются в других потоках
+со своими соединениями, но ContextVar копируется туда вместе с контекстом, поэтому
+SQL учитывается и в синхронном, и в асинхронном режиме. Запросы, которые потоковый
+ответ выполняет уже при отдаче тела, в замер не попадают.
+
+При PERF_METRICS_SAMPLE_RATE = 0 middleware отключается при загрузке (MiddlewareNotUsed),
+а Serializer.data и соединения не оборачиваются, поэтому накладных расходов нет.
+"""
+import logging
+import random
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from rest_framework import serializers
+
+from . import metrics
+
+
+logger = logging.getLogger(__name__)
+
+MAX_STATEMENTS = 1000  # SQL-запросов, сохраняемых для журнала медленных запросов
+
+_current_sample = ContextVar('request_sample', default=None)
+
+
+class RequestSample:
+    """
+    Замеры одного запроса; также обертка execute_wrapper для SQL-запросов.
+    """
+    __slots__ = ('queries', 'query_time', 'serializer_time', 'statements')
+
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+        self.serializer_time = 0.0
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.queries += 1
+            self.query_time += duration
+            if len(self.statements) < MAX_STATEMENTS:
+                self.statements.append((duration, sql))
+
+
+def _sample_queries(execute, sql, params, many, context):
+    sample = _current_sample.get()
+    if sample is None:
+        return execute(sql, params, many, context)
+    return sample(execute, sql, params, many, context)
+
+
+def _wrap_connection(sender, connection, **kwargs):
+    # сигнал приходит при каждом переподключении, а обертки хранятся в объекте соединения
+    if _sample_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_sample_queries)
+
+
+def instrument_connections():
+    """
+    Ставит замер SQL-запросов на все соединения с базами, открытые после загрузки.
+    """
+    if settings.PERF_METRICS_SAMPLE_RATE:
+        connection_created.connect(_wrap_connection, dispatch_uid='rest_API.instrumentation')
+
+
+def _timed_data(prop):
+    getter = prop.fget
+
+    def data(self):
+        sample = _current_sample.get()
+        if sample is None:
+            return getter(self)
+        started = time.perf_counter()
+        try:
+            return getter(self)
+        finally:
+            sample.serializer_time += time.perf_counter() - started
+
+    data.instrumented = True
+    return property(data)
+
+
+def instrument_serializers():
+    """
+    Оборачивает Serializer.data и ListSerializer.data замером времени. Вложенные сериализаторы
+    вызывают to_representation, а не data, поэтому время не учитывается дважды.
+    """
+    if not settings.PERF_METRICS_SAMPLE_RATE:
+        return
+    for serializer_class in (serializers.Serializer, serializers.ListSerializer):
+        if not getattr(serializer_class.data.fget, 'instrumented', False):
+            serializer_class.data = _timed_data(serializer_class.data)
+
+
+class PerformanceMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.sample_rate = settings.PERF_METRICS_SAMPLE_RATE
+        if not self.sample_rate:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def sampled(self):
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+
+        sample = RequestSample()
+        context_token = _current_sample.set(sample)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_sample.reset(context_token)
+        record(request, response, sample, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+
+        sample = RequestSample()
+        context_token = _current_sample.set(sample)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_sample.reset(context_token)
+        record(request, response, sample, time.perf_counter() - started)
+        return response
+
+
+def record(request, response, sample, duration):
+    match = request.resolver_match
+    route = match.view_name if match is not None else 'unmatched'
+    labels = (route, request.method)
+    metrics.requests_total.inc(route, request.method, str(response.status_code))
+    metrics.request_duration.observe(duration, *labels)
+    metrics.db_queries.observe(sample.queries, *labels)
+    metrics.db_duration.observe(sample.query_time, *labels)
+    metrics.serializer_duration.observe(sample.serializer_time, *labels)
+    if not response.streaming:
+        metrics.response_size.observe(len(response.content), *labels)
+
+    if duration * 1000 >= settings.PERF_SLOW_REQUEST_MS:
+        slowest = sorted(sample.statements, key=lambda statement: statement[0], reverse=True)
+        queries = ''.join(
+            f'\n  {query_time * 1000:.1f} мс: {sql}' for query_time, sql in slowest[:settings.PERF_SLOW_SQL_LIMIT]
+        )
+        logger.warning(
+            f"Медленный запрос {request.method} {request.get_full_path()} ({route}): {duration * 1000:.0f} мс, "
+            f"SQL: {sample.queries} за {sample.query_time * 1000:.0f} мс, "
+            f"сериализация {sample.serializer_time * 1000:.0f} мс{queries}"
+        )
+
+
+def metrics_view(request):
+    """
+    Метрики процесса в текстовом формате Prometheus.
+    """
+    return HttpResponse(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
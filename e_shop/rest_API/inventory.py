@@ -0,0 +1,294 @@
+"""
+Резервирование остатков в Redis.
+
+Доступный остаток каждого товара хранится в Redis и меняется атомарными
+Lua-скриптами, поэтому оформление заказов на "горячий" товар не упирается
+в блокировку строки Product в Postgres:
+
+* reserve - корзина резервирует товар на INVENTORY_RESERVATION_TTL секунд;
+* commit - при оформлении заказа резерв (или недостающая часть) списывается
+  и попадает в очередь списаний pending;
+* flush - периодическая задача применяет накопленные списания к Product.quantity пачками;
+* release_expired - возвращает в остаток резервы просроченных корзин;
+* reconcile - пересчитывает остатки в Redis по базе и устраняет расхождения.
+
+Инвариант: stock = Product.quantity - pending - reserved.
+"""
+import time
+import uuid
+from functools import lru_cache
+
+import redis
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest
+
+from .cache import invalidate_catalog
+from .importer import batched
+from .models import Product
+
+
+KEY_PREFIX = 'inventory:'
+STOCK_KEY = KEY_PREFIX + 'stock'              # hash: товар -> доступный остаток
+RESERVED_KEY = KEY_PREFIX + 'reserved'        # hash: товар -> сумма резервов всех корзин
+PENDING_KEY = KEY_PREFIX + 'pending'          # hash: товар -> списания, еще не примененные к базе
+EXPIRY_KEY = KEY_PREFIX + 'expiry'            # zset: корзина -> время истечения резерва
+LOCK_KEY = KEY_PREFIX + 'lock'                # блокировка flush/reconcile
+
+
+def cart_key(cart_id):
+    return f'{KEY_PREFIX}cart:{cart_id}'      # hash: товар -> количество в резерве корзины
+
+
+# KEYS: stock, reserved, cart, expiry; ARGV: товар, количество, корзина, время истечения
+RESERVE_SCRIPT = """
+local available = redis.call('HGET', KEYS[1], ARGV[1])
+if not available then return {-1, 0} end
+local held = tonumber(redis.call('HGET', KEYS[3], ARGV[1]) or '0')
+local delta = tonumber(ARGV[2]) - held
+if delta > tonumber(available) then return {-2, tonumber(available) + held} end
+redis.call('HINCRBY', KEYS[1], ARGV[1], -delta)
+redis.call('HINCRBY', KEYS[2], ARGV[1], delta)
+if tonumber(ARGV[2]) > 0 then
+    redis.call('HSET', KEYS[3], ARGV[1], ARGV[2])
+else
+    redis.call('HDEL', KEYS[3], ARGV[1])
+end
+redis.call('ZADD', KEYS[4], ARGV[4], ARGV[3])
+return {1, tonumber(available) - delta}
+"""
+
+# KEYS: stock, reserved, cart, expiry; ARGV: корзина, [крайний срок]
+# С крайним сроком резерв снимается, только если корзина не продлила его после проверки.
+RELEASE_SCRIPT = """
+if ARGV[2] then
+    local score = redis.call('ZSCORE', KEYS[4], ARGV[1])
+    if score and tonumber(score) > tonumber(ARGV[2]) then return 0 end
+end
+local held = redis.call('HGETALL', KEYS[3])
+for i = 1, #held, 2 do
+    redis.call('HINCRBY', KEYS[1], held[i], held[i + 1])
+    redis.call('HINCRBY', KEYS[2], held[i], -held[i + 1])
+end
+redis.call('DEL', KEYS[3])
+redis.call('ZREM', KEYS[4], ARGV[1])
+return #held / 2
+"""
+
+# KEYS: stock, reserved, cart, expiry, pending; ARGV: корзина, затем пары товар/количество.
+# Недостающая сверх резерва часть берется из свободного остатка; при нехватке ничего не меняется.
+COMMIT_SCRIPT = """
+for i = 2, #ARGV, 2 do
+    local available = redis.call('HGET', KEYS[1], ARGV[i])
+    if not available then return {-1, tonumber(ARGV[i]), 0} end
+    local held = tonumber(redis.call('HGET', KEYS[3], ARGV[i]) or '0')
+    if tonumber(ARGV[i + 1]) - held > tonumber(available) then
+        return {-2, tonumber(ARGV[i]), tonumber(available) + held}
+    end
+end
+for i = 2, #ARGV, 2 do
+    local held = tonumber(redis.call('HGET', KEYS[3], ARGV[i]) or '0')
+    redis.call('HINCRBY', KEYS[1], ARGV[i], held - tonumber(ARGV[i + 1]))
+    redis.call('HINCRBY', KEYS[2], ARGV[i], -held)
+    redis.call('HINCRBY', KEYS[5], ARGV[i], ARGV[i + 1])
+    redis.call('HDEL', KEYS[3], ARGV[i])
+end
+local rest = redis.call('HGETALL', KEYS[3])
+for i = 1, #rest, 2 do
+    redis.call('HINCRBY', KEYS[1], rest[i], rest[i + 1])
+    redis.call('HINCRBY', KEYS[2], rest[i], -rest[i + 1])
+end
+redis.call('DEL', KEYS[3])
+redis.call('ZREM', KEYS[4], ARGV[1])
+return {1, 0, 0}
+"""
+
+# KEYS: stock, pending, reserved; ARGV: пары товар/остаток в базе
+RECONCILE_SCRIPT = """
+local fixed = 0
+for i = 1, #ARGV, 2 do
+    local expected = tonumber(ARGV[i + 1])
+        - tonumber(redis.call('HGET', KEYS[2], ARGV[i]) or '0')
+        - tonumber(redis.call('HGET', KEYS[3], ARGV[i]) or '0')
+    if expected < 0 then expected = 0 end
+    local current = redis.call('HGET', KEYS[1], ARGV[i])
+    if not current or tonumber(current) ~= expected then
+        redis.call('HSET', KEYS[1], ARGV[i], expected)
+        fixed = fixed + 1
+    end
+end
+return fixed
+"""
+
+
+class ReservationError(Exception):
+    """
+    Недостаточно свободного остатка товара.
+    """
+    def __init__(self, product_id, available):
+        super().__init__(f"Недостаточно товара {product_id}: доступно {available}")
+        self.product_id = product_id
+        self.available = available
+
+
+class InventoryService:
+    """
+    Операции над остатками в Redis. Все изменения выполняются Lua-скриптами атомарно.
+    """
+    def __init__(self, client, reservation_ttl=None, batch_size=None):
+        self.client = client
+        self.reservation_ttl = reservation_ttl or settings.INVENTORY_RESERVATION_TTL
+        self.batch_size = batch_size or settings.INVENTORY_FLUSH_BATCH_SIZE
+        self._reserve = client.register_script(RESERVE_SCRIPT)
+        self._release = client.register_script(RELEASE_SCRIPT)
+        self._commit = client.register_script(COMMIT_SCRIPT)
+        self._reconcile = client.register_script(RECONCILE_SCRIPT)
+
+    def available(self, product_id):
+        value = self.client.hget(STOCK_KEY, product_id)
+        return int(value) if value is not None else None
+
+    def reserve(self, cart_id, product_id, quantity):
+        """
+        Устанавливает резерв корзины на товар равным quantity (0 - снять резерв)
+        и продлевает срок резерва корзины. Возвращает оставшийся свободный остаток.
+        """
+        for _ in range(2):
+            code, value = self._reserve(
+                keys=[STOCK_KEY, RESERVED_KEY, cart_key(cart_id), EXPIRY_KEY],
+                args=[product_id, quantity, cart_id, time.time() + self.reservation_ttl],
+            )
+            if code == -1:
+                self.load([product_id])
+                continue
+            if code == -2:
+                raise ReservationError(product_id, value)
+            return value
+        raise ReservationError(product_id, 0)
+
+    def release(self, cart_id):
+        """
+        Возвращает в остаток все резервы корзины.
+        """
+        return self._release(keys=[STOCK_KEY, RESERVED_KEY, cart_key(cart_id), EXPIRY_KEY], args=[cart_id])
+
+    def release_expired(self, now=None):
+        """
+        Снимает резервы корзин, срок которых истек. Возвращает число корзин.
+        """
+        deadline = now or time.time()
+        released = 0
+        for cart_id in self.client.zrangebyscore(EXPIRY_KEY, '-inf', deadline):
+            cart_id = cart_id.decode() if isinstance(cart_id, bytes) else cart_id
+            keys = [STOCK_KEY, RESERVED_KEY, cart_key(cart_id), EXPIRY_KEY]
+            if self._release(keys=keys, args=[cart_id, deadline]):
+                released += 1
+        return released
+
+    def commit(self, cart_id, quantities):
+        """
+        Списывает товары заказа: резерв корзины переходит в очередь списаний,
+        недостающее берется из свободного остатка. Остальные резервы корзины снимаются.
+        """
+        args = [cart_id]
+        for product_id, quantity in quantities.items():
+            args += [product_id, quantity]
+        keys = [STOCK_KEY, RESERVED_KEY, cart_key(cart_id), EXPIRY_KEY, PENDING_KEY]
+        for _ in range(2):
+            code, product_id, available = self._commit(keys=keys, args=args)
+            if code == -1:
+                self.load(quantities)
+                continue
+            if code == -2:
+                raise ReservationError(product_id, available)
+            return
+        raise ReservationError(product_id, 0)
+
+    def revert(self, quantities):
+        """
+        Отменяет commit, если заказ не удалось сохранить в базе.
+        """
+        with self.client.pipeline(transaction=True) as pipe:
+            for product_id, quantity in quantities.items():
+                pipe.hincrby(STOCK_KEY, product_id, quantity)
+                pipe.hincrby(PENDING_KEY, product_id, -quantity)
+            pipe.execute()
+
+    def load(self, product_ids):
+        """
+        Загружает в Redis остатки товаров, которых там еще нет.
+        """
+        rows = Product.objects.filter(id__in=list(product_ids)).values_list('id', 'quantity')
+        missing = [(product_id, quantity) for product_id, quantity in rows
+                   if not self.client.hexists(STOCK_KEY, product_id)]
+        if missing:
+            self._reconcile(keys=[STOCK_KEY, PENDING_KEY, RESERVED_KEY], args=_flatten(missing))
+
+    def flush(self):
+        """
+        Применяет накопленные списания к Product.quantity пачками по batch_size товаров.
+        Возвращает число обновленных товаров.
+        """
+        with self.client.lock(LOCK_KEY, timeout=600):
+            flushing_key = f'{KEY_PREFIX}flushing:{uuid.uuid4().hex}'
+            try:
+                # RENAME атомарно забирает все списания; новые копятся в свежем pending
+                self.client.rename(PENDING_KEY, flushing_key)
+            except redis.ResponseError:
+                return 0
+            pending = [
+                (int(product_id), int(quantity))
+                for product_id, quantity in self.client.hgetall(flushing_key).items()
+                if int(quantity)
+            ]
+            flushed = 0
+            try:
+                for chunk in batched(pending, self.batch_size):
+                    with transaction.atomic():
+                        invalidate_catalog(
+                            Product.objects.filter(id__in=[product_id for product_id, _ in chunk])
+                            .values_list('supplier_id', flat=True).distinct()
+                        )
+                        Product.objects.filter(id__in=[product_id for product_id, _ in chunk]).update(
+                            quantity=Case(
+                                *[When(id=product_id, then=Greatest(F('quantity') - quantity, Value(0)))
+                                  for product_id, quantity in chunk],
+                                default=F('quantity'),
+                                output_field=models.PositiveIntegerField(),
+                            )
+                        )
+                    flushed += len(chunk)
+            finally:
+                # Непримененные списания возвращаются в очередь
+                with self.client.pipeline(transaction=True) as pipe:
+                    for product_id, quantity in pending[flushed:]:
+                        pipe.hincrby(PENDING_KEY, product_id, quantity)
+                    pipe.delete(flushing_key)
+                    pipe.execute()
+            return flushed
+
+    def reconcile(self):
+        """
+        Пересчитывает остатки в Redis по базе: stock = quantity - pending - reserved.
+        Возвращает число исправленных товаров.
+        """
+        fixed = 0
+        with self.client.lock(LOCK_KEY, timeout=600):
+            rows = Product.objects.order_by('id').values_list('id', 'quantity').iterator(chunk_size=self.batch_size)
+            for chunk in batched(rows, self.batch_size):
+                fixed += self._reconcile(keys=[STOCK_KEY, PENDING_KEY, RESERVED_KEY], args=_flatten(chunk))
+        return fixed
+
+
+def _flatten(pairs):
+    return [value for pair in pairs for value in pair]
+
+
+def reservations_enabled():
+    return settings.INVENTORY_RESERVATIONS_ENABLED
+
+
+@lru_cache(maxsize=None)
+def get_inventory():
+    return InventoryService(redis.Redis.from_url(settings.INVENTORY_REDIS_URL))
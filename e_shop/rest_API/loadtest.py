@@ -0,0 +1,83 @@
+"""
+Нагрузочный тест HTTP-эндпоинтов.
+
+Клиент на asyncio открывает concurrency одновременных соединений и выполняет
+заданное число GET-запросов, замеряя задержки и пропускную способность. Так можно
+сравнить один и тот же набор эндпоинтов под WSGI (синхронные представления)
+и под ASGI (async_views.py) при большом числе одновременных клиентов.
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+from .benchmarks import Measurement
+
+
+@dataclass
+class LoadResult(Measurement):
+    """
+    Результат нагрузки: задержки успешных запросов, число ошибок и общее время.
+    """
+    concurrency: int = 0
+    errors: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def rps(self):
+        return len(self.samples) / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return (
+            f"{self.name} x{self.concurrency}: {self.rps:.0f} запросов/с, p50 {self.p50 * 1000:.1f} мс, "
+            f"p99 {self.p99 * 1000:.1f} мс, успешно {len(self.samples)}, ошибок {self.errors}"
+        )
+
+
+async def fetch(host, port, target, timeout):
+    """
+    Выполняет один GET (HTTP/1.1, Connection: close), читает ответ целиком и возвращает код статуса.
+    """
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        writer.write(f'GET {target} HTTP/1.1\r\nHost: {host}:{port}\r\nConnection: close\r\n\r\n'.encode('latin-1'))
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        while await asyncio.wait_for(reader.read(65536), timeout):
+            pass
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+async def run_load(url, concurrency=100, requests=1000, timeout=30.0):
+    """
+    Выполняет requests запросов к url в concurrency параллельных потоков запросов.
+    """
+    parts = urlsplit(url)
+    target = parts.path or '/'
+    if parts.query:
+        target += f'?{parts.query}'
+    port = parts.port or 80
+    result = LoadResult(url, concurrency=concurrency)
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            try:
+                status = await fetch(parts.hostname, port, target, timeout)
+            except (OSError, asyncio.TimeoutError, IndexError, ValueError):
+                result.errors += 1
+                continue
+            if 200 <= status < 400:
+                result.samples.append(time.perf_counter() - started)
+            else:
+                result.errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result.elapsed = time.perf_counter() - started
+    return result
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from ...archive import archivable_months, archive_month, archive_path
+
+class Command(BaseCommand):
+    help = 'Export monthly order partitions older than the retention period to gzipped JSON Lines and drop them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, help='Keep this many months (default: ORDER_ARCHIVE_AFTER_MONTHS)')
+        parser.add_argument('--output-dir', help='Archive directory (default: ORDER_ARCHIVE_DIR)')
+        parser.add_argument('--dry-run', action='store_true', help='Only list the months that would be archived')
+
+    def handle(self, *args, **options):
+        if options['months'] is not None and options['months'] < 0:
+            raise CommandError('--months must not be negative')
+        months = archivable_months(options['months'])
+        if not months:
+            self.stdout.write('Nothing to archive')
+            return
+        for month in months:
+            if options['dry_run']:
+                self.stdout.write(f'{month:%Y-%m} -> {archive_path(month, options["output_dir"])}')
+                continue
+            path, count = archive_month(month, options['output_dir'])
+            self.stdout.write(f'{month:%Y-%m}: {count} orders -> {path}')
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from ...benchmarks import SCENARIOS, compare_with_baseline, load_baseline, save_baseline
+
+class Command(BaseCommand):
+    help = 'Run performance benchmarks (all data created by a scenario is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*', help='Scenarios to run (default: all)')
+        parser.add_argument('--repeat', type=int, default=10, help='Runs per measurement')
+        parser.add_argument('--rows', type=int, help='Synthetic catalog size for data-heavy scenarios')
+        parser.add_argument('--baseline', help='JSON file with baseline results; regressions fail the command')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed relative rows per second (and p50) regression against the baseline')
+        parser.add_argument('--check-latency', action='store_true',
+                            help='Also fail on p50 regressions; the baseline must be recorded on the same machine')
+        parser.add_argument('--save-baseline', help='Write the results to this JSON file')
+
+    def handle(self, *args, **options):
+        names = options['scenarios'] or list(SCENARIOS)
+        unknown = set(names) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f'Unknown scenarios: {", ".join(sorted(unknown))}. Available: {", ".join(SCENARIOS)}')
+        baseline = load_baseline(options['baseline']) if options['baseline'] else None
+
+        measurements = []
+        for name in names:
+            with transaction.atomic():
+                for measurement in SCENARIOS[name](repeat=options['repeat'], rows=options['rows']):
+                    self.stdout.write(str(measurement))
+                    for note in measurement.notes:
+                        self.stdout.write(f'  {note}')
+                    measurements.append(measurement)
+                transaction.set_rollback(True)
+
+        if options['save_baseline']:
+            save_baseline(options['save_baseline'], measurements)
+            self.stdout.write(f'Baseline saved to {options["save_baseline"]}')
+        if baseline is not None:
+            regressions = compare_with_baseline(measurements, baseline, options['tolerance'],
+                                                check_latency=options['check_latency'])
+            for regression in regressions:
+                self.stderr.write(regression)
+            if regressions:
+                raise CommandError(f'{len(regressions)} regression(s) against {options["baseline"]}')
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+from ...partitions import create_partitions, list_partitions
+
+class Command(BaseCommand):
+    help = 'Create the monthly partitions of the partitioned tables ahead of time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, help='Months ahead to create (default: PARTITION_MONTHS_AHEAD)')
+        parser.add_argument('--list', action='store_true', help='List the existing partitions')
+
+    def handle(self, *args, **options):
+        if options['months'] is not None and options['months'] < 0:
+            raise CommandError('--months must not be negative')
+        for table, created in create_partitions(options['months']).items():
+            self.stdout.write(f'{table}: {created} partition(s) created')
+            if options['list']:
+                for name, bounds in list_partitions(table):
+                    self.stdout.write(f'  {name} {bounds}')
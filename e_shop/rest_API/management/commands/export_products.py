@@ -0,0 +1,40 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from ...export import EXPORT_FORMATS, encode_export, iter_export
+from ...models import Supplier
+
+class Command(BaseCommand):
+    help = 'Stream the active products of a supplier to a file (JSON Lines, CSV or YAML in the import format)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('supplier', help='Supplier id or name')
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='yaml', help='Output format')
+        parser.add_argument('--gzip', action='store_true', help='Compress the output with gzip')
+        parser.add_argument('--output', '-o', default='-', help='Output file (default: stdout)')
+
+    def handle(self, *args, **options):
+        supplier = self.get_supplier(options['supplier'])
+        chunks = iter_export(supplier, options['format'])
+
+        if options['output'] == '-':
+            if options['gzip']:
+                for data in encode_export(chunks, compress=True):
+                    sys.stdout.buffer.write(data)
+                sys.stdout.buffer.flush()
+            else:
+                for chunk in chunks:
+                    self.stdout.write(chunk, ending='')
+            return
+
+        with open(options['output'], 'wb') as file:
+            for data in encode_export(chunks, compress=options['gzip']):
+                file.write(data)
+        self.stderr.write(self.style.SUCCESS(f'Exported {supplier.name} to {options["output"]}'))
+
+    def get_supplier(self, value):
+        lookup = {'id': int(value)} if value.isdigit() else {'name': value}
+        try:
+            return Supplier.objects.get(**lookup)
+        except Supplier.DoesNotExist:
+            raise CommandError(f'Supplier not found: {value}')
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from ...benchmarks import generate_catalog, generate_orders, make_supplier
+
+class Command(BaseCommand):
+    help = 'Fill the database with synthetic suppliers, products, users, carts and orders for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--suppliers', type=int, default=3, help='Suppliers to create')
+        parser.add_argument('--products', type=int, default=100_000, help='Products per supplier')
+        parser.add_argument('--users', type=int, default=1000, help='Buyers with a contact and a cart')
+        parser.add_argument('--orders-per-user', type=int, default=5, help='Orders per buyer')
+        parser.add_argument('--items-per-order', type=int, default=2, help='Items per order and per cart')
+
+    def handle(self, *args, **options):
+        if min(options['suppliers'], options['products']) < 1:
+            raise CommandError('--suppliers and --products must be positive')
+        with transaction.atomic():
+            suppliers = [make_supplier() for _ in range(options['suppliers'])]
+            for supplier in suppliers:
+                generate_catalog(supplier, options['products'])
+                self.stdout.write(f'{supplier.name}: {options["products"]} products')
+            if options['users'] > 0:
+                generate_orders(suppliers[0], options['users'], options['orders_per_user'], options['items_per_order'])
+                self.stdout.write(f'{options["users"]} users with {options["orders_per_user"]} orders each')
+        self.stdout.write(self.style.SUCCESS('Synthetic data generated'))
@@ -1,31 +1,53 @@
 import os
-import yaml
-from django.core.management.base import BaseCommand
-from ...models import Product, Supplier
+from django.core.management.base import BaseCommand, CommandError
+from ...importer import DEFAULT_BATCH_SIZE, FEED_FORMATS, FeedError, ParallelImportRunner, ProductImporter
+
+DIFF_SAMPLE_SIZE = 20
 
 class Command(BaseCommand):
-    help = 'Import products from a YAML file'
+    help = 'Import products from one or more supplier price lists (YAML, JSON or CSV)'
 
-    def handle(self, *args, **kwargs):
-        # Get the path to the YAML file
-        base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-        yaml_file_path = os.path.join(base_dir, 'data', 'shop1.yaml')
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help='Price list files (default: data/shop1.yaml)')
+        parser.add_argument('--format', choices=FEED_FORMATS, help='Feed format (detected from the extension by default)')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Products per bulk query')
+        parser.add_argument('--sync', action='store_true', help='Apply only the delta and deactivate products missing from the feed')
+        parser.add_argument('--dry-run', action='store_true', help='Report the sync delta without writing to the database')
+        parser.add_argument('--workers', type=int, default=1, help='Parser processes; more than 1 enables the parallel runner')
+        parser.add_argument('--writers', type=int, default=2, help='Database writer threads for the parallel runner')
 
-        # Open and read the YAML file
-        with open(yaml_file_path, 'r', encoding='utf-8') as file:
-            data = yaml.safe_load(file)
+    def handle(self, *args, **options):
+        paths = options['paths']
+        if not paths:
+            # Get the path to the bundled YAML file
+            base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+            paths = [os.path.join(base_dir, 'data', 'shop1.yaml')]
 
-            # Get or create the supplier from the shop data
-            supplier = Supplier.objects.get_or_create(name=data['shop'])[0]
+        if options['workers'] > 1:
+            if options['dry_run']:
+                raise CommandError('--dry-run is not supported with --workers')
+            runner = ParallelImportRunner(
+                workers=options['workers'], writers=options['writers'],
+                batch_size=options['batch_size'], sync=options['sync'],
+            )
+            summary = runner.run(paths, options['format'])
+            self.stdout.write(str(summary))
+            if summary.failures:
+                raise CommandError(f'{len(summary.failures)} price list(s) failed to import')
+            self.stdout.write(self.style.SUCCESS('Successfully imported products'))
+            return
 
-            # Create products for each item in the goods list
-            for product in data['goods']:
-                Product.objects.create(
-                    title=product['name'],
-                    supplier=supplier,
-                    price=product['price'],
-                    quantity=product['quantity'],
-                    parameters=product['parameters']
-                )
+        importer = ProductImporter(batch_size=options['batch_size'])
+        for path in paths:
+            # Each price list is imported in its own transaction
+            try:
+                stats = importer.import_path(path, options['format'], sync=options['sync'], dry_run=options['dry_run'])
+            except (OSError, FeedError) as exc:
+                raise CommandError(f'{path}: {exc}') from exc
+            self.stdout.write(str(stats))
+            for kind, external_ids in stats.diff.items():
+                sample = ', '.join(map(str, external_ids[:DIFF_SAMPLE_SIZE]))
+                more = f' ... (+{len(external_ids) - DIFF_SAMPLE_SIZE})' if len(external_ids) > DIFF_SAMPLE_SIZE else ''
+                self.stdout.write(f'  {kind}: {sample}{more}')
 
-        self.stdout.write(self.style.SUCCESS('Successfully imported products'))
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS('Successfully imported products'))
@@ -0,0 +1,24 @@
+import asyncio
+
+from django.core.management.base import BaseCommand, CommandError
+from ...loadtest import run_load
+
+class Command(BaseCommand):
+    help = 'Load-test running HTTP endpoints (e.g. the same catalog under WSGI and ASGI servers)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='+', help='Full URLs to request, e.g. http://127.0.0.1:8000/async/products/')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[100],
+                            help='Concurrent connections; several values run a sweep')
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per URL and concurrency level')
+        parser.add_argument('--timeout', type=float, default=30.0, help='Per-request timeout in seconds')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or min(options['concurrency']) < 1:
+            raise CommandError('--requests and --concurrency must be positive')
+        for url in options['urls']:
+            if not url.startswith('http://'):
+                raise CommandError(f'Only plain http:// URLs are supported: {url}')
+            for concurrency in options['concurrency']:
+                result = asyncio.run(run_load(url, concurrency, options['requests'], options['timeout']))
+                self.stdout.write(str(result))
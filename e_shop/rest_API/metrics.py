@@ -0,0 +1,198 @@
+"""
+Метрики процесса в формате Prometheus.
+
+Histogram - гистограмма с логарифмически-линейными корзинами в духе HDR Histogram:
+каждый интервал [2^k, 2^(k+1)) делится на sub_buckets равных частей, поэтому
+относительная погрешность квантилей одинакова во всем диапазоне, а число корзин
+остается небольшим. Значения за пределами диапазона попадают в корзину +Inf.
+
+Метрики хранятся в памяти процесса; каждый воркер отдает свои значения на /metrics,
+суммирование по воркерам - на стороне Prometheus.
+"""
+import math
+import threading
+from bisect import bisect_left
+
+from .authentication import token_cache
+from .replicas import routed_reads
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def log_linear_buckets(lowest, highest, sub_buckets=2):
+    """
+    Верхние границы корзин от lowest до первой границы не меньше highest: по sub_buckets на октаву.
+    """
+    bounds = [lowest]
+    octave = lowest
+    while bounds[-1] < highest:
+        step = octave / sub_buckets
+        bounds.extend(float(f'{octave + step * index:.6g}') for index in range(1, sub_buckets + 1))
+        octave *= 2
+    return bounds
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Metric:
+    kind = ''
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        super().__init__(name, documentation, labels)
+        self._values = {}
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        return self._values.get(label_values, 0)
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return self.header() + [
+            f'{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}' for labels, value in values
+        ]
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=()):
+        super().__init__(name, documentation, labels)
+        self.buckets = sorted(buckets)
+        self._series = {}  # значения меток -> [счетчики корзин (+Inf последняя), сумма]
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0]
+            series[0][index] += 1
+            series[1] += value
+
+    def count(self, *label_values):
+        series = self._series.get(label_values)
+        return sum(series[0]) if series else 0
+
+    def render(self):
+        with self._lock:
+            series = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._series.items())
+        lines = self.header()
+        for labels, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip([*self.buckets, math.inf], counts):
+                cumulative += count
+                lines.append(
+                    f'{self.name}_bucket{_format_labels(self.labels, labels, [("le", _format_value(bound))])} {cumulative}'
+                )
+            lines.append(f'{self.name}_sum{_format_labels(self.labels, labels)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.labels, labels)} {cumulative}')
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, func):
+        """
+        Регистрирует функцию, которая при каждой выгрузке возвращает готовые метрики
+        (например, счетчики кэша токенов).
+        """
+        self.collectors.append(func)
+        return func
+
+    def render(self):
+        lines = []
+        for metric in [*self.metrics, *(metric for collect in self.collectors for metric in collect())]:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        for metric in self.metrics:
+            metric.reset()
+
+
+registry = Registry()
+
+ROUTE_LABELS = ('route', 'method')
+LATENCY_BUCKETS = log_linear_buckets(0.001, 30)  # секунд
+QUERY_TIME_BUCKETS = log_linear_buckets(0.0001, 10)
+COUNT_BUCKETS = [0, *log_linear_buckets(1, 1024, sub_buckets=1)]
+SIZE_BUCKETS = log_linear_buckets(256, 64 * 1024 * 1024, sub_buckets=1)  # байт
+
+requests_total = registry.register(Counter(
+    'http_requests_total', 'Обработанные запросы', ('route', 'method', 'status')))
+request_duration = registry.register(Histogram(
+    'http_request_duration_seconds', 'Время обработки запроса', ROUTE_LABELS, LATENCY_BUCKETS))
+db_queries = registry.register(Histogram(
+    'http_request_db_queries', 'SQL-запросов за запрос', ROUTE_LABELS, COUNT_BUCKETS))
+db_duration = registry.register(Histogram(
+    'http_request_db_seconds', 'Время SQL-запросов за запрос', ROUTE_LABELS, QUERY_TIME_BUCKETS))
+serializer_duration = registry.register(Histogram(
+    'http_request_serializer_seconds', 'Время сериализации ответа (Serializer.data)', ROUTE_LABELS,
+    QUERY_TIME_BUCKETS))
+response_size = registry.register(Histogram(
+    'http_response_size_bytes', 'Размер тела ответа (без потоковых ответов)', ROUTE_LABELS, SIZE_BUCKETS))
+
+
+@registry.collector
+def token_cache_metrics():
+    lookups = Counter('auth_token_cache_lookups_total', 'Обращения к кэшу токенов', ('result',))
+    stats = token_cache.stats()
+    for result in ('local_hits', 'shared_hits', 'misses'):
+        lookups.inc(result, amount=stats[result])
+    return [lookups]
+
+
+@registry.collector
+def replica_routing_metrics():
+    reads = Counter('db_reads_routed_total', 'Чтения из базы: основная (primary) или реплика (replica)', ('database',))
+    for database, count in routed_reads().items():
+        reads.inc(database, amount=count)
+    return [reads]
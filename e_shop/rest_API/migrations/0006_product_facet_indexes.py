@@ -0,0 +1,31 @@
+# Generated by Django 5.1.1 on 2026-10-18 19:02
+
+import django.contrib.postgres.indexes
+import django.db.models.fields.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_API', '0005_product_price_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'price'], name='product_category_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['parameters'], name='product_parameters_gin', opclasses=['jsonb_path_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(django.db.models.fields.json.KeyTransform('Встроенная память (Гб)', 'parameters'), name='product_param_memory_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(django.db.models.fields.json.KeyTransform('Диагональ (дюйм)', 'parameters'), name='product_param_diagonal_idx'),
+        ),
+    ]
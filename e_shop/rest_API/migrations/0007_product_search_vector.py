@@ -0,0 +1,51 @@
+# Generated by Django 5.1.1 on 2026-10-18 19:03
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+SEARCH_VECTOR_SQL = """
+    setweight(to_tsvector('russian', coalesce({row}.title, '')), 'A')
+    || setweight(to_tsvector('russian', coalesce({row}.description, '')), 'B')
+"""
+
+CREATE_TRIGGER = f"""
+CREATE FUNCTION rest_api_product_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := {SEARCH_VECTOR_SQL.format(row='NEW')};
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER product_search_vector_update
+    BEFORE INSERT OR UPDATE OF title, description, search_vector ON "rest_API_product"
+    FOR EACH ROW EXECUTE FUNCTION rest_api_product_search_vector();
+
+UPDATE "rest_API_product" SET search_vector = {SEARCH_VECTOR_SQL.format(row='"rest_API_product"')};
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER IF EXISTS product_search_vector_update ON "rest_API_product";
+DROP FUNCTION IF EXISTS rest_api_product_search_vector();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_API', '0006_product_facet_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(CREATE_TRIGGER, DROP_TRIGGER),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='product_search_vector_gin'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.1 on 2026-10-18 19:08
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Перед добавлением ограничений корзины пользователя сливаются в самую раннюю,
+# а повторяющиеся позиции одного товара - в одну с суммарным количеством.
+MERGE_DUPLICATES = """
+WITH keeper AS (
+    SELECT owner_id, MIN(id) AS id FROM "rest_API_cart" GROUP BY owner_id HAVING COUNT(*) > 1
+)
+UPDATE "rest_API_cartitem" AS item SET cart_id = keeper.id
+FROM "rest_API_cart" AS cart JOIN keeper ON keeper.owner_id = cart.owner_id
+WHERE item.cart_id = cart.id AND cart.id <> keeper.id;
+
+DELETE FROM "rest_API_cart" AS cart
+USING (SELECT owner_id, MIN(id) AS id FROM "rest_API_cart" GROUP BY owner_id) AS keeper
+WHERE cart.owner_id = keeper.owner_id AND cart.id <> keeper.id;
+
+UPDATE "rest_API_cartitem" AS item SET quantity = duplicates.total
+FROM (
+    SELECT MIN(id) AS id, SUM(quantity) AS total FROM "rest_API_cartitem"
+    GROUP BY cart_id, product_id HAVING COUNT(*) > 1
+) AS duplicates
+WHERE item.id = duplicates.id;
+
+DELETE FROM "rest_API_cartitem" AS item
+USING (SELECT cart_id, product_id, MIN(id) AS id FROM "rest_API_cartitem" GROUP BY cart_id, product_id) AS keeper
+WHERE item.cart_id = keeper.cart_id AND item.product_id = keeper.product_id AND item.id <> keeper.id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_API', '0007_product_search_vector'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunSQL(MERGE_DUPLICATES, migrations.RunSQL.noop),
+        migrations.AlterField(
+            model_name='cart',
+            name='owner',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='cart', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('cart', 'product'), name='unique_cart_product'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.1.1 on 2026-10-18 19:11
+
+from django.db import connection, migrations, models, transaction
+
+
+BACKFILL_BATCH_SIZE = 5000
+
+BACKFILL_TOTALS = """
+UPDATE "rest_API_order" AS o
+SET total_amount = totals.total_amount, item_count = totals.item_count
+FROM (
+    SELECT order_id, SUM(price * quantity) AS total_amount, SUM(quantity) AS item_count
+    FROM "rest_API_orderitem"
+    WHERE order_id >= %s AND order_id < %s
+    GROUP BY order_id
+) AS totals
+WHERE o.id = totals.order_id
+"""
+
+
+def backfill_totals(apps, schema_editor):
+    """
+    Заполняет суммы существующих заказов диапазонами id по BACKFILL_BATCH_SIZE;
+    каждый диапазон - отдельная транзакция, чтобы не держать блокировки на всю таблицу.
+    """
+    Order = apps.get_model('rest_API', 'Order')
+    bounds = Order.objects.aggregate(low=models.Min('id'), high=models.Max('id'))
+    if bounds['low'] is None:
+        return
+    for start in range(bounds['low'], bounds['high'] + 1, BACKFILL_BATCH_SIZE):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(BACKFILL_TOTALS, [start, start + BACKFILL_BATCH_SIZE])
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('rest_API', '0008_cart_single_per_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
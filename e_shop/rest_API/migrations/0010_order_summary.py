@@ -0,0 +1,79 @@
+# Generated by Django 5.1.1 on 2026-10-18 19:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Сводка обновляется на разницу при каждом изменении заказа: старая строка заказа
+# вычитается из сводки (UPDATE, DELETE), новая - прибавляется (INSERT, UPDATE).
+CREATE_TRIGGER = """
+CREATE FUNCTION rest_api_order_summary() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE "rest_API_ordersummary"
+        SET order_count = order_count - 1, total_amount = total_amount - OLD.total_amount
+        WHERE user_id = OLD.buyer_id AND status = OLD.status;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO "rest_API_ordersummary" (user_id, status, order_count, total_amount)
+        VALUES (NEW.buyer_id, NEW.status, 1, NEW.total_amount)
+        ON CONFLICT (user_id, status) DO UPDATE
+        SET order_count = "rest_API_ordersummary".order_count + 1,
+            total_amount = "rest_API_ordersummary".total_amount + EXCLUDED.total_amount;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER rest_api_order_summary_insert_delete
+AFTER INSERT OR DELETE ON "rest_API_order"
+FOR EACH ROW EXECUTE FUNCTION rest_api_order_summary();
+
+CREATE TRIGGER rest_api_order_summary_update
+AFTER UPDATE OF buyer_id, status, total_amount ON "rest_API_order"
+FOR EACH ROW
+WHEN (OLD.buyer_id IS DISTINCT FROM NEW.buyer_id
+      OR OLD.status IS DISTINCT FROM NEW.status
+      OR OLD.total_amount IS DISTINCT FROM NEW.total_amount)
+EXECUTE FUNCTION rest_api_order_summary();
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER IF EXISTS rest_api_order_summary_update ON "rest_API_order";
+DROP TRIGGER IF EXISTS rest_api_order_summary_insert_delete ON "rest_API_order";
+DROP FUNCTION IF EXISTS rest_api_order_summary();
+"""
+
+# Выполняется в одной транзакции с созданием триггера: заказы, созданные во время
+# миграции, ждут блокировки таблицы и учитываются триггером уже после заполнения.
+FILL_SUMMARY = """
+LOCK TABLE "rest_API_order" IN SHARE ROW EXCLUSIVE MODE;
+INSERT INTO "rest_API_ordersummary" (user_id, status, order_count, total_amount)
+SELECT buyer_id, status, COUNT(*), SUM(total_amount) FROM "rest_API_order" GROUP BY buyer_id, status;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_API', '0009_order_totals'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('confirmed', 'Confirmed'), ('shipped', 'Shipped'), ('delivered', 'Delivered'), ('canceled', 'Canceled')], max_length=10)),
+                ('order_count', models.IntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_summary', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'status'), name='unique_order_summary_status')],
+            },
+        ),
+        migrations.RunSQL(FILL_SUMMARY + CREATE_TRIGGER, DROP_TRIGGER),
+    ]
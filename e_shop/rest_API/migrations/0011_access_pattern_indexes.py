@@ -0,0 +1,42 @@
+# Generated by Django 5.1.1 on 2026-10-18 19:13
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Индексы строятся без блокировки записи в таблицы заказов и товаров
+    atomic = False
+
+    dependencies = [
+        ('rest_API', '0010_order_summary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['buyer', '-created_timestamp', '-id'], name='order_buyer_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['buyer', 'status', '-created_timestamp'], name='order_buyer_status_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['created_timestamp'], name='order_pending_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['supplier', 'id'], name='product_active_supplier_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['supplier', 'price', 'id'], name='product_active_sup_price_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='supplier',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['id'], name='supplier_active_idx'),
+        ),
+    ]
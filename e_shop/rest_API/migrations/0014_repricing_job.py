@@ -0,0 +1,35 @@
+# Generated by Django 5.1.1 on 2026-10-18 19:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_API', '0013_order_event_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RepricingJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('base', models.CharField(choices=[('price', 'Текущая цена'), ('price_rrc', 'Рекомендованная цена (price_rrc)')], default='price', max_length=10)),
+                ('percent', models.DecimalField(decimal_places=2, default=0, max_digits=6)),
+                ('rounding', models.CharField(choices=[('0.01', 'До копеек'), ('1', 'До рубля'), ('10', 'До 10 рублей'), ('100', 'До 100 рублей')], default='0.01', max_length=5)),
+                ('parameters', models.JSONField(blank=True, default=dict)),
+                ('status', models.CharField(choices=[('draft', 'Draft'), ('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed'), ('canceled', 'Canceled')], default='draft', max_length=10)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('processed', models.PositiveIntegerField(default=0)),
+                ('updated', models.PositiveIntegerField(default=0)),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='rest_API.category')),
+                ('supplier', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='rest_API.supplier')),
+            ],
+        ),
+    ]
@@ -0,0 +1,131 @@
+# Generated by Django 5.1.1 on 2026-10-18 20:02
+
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+# Создает секции на months месяцев, начиная с месяца first_month: <parent>_pYYYYMM
+# с границами по UTC. Уже существующие секции пропускаются; возвращает число созданных.
+CREATE_PARTITION_FUNCTION = """
+CREATE FUNCTION rest_api_create_monthly_partitions(parent text, first_month date, months integer)
+RETURNS integer AS $$
+DECLARE
+    month_start date;
+    partition_name text;
+    created integer := 0;
+BEGIN
+    FOR i IN 0..months - 1 LOOP
+        month_start := (date_trunc('month', first_month::timestamp) + make_interval(months => i))::date;
+        partition_name := parent || '_p' || to_char(month_start, 'YYYYMM');
+        IF to_regclass(quote_ident(partition_name)) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                partition_name, parent,
+                month_start::timestamp AT TIME ZONE 'UTC',
+                (month_start + interval '1 month')::timestamp AT TIME ZONE 'UTC'
+            );
+            created := created + 1;
+        END IF;
+    END LOOP;
+    RETURN created;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+DROP_PARTITION_FUNCTION = """
+DROP FUNCTION IF EXISTS rest_api_create_monthly_partitions(text, date, integer);
+"""
+
+# Первичного ключа нет: он должен был бы включать recorded_at и занимал бы еще один индекс
+# на каждую строку. Секция _default принимает строки, для которых секция месяца еще не создана.
+CREATE_TABLE = """
+CREATE TABLE "rest_API_pricehistory" (
+    id bigserial NOT NULL,
+    recorded_at timestamp with time zone NOT NULL DEFAULT now(),
+    product_id bigint NOT NULL,
+    quantity integer NOT NULL,
+    old_quantity integer,
+    price numeric(10, 2) NOT NULL,
+    old_price numeric(10, 2)
+) PARTITION BY RANGE (recorded_at);
+
+CREATE TABLE "rest_API_pricehistory_default" PARTITION OF "rest_API_pricehistory" DEFAULT;
+SELECT rest_api_create_monthly_partitions('rest_API_pricehistory', now()::date, 4);
+
+CREATE INDEX price_history_recorded_brin ON "rest_API_pricehistory" USING brin (recorded_at);
+CREATE INDEX price_history_product_idx ON "rest_API_pricehistory" (product_id, recorded_at);
+"""
+
+DROP_TABLE = """
+DROP TABLE IF EXISTS "rest_API_pricehistory";
+"""
+
+# Триггеры уровня команды с таблицами переходов: одна вставка в историю на весь
+# bulk_create / bulk_update / UPDATE, а не по строке.
+CREATE_TRIGGER = """
+CREATE FUNCTION rest_api_product_price_history() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO "rest_API_pricehistory" (product_id, price, quantity)
+        SELECT id, price, quantity FROM new_rows;
+    ELSE
+        INSERT INTO "rest_API_pricehistory" (product_id, price, quantity, old_price, old_quantity)
+        SELECT new_rows.id, new_rows.price, new_rows.quantity, old_rows.price, old_rows.quantity
+        FROM new_rows JOIN old_rows ON old_rows.id = new_rows.id
+        WHERE new_rows.price IS DISTINCT FROM old_rows.price
+           OR new_rows.quantity IS DISTINCT FROM old_rows.quantity;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER product_price_history_insert
+    AFTER INSERT ON "rest_API_product" REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rest_api_product_price_history();
+
+CREATE TRIGGER product_price_history_update
+    AFTER UPDATE ON "rest_API_product" REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rest_api_product_price_history();
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER IF EXISTS product_price_history_update ON "rest_API_product";
+DROP TRIGGER IF EXISTS product_price_history_insert ON "rest_API_product";
+DROP FUNCTION IF EXISTS rest_api_product_price_history();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_API', '0014_repricing_job'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_PARTITION_FUNCTION, DROP_PARTITION_FUNCTION),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='PriceHistory',
+                    fields=[
+                        ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                        ('recorded_at', models.DateTimeField(default=django.utils.timezone.now)),
+                        ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                        ('quantity', models.IntegerField()),
+                        ('old_price', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                        ('old_quantity', models.IntegerField(null=True)),
+                        ('product', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='price_history', to='rest_API.product')),
+                    ],
+                    options={
+                        'indexes': [django.contrib.postgres.indexes.BrinIndex(fields=['recorded_at'], name='price_history_recorded_brin'), models.Index(fields=['product', 'recorded_at'], name='price_history_product_idx')],
+                    },
+                ),
+            ],
+            database_operations=[
+                migrations.RunSQL(CREATE_TABLE, DROP_TABLE),
+            ],
+        ),
+        migrations.RunSQL(CREATE_TRIGGER, DROP_TRIGGER),
+    ]
@@ -0,0 +1,114 @@
+# Generated by Django 5.1.1 on 2026-10-18 19:48
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+# Таблицы пересоздаются: новая создается рядом со старой (LIKE), данные копируются, старая
+# удаляется, после чего на новой создаются ключи, индексы и триггер сводки заказов (0010).
+# На время миграции таблицы заказов заблокированы.
+RECREATE = """
+LOCK TABLE "rest_API_order", "rest_API_orderitem" IN ACCESS EXCLUSIVE MODE;
+ALTER TABLE "rest_API_order" RENAME TO "rest_API_order_old";
+ALTER TABLE "rest_API_orderitem" RENAME TO "rest_API_orderitem_old";
+
+CREATE TABLE "rest_API_order" (LIKE "rest_API_order_old" INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING IDENTITY){partitioning};
+CREATE TABLE "rest_API_orderitem" (LIKE "rest_API_orderitem_old" INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING IDENTITY){partitioning};
+{partitions}
+INSERT INTO "rest_API_order" SELECT * FROM "rest_API_order_old";
+INSERT INTO "rest_API_orderitem" (id, quantity, price, order_id, product_id, created_timestamp)
+SELECT item.id, item.quantity, item.price, item.order_id, item.product_id, o.created_timestamp
+FROM "rest_API_orderitem_old" item JOIN "rest_API_order_old" o ON o.id = item.order_id;
+
+SELECT setval(pg_get_serial_sequence('"rest_API_order"', 'id'), coalesce(max(id), 0) + 1, false) FROM "rest_API_order";
+SELECT setval(pg_get_serial_sequence('"rest_API_orderitem"', 'id'), coalesce(max(id), 0) + 1, false)
+FROM "rest_API_orderitem";
+DROP TABLE "rest_API_orderitem_old", "rest_API_order_old";
+
+ALTER TABLE "rest_API_order" ADD CONSTRAINT "rest_API_order_pkey" PRIMARY KEY ({order_key});
+ALTER TABLE "rest_API_orderitem" ADD CONSTRAINT "rest_API_orderitem_pkey" PRIMARY KEY ({item_key});
+ALTER TABLE "rest_API_order" ADD CONSTRAINT "rest_API_order_buyer_id_908efd95_fk_auth_user_id"
+    FOREIGN KEY (buyer_id) REFERENCES auth_user (id) DEFERRABLE INITIALLY DEFERRED;
+ALTER TABLE "rest_API_order" ADD CONSTRAINT "rest_API_order_contact_info_id_78f4058b_fk_rest_API_contact_id"
+    FOREIGN KEY (contact_info_id) REFERENCES "rest_API_contact" (id) DEFERRABLE INITIALLY DEFERRED;
+ALTER TABLE "rest_API_orderitem" ADD CONSTRAINT "rest_API_orderitem_product_id_d93f02cd_fk_rest_API_product_id"
+    FOREIGN KEY (product_id) REFERENCES "rest_API_product" (id) DEFERRABLE INITIALLY DEFERRED;
+
+CREATE INDEX "rest_API_order_buyer_id_908efd95" ON "rest_API_order" (buyer_id);
+CREATE INDEX "rest_API_order_contact_info_id_78f4058b" ON "rest_API_order" (contact_info_id);
+CREATE INDEX order_buyer_created_idx ON "rest_API_order" (buyer_id, created_timestamp DESC, id DESC);
+CREATE INDEX order_buyer_status_idx ON "rest_API_order" (buyer_id, status, created_timestamp DESC);
+CREATE INDEX order_pending_created_idx ON "rest_API_order" (created_timestamp) WHERE status = 'pending';
+CREATE INDEX "rest_API_orderitem_order_id_b1e909de" ON "rest_API_orderitem" (order_id);
+CREATE INDEX "rest_API_orderitem_product_id_d93f02cd" ON "rest_API_orderitem" (product_id);
+
+CREATE TRIGGER rest_api_order_summary_insert_delete
+AFTER INSERT OR DELETE ON "rest_API_order"
+FOR EACH ROW EXECUTE FUNCTION rest_api_order_summary();
+
+CREATE TRIGGER rest_api_order_summary_update
+AFTER UPDATE OF buyer_id, status, total_amount ON "rest_API_order"
+FOR EACH ROW
+WHEN (OLD.buyer_id IS DISTINCT FROM NEW.buyer_id
+      OR OLD.status IS DISTINCT FROM NEW.status
+      OR OLD.total_amount IS DISTINCT FROM NEW.total_amount)
+EXECUTE FUNCTION rest_api_order_summary();
+"""
+
+# Секции: по месяцу с первого заказа до PARTITION_MONTHS_AHEAD (3) месяцев вперед и _default
+MONTHLY_PARTITIONS = """
+CREATE TABLE "rest_API_order_default" PARTITION OF "rest_API_order" DEFAULT;
+CREATE TABLE "rest_API_orderitem_default" PARTITION OF "rest_API_orderitem" DEFAULT;
+DO $$
+DECLARE
+    first_month date := coalesce((SELECT min(created_timestamp) FROM "rest_API_order_old"), now()) AT TIME ZONE 'UTC';
+    current_month date := now() AT TIME ZONE 'UTC';
+    months integer := (extract(year FROM current_month) - extract(year FROM first_month)) * 12
+                      + extract(month FROM current_month) - extract(month FROM first_month) + 4;
+BEGIN
+    PERFORM rest_api_create_monthly_partitions('rest_API_order', first_month, months);
+    PERFORM rest_api_create_monthly_partitions('rest_API_orderitem', first_month, months);
+END
+$$;
+"""
+
+PARTITION_TABLES = RECREATE.format(
+    partitioning=' PARTITION BY RANGE (created_timestamp)',
+    partitions=MONTHLY_PARTITIONS,
+    order_key='id, created_timestamp',
+    item_key='id, created_timestamp',
+)
+
+UNPARTITION_TABLES = RECREATE.format(partitioning='', partitions='', order_key='id', item_key='id')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_API', '0015_price_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='created_timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='orderemail',
+            name='order',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='emails', to='rest_API.order'),
+        ),
+        migrations.AlterField(
+            model_name='orderevent',
+            name='order',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='events', to='rest_API.order'),
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='order',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='items', to='rest_API.order'),
+        ),
+        migrations.RunSQL(PARTITION_TABLES, UNPARTITION_TABLES),
+    ]
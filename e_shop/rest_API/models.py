@@ -1,5 +1,9 @@
 from django.contrib.auth.models import User
+from django.contrib.postgres.indexes import BrinIndex, GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models.fields.json import KeyTransform
+from django.utils import timezone
 from django.conf import settings
 
 
@@ -7,6 +11,18 @@ class Supplier(models.Model):
     name = models.CharField(max_length=255)
     is_active = models.BooleanField(default=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(is_active=True), name='supplier_active_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+class Category(models.Model):
+    external_id = models.PositiveIntegerField(unique=True)  # id категории из прайс-листа поставщика
+    name = models.CharField(max_length=255)
+
     def __str__(self):
         return self.name
 
@@ -14,15 +30,78 @@ class Product(models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField()
     supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE)
+    external_id = models.PositiveBigIntegerField(null=True, blank=True)  # id товара из прайс-листа поставщика
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='products')
     price = models.DecimalField(max_digits=10, decimal_places=2)
+    price_rrc = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     quantity = models.PositiveIntegerField()
     parameters = models.JSONField()
+    is_active = models.BooleanField(default=True)  # False - товар пропал из прайс-листа поставщика
+    fingerprint = models.CharField(max_length=40, blank=True, default='')  # отпечаток последнего импорта
+    # Заполняется триггером БД из title и description (миграция 0007)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['supplier', 'external_id'], name='unique_supplier_product'),
+        ]
+        indexes = [
+            models.Index(fields=['price', 'id'], name='product_price_id_idx'),  # keyset-пагинация по цене
+            models.Index(fields=['category', 'price'], name='product_category_price_idx'),
+            # Фильтр parameters @> {...} по атрибутам товара
+            GinIndex(fields=['parameters'], opclasses=['jsonb_path_ops'], name='product_parameters_gin'),
+            # Диапазонные фильтры по самым частым числовым атрибутам
+            models.Index(KeyTransform('Встроенная память (Гб)', 'parameters'), name='product_param_memory_idx'),
+            models.Index(KeyTransform('Диагональ (дюйм)', 'parameters'), name='product_param_diagonal_idx'),
+            GinIndex(fields=['search_vector'], name='product_search_vector_gin'),
+            # Каталог поставщика (?supplier=) по id и по цене - только активные товары
+            models.Index(fields=['supplier', 'id'], condition=models.Q(is_active=True),
+                         name='product_active_supplier_idx'),
+            models.Index(fields=['supplier', 'price', 'id'], condition=models.Q(is_active=True),
+                         name='product_active_sup_price_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
 
+class PriceHistory(models.Model):
+    """
+    История цены и остатка товара (только добавление). Строки пишет триггер на rest_API_product
+    (миграция 0015): одним INSERT ... SELECT на команду, создавшую товары или изменившую
+    price / quantity, - поэтому импорт, переоценка и оформление заказа пишут историю пачками.
+    old_price / old_quantity - значения до изменения, NULL - строка о создании товара.
+
+    Таблица секционирована по месяцам recorded_at (см. partitions.py), первичного ключа
+    в БД нет; диапазоны времени ищутся по BRIN-индексу, история товара - по (product, recorded_at).
+    """
+    id = models.BigAutoField(primary_key=True)
+    # Без внешнего ключа: история остается после удаления товара и не замедляет запись
+    product = models.ForeignKey(Product, on_delete=models.DO_NOTHING, db_constraint=False,
+                                related_name='price_history')
+    recorded_at = models.DateTimeField(default=timezone.now)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    quantity = models.IntegerField()
+    old_price = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    old_quantity = models.IntegerField(null=True)
+
+    class Meta:
+        indexes = [
+            BrinIndex(fields=['recorded_at'], name='price_history_recorded_brin'),
+            models.Index(fields=['product', 'recorded_at'], name='price_history_product_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id}: {self.old_price} -> {self.price} at {self.recorded_at}'
+
+
 class Order(models.Model):
+    """
+    Заказ. Таблица секционирована по месяцам created_timestamp (миграция 0016, см. partitions.py):
+    запросы с условием на created_timestamp читают только секции своего периода, старые месяцы
+    архивируются целиком (archive.py). Первичный ключ в БД - (id, created_timestamp), поэтому
+    внешние ключи на заказ объявлены без ограничения в БД (db_constraint=False).
+    """
     STATUS_CHOICES = [
         ('pending', 'Pending'),
         ('confirmed', 'Confirmed'),
@@ -36,33 +115,72 @@ class Order(models.Model):
     created_timestamp = models.DateTimeField(auto_now_add=True)
     updated_timestamp = models.DateTimeField(auto_now=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    # Сумма и число единиц товара по позициям заказа; заполняются при оформлении (см. checkout.py)
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    item_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Заказы покупателя от новых к старым, в том числе с фильтром по статусу
+            models.Index(fields=['buyer', '-created_timestamp', '-id'], name='order_buyer_created_idx'),
+            models.Index(fields=['buyer', 'status', '-created_timestamp'], name='order_buyer_status_idx'),
+            # Очередь необработанных заказов: небольшой индекс только по pending
+            models.Index(fields=['created_timestamp'], condition=models.Q(status='pending'),
+                         name='order_pending_created_idx'),
+        ]
 
     def __str__(self):
         return f"Order {self.id} for {self.buyer}"
 
 class OrderItem(models.Model):
-    order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE)
+    order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE, db_constraint=False)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
+    # Время создания заказа - ключ секционирования: позиции лежат в секции того же месяца, что и заказ
+    created_timestamp = models.DateTimeField(default=timezone.now)
 
     def __str__(self):
         return f'{self.quantity} x {self.product.title}'
 
+class OrderSummary(models.Model):
+    """
+    Сводка заказов пользователя по статусу: число заказов и их сумма.
+    Поддерживается триггером Postgres на rest_API_order (миграция 0010, см. summary.py).
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='order_summary')
+    status = models.CharField(max_length=10, choices=Order.STATUS_CHOICES)
+    order_count = models.IntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'status'], name='unique_order_summary_status'),
+        ]
+
+    def __str__(self):
+        return f"{self.user}: {self.order_count} x {self.status}"
+
 class Cart(models.Model):
-    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    # У пользователя одна корзина; позиции уникальны по товару (см. carts.py)
+    owner = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='cart')
     items = models.ManyToManyField('Product', through='CartItem')  # or another related model
 
     def __str__(self):
-        return f"Cart for {self.owner}"
+        return f"Cart {self.id} of user {self.owner_id}"
 
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, related_name='cart_items', on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField()
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='unique_cart_product'),
+        ]
+
     def __str__(self):
-        return f"{self.quantity} x {self.product.title} in cart of {self.cart.owner}"
+        return f"{self.quantity} x product {self.product_id} in cart {self.cart_id}"
 
 class Contact(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -73,4 +191,127 @@ class Contact(models.Model):
     address = models.TextField()
 
     def __str__(self):
-        return f'{self.fname} {self.lname}'
\ No newline at end of file
+        return f'{self.fname} {self.lname}'
+
+
+class OrderEmail(models.Model):
+    """
+    Исходящее письмо по заказу (outbox). Строка создается в транзакции оформления заказа,
+    а периодическая задача отправляет накопившиеся письма пачками (см. emails.py).
+    """
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+
+    order = models.ForeignKey(Order, related_name='emails', on_delete=models.CASCADE, db_constraint=False)
+    recipient = models.EmailField()
+    template = models.CharField(max_length=100)
+    # Повторная постановка того же письма в очередь не создает второй строки
+    idempotency_key = models.CharField(max_length=100, unique=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Выборка очереди: только неотправленные письма
+            models.Index(fields=['next_attempt_at'], condition=models.Q(status='pending'), name='order_email_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.template} for order {self.order_id} to {self.recipient}'
+
+class OrderEvent(models.Model):
+    """
+    Событие заказа (transactional outbox). Записывается в транзакции, изменяющей заказ,
+    и публикуется в Celery после коммита (см. events.py).
+    """
+    ORDER_CONFIRMED = 'order_confirmed'
+    STATUS_CHANGED = 'status_changed'
+    TYPE_CHOICES = [
+        (ORDER_CONFIRMED, 'Order confirmed'),
+        (STATUS_CHANGED, 'Status changed'),
+    ]
+
+    order = models.ForeignKey(Order, related_name='events', on_delete=models.CASCADE, db_constraint=False)
+    event_type = models.CharField(max_length=30, choices=TYPE_CHOICES)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    published_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Очередь публикации: только неопубликованные события
+            models.Index(fields=['id'], condition=models.Q(published_at__isnull=True), name='order_event_unpublished_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.event_type} for order {self.order_id}'
+
+
+class RepricingJob(models.Model):
+    """
+    Правило массовой переоценки и ход его выполнения. Правило применяется к активным
+    товарам, подходящим под фильтры, фоновой задачей по частям (см. repricing.py).
+    """
+    BASE_PRICE = 'price'
+    BASE_RRC = 'price_rrc'
+    BASE_CHOICES = [
+        (BASE_PRICE, 'Текущая цена'),
+        (BASE_RRC, 'Рекомендованная цена (price_rrc)'),
+    ]
+    ROUNDING_CHOICES = [
+        ('0.01', 'До копеек'),
+        ('1', 'До рубля'),
+        ('10', 'До 10 рублей'),
+        ('100', 'До 100 рублей'),
+    ]
+    DRAFT = 'draft'
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    CANCELED = 'canceled'
+    STATUS_CHOICES = [
+        (DRAFT, 'Draft'),
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+        (CANCELED, 'Canceled'),
+    ]
+
+    # Правило: новая цена = base * (1 + percent / 100), округленная до rounding
+    base = models.CharField(max_length=10, choices=BASE_CHOICES, default=BASE_PRICE)
+    percent = models.DecimalField(max_digits=6, decimal_places=2, default=0)
+    rounding = models.CharField(max_length=5, choices=ROUNDING_CHOICES, default='0.01')
+    # Фильтры товаров
+    supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, null=True, blank=True)
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True)
+    parameters = models.JSONField(default=dict, blank=True)  # parameters @> {...}
+    # Ход выполнения
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=DRAFT)
+    total = models.PositiveIntegerField(default=0)  # товаров под фильтрами при запуске
+    processed = models.PositiveIntegerField(default=0)
+    updated = models.PositiveIntegerField(default=0)
+    last_id = models.BigIntegerField(default=0)  # keyset: id последнего обработанного товара
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        base = 'price_rrc' if self.base == self.BASE_RRC else 'price'
+        return f'#{self.id}: {base} {self.percent:+}%'
+
+    @property
+    def progress(self):
+        return min(100, round(self.processed * 100 / self.total)) if self.total else 0
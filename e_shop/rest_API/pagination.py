@@ -0,0 +1,97 @@
+import json
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination
+
+
+class ProductCursorPagination(CursorPagination):
+    """
+    Keyset-пагинация каталога: страница выбирается условием по индексу
+    (WHERE id > ... / price > ...), а не OFFSET, поэтому время ответа
+    не зависит от номера страницы и размера таблицы.
+
+    Порядок задается параметром ordering: id, -id, price, -price.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = ('id',)
+    ordering_query_param = 'ordering'
+    allowed_orderings = {
+        'id': ('id',),
+        '-id': ('-id',),
+        'price': ('price', 'id'),
+        '-price': ('-price', '-id'),
+    }
+
+    def get_ordering(self, request, queryset, view):
+        return self.allowed_orderings.get(request.query_params.get(self.ordering_query_param), self.ordering)
+
+
+class SnapshotCursorPagination(ProductCursorPagination):
+    """
+    Каталог на момент времени: порядок только по id, текущая цена для него не имеет смысла.
+    """
+    allowed_orderings = {
+        'id': ('id',),
+        '-id': ('-id',),
+    }
+
+
+class PriceHistoryCursorPagination(CursorPagination):
+    """
+    История товара от новых изменений к старым.
+    """
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    ordering = ('-recorded_at', '-id')
+
+
+TABLE_ROWS_ESTIMATE = """
+SELECT SUM(GREATEST(rel.reltuples, 0)), BOOL_OR(rel.reltuples >= 0)
+FROM pg_class AS rel
+WHERE (rel.oid = %(table)s::regclass AND rel.relkind <> 'p')
+   OR rel.oid IN (SELECT relid FROM pg_partition_tree(%(table)s::regclass) WHERE isleaf)
+"""
+
+
+def estimate_table_rows(using, table):
+    """
+    Число строк таблицы по pg_class.reltuples (данные последнего ANALYZE или autovacuum).
+    У секционированной таблицы reltuples родителя не обновляется (autovacuum его не
+    анализирует), поэтому складываются оценки секций; еще не анализированные секции
+    считаются пустыми. None, если не анализировалась ни одна секция.
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute(TABLE_ROWS_ESTIMATE, {'table': connections[using].ops.quote_name(table)})
+        rows, analyzed = cursor.fetchone()
+    return int(rows) if analyzed else None
+
+
+def estimate_count(queryset):
+    """
+    Оценка числа строк без COUNT(*): для всей таблицы - estimate_table_rows,
+    для отфильтрованного queryset - оценка планировщика из EXPLAIN.
+    None, если оценки нет (таблица еще не анализировалась).
+    """
+    if not queryset.query.where:
+        return estimate_table_rows(queryset.db, queryset.model._meta.db_table)
+    plan = json.loads(queryset.explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор админки для больших таблиц: точный COUNT(*) выполняется, только если
+    по оценке строк меньше ADMIN_EXACT_COUNT_LIMIT, иначе число страниц считается по оценке.
+    """
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list)
+        if estimate is None or estimate < settings.ADMIN_EXACT_COUNT_LIMIT:
+            return super().count
+        return estimate
@@ -0,0 +1,62 @@
+"""
+Секционирование таблиц по месяцам.
+
+Таблицы из PARTITIONED_TABLES секционированы по диапазону времени (PARTITION BY RANGE):
+каждый месяц хранится в своей секции <таблица>_pYYYYMM (границы по UTC), поэтому запрос
+за период читает только секции этого периода, а старые месяцы можно отсоединить целиком
+(архивирование заказов - archive.py).
+
+Секции создаются заранее на PARTITION_MONTHS_AHEAD месяцев вперед функцией БД
+rest_api_create_monthly_partitions (миграция 0015) - задачей Celery beat create_partitions
+или командой create_partitions. Строки месяца без секции попадают в секцию _default;
+пока она не пуста, секцию этого месяца создать нельзя - такая ошибка пишется в журнал.
+"""
+import logging
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+PARTITIONED_TABLES = ['rest_API_pricehistory', 'rest_API_order', 'rest_API_orderitem']
+
+
+def create_partitions(months_ahead=None, start=None):
+    """
+    Создает недостающие секции от месяца start (по умолчанию текущего) на months_ahead
+    месяцев вперед. Возвращает {таблица: число созданных секций}.
+    """
+    months_ahead = settings.PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    start = start or timezone.now().date()
+    created = {}
+    for table in PARTITIONED_TABLES:
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute('SELECT rest_api_create_monthly_partitions(%s, %s, %s)',
+                               [table, start, months_ahead + 1])
+                created[table] = cursor.fetchone()[0]
+        except Exception as exc:
+            logger.error(f"Не удалось создать секции {table}: {exc}")
+            created[table] = 0
+    return created
+
+
+def list_partitions(table):
+    """
+    Секции таблицы по возрастанию имени: [(имя, границы), ...].
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.oid = %s::regclass
+            ORDER BY child.relname
+            """,
+            [connection.ops.quote_name(table)],
+        )
+        return cursor.fetchall()
@@ -0,0 +1,224 @@
+"""
+Чтение с реплик с гарантией «читаю свои записи».
+
+Базы-реплики перечислены в DATABASE_REPLICAS. ReplicaRouter отправляет на реплику
+чтения только внутри области replica_reads(), которую открывает ReplicaReadMixin
+(каталог, поставщики, списки заказов) и админка больших таблиц для GET-запросов;
+все остальные чтения и любые записи идут в "default".
+
+Реплика отстает от основной базы, поэтому после записи чтения на время
+REPLICA_PIN_SECONDS закрепляются за основной базой:
+
+- ReplicaPinMiddleware после успешного изменяющего запроса (корзина, оформление
+  и смена статуса заказа, контакты, правка в админке) закрепляет пользователя;
+- invalidate_catalog (cache.py) после коммита закрепляет измененные области кэша
+  каталога (общие списки товаров, товары поставщика, список поставщиков): иначе ответ,
+  прочитанный с отстающей реплики, попал бы в кэш под новой версией. Представление
+  каталога читает из основной базы, только если закреплена одна из областей его ответа.
+
+Закрепления хранятся в CACHES['routing'] и видны всем процессам. Если кэш недоступен,
+чтения на RETRY_AFTER секунд идут в основную базу. Без DATABASE_REPLICAS
+маршрутизация ничего не меняет, а middleware отключается при загрузке.
+"""
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+
+logger = logging.getLogger(__name__)
+
+PIN_PREFIX = 'replica:pin:'
+CATALOG_PREFIX = 'catalog:'
+RETRY_AFTER = 30  # секунд до повторной попытки обратиться к кэшу закреплений
+
+_replica = ContextVar('replica_alias', default=None)
+_routed = Counter()
+_routed_lock = threading.Lock()
+
+
+def user_scope(user_id):
+    return f'user:{user_id}'
+
+
+class PinStore:
+    """
+    Закрепления за основной базой: ключ с TTL на каждую область (пользователь, каталог).
+    При ошибке кэша все области считаются закрепленными.
+    """
+    def __init__(self, alias='routing'):
+        self.alias = alias
+        self._down_until = 0.0
+
+    def _call(self, method, *args):
+        if self._down_until > time.monotonic():
+            return None
+        try:
+            return getattr(caches[self.alias], method)(*args)
+        except Exception as exc:
+            logger.warning(f"Кэш закреплений реплик недоступен, чтения идут в основную базу: {exc}")
+            self._down_until = time.monotonic() + RETRY_AFTER
+            return None
+
+    def pin(self, scope):
+        self._call('set', PIN_PREFIX + scope, 1, settings.REPLICA_PIN_SECONDS)
+
+    def is_pinned(self, scopes):
+        keys = [PIN_PREFIX + scope for scope in scopes]
+        if not keys:
+            return False
+        found = self._call('get_many', keys)
+        return found is None or bool(found)
+
+    def clear(self):
+        self._down_until = 0.0
+        self._call('clear')
+
+
+pins = PinStore()
+
+
+def catalog_scope(scope):
+    return CATALOG_PREFIX + scope
+
+
+def pin(*scopes):
+    if settings.DATABASE_REPLICAS:
+        for scope in scopes:
+            pins.pin(scope)
+
+
+def pin_catalog(scopes):
+    pin(*(catalog_scope(scope) for scope in scopes))
+
+
+def pin_user(user):
+    if user is not None and user.is_authenticated:
+        pin(user_scope(user.pk))
+
+
+def choose_replica(user=None, scopes=()):
+    """
+    Алиас реплики для чтений пользователя или None, если читать нужно из основной базы:
+    реплик нет, либо пользователь или одна из областей scopes недавно изменены.
+    """
+    if not settings.DATABASE_REPLICAS:
+        return None
+    scopes = list(scopes)
+    if user is not None and user.is_authenticated:
+        scopes.append(user_scope(user.pk))
+    if pins.is_pinned(scopes):
+        return None
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+@contextmanager
+def replica_reads(alias):
+    """
+    Направляет чтения внутри блока на реплику alias (None - в основную базу).
+    """
+    token = _replica.set(alias)
+    try:
+        yield alias
+    finally:
+        _replica.reset(token)
+
+
+def current_replica():
+    return _replica.get()
+
+
+def routed_reads():
+    """
+    Число чтений, направленных в основную базу (primary) и на реплики (replica), для /metrics/.
+    """
+    with _routed_lock:
+        return dict(_routed)
+
+
+class ReplicaRouter:
+    """
+    Маршрутизатор баз: чтения внутри replica_reads() - на реплику, остальное - в "default".
+    Записи всегда идут в "default", даже для объектов, прочитанных с реплики.
+    """
+    def db_for_read(self, model, **hints):
+        alias = _replica.get()
+        with _routed_lock:
+            _routed['replica' if alias else 'primary'] += 1
+        return alias or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная база
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return False if db in settings.DATABASE_REPLICAS else None
+
+
+class ReplicaReadMixin:
+    """
+    Чтение GET-запросов представления DRF с реплики. Реплика выбирается после
+    аутентификации: недавно писавший пользователь читает из основной базы.
+    get_replica_pin_scopes() - области, запись в которые тоже закрепляет чтения за основной базой.
+    """
+    replica_pin_scopes = ()
+
+    def get_replica_pin_scopes(self, request):
+        return self.replica_pin_scopes
+
+    def dispatch(self, request, *args, **kwargs):
+        with replica_reads(None):
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS:
+            _replica.set(choose_replica(request.user, self.get_replica_pin_scopes(request)))
+
+
+class ReplicaPinMiddleware:
+    """
+    Закрепляет пользователя за основной базой после успешного изменяющего запроса.
+    Пользователя DRF выставляет и в HttpRequest, поэтому он виден после ответа.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        response = self.get_response(request)
+        pin_after_write(request, response)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        # request.user может быть ленивым и читать сессию из базы
+        await sync_to_async(pin_after_write)(request, response)
+        return response
+
+
+def pin_after_write(request, response):
+    if request.method not in SAFE_METHODS and response.status_code < 400:
+        pin_user(getattr(request, 'user', None))
@@ -0,0 +1,164 @@
+"""
+Массовая переоценка товаров.
+
+Правило (RepricingJob) задает базу (текущая цена или price_rrc), наценку в процентах,
+шаг округления и фильтры: поставщик, категория, parameters @> {...}. Новая цена
+вычисляется в SQL одним выражением, поэтому ни предпросмотр, ни переоценка не читают
+товары в Python.
+
+Предпросмотр (preview) - один агрегирующий запрос: сколько товаров подходит, сколько
+изменится, суммы и разброс изменения цен. Переоценку выполняет задача Celery
+run_repricing_job: товары обходятся по возрастанию id частями по REPRICING_CHUNK_SIZE,
+каждая часть - отдельная короткая транзакция, которая блокирует только свои строки
+и в которой же сохраняется прогресс (last_id). Поэтому задачу можно прервать
+(отмена в админке) и продолжить с места остановки без повторной обработки.
+"""
+import logging
+from decimal import Decimal
+
+from celery import current_app
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Max, Min, Q, Sum, Value
+from django.db.models.functions import Cast, Greatest, Round
+from django.utils import timezone
+
+from .cache import invalidate_catalog
+from .models import Product, RepricingJob
+
+
+logger = logging.getLogger(__name__)
+
+RUN_TASK = 'rest_API.tasks.run_repricing_job'
+PRICE_FIELD = DecimalField(max_digits=10, decimal_places=2)
+
+
+def target_products(job):
+    """
+    Активные товары, к которым применяется правило.
+    """
+    queryset = Product.objects.filter(is_active=True)
+    if job.supplier_id:
+        queryset = queryset.filter(supplier_id=job.supplier_id)
+    if job.category_id:
+        queryset = queryset.filter(category_id=job.category_id)
+    if job.parameters:
+        queryset = queryset.filter(parameters__contains=job.parameters)
+    if job.base == RepricingJob.BASE_RRC:
+        queryset = queryset.filter(price_rrc__isnull=False)
+    return queryset
+
+
+def price_expression(job):
+    """
+    SQL-выражение новой цены: base * (1 + percent / 100), округленное до шага,
+    но не меньше одного шага.
+    """
+    step = Decimal(job.rounding)
+    factor = 1 + Decimal(job.percent) / 100
+    value = F(job.base) * Value(factor, output_field=PRICE_FIELD)
+    rounded = Round(value / Value(step, output_field=PRICE_FIELD)) * Value(step, output_field=PRICE_FIELD)
+    return Cast(Greatest(rounded, Value(step, output_field=PRICE_FIELD)), PRICE_FIELD)
+
+
+def preview(job):
+    """
+    Итоги применения правила без изменения данных, одним запросом.
+    """
+    changed = ~Q(price=F('new_price'))
+    totals = target_products(job).annotate(new_price=price_expression(job)).aggregate(
+        products=Count('id'),
+        changed=Count('id', filter=changed),
+        raised=Count('id', filter=Q(new_price__gt=F('price'))),
+        lowered=Count('id', filter=Q(new_price__lt=F('price'))),
+        old_total=Sum('price'),
+        new_total=Sum('new_price'),
+        min_delta=Min(F('new_price') - F('price'), filter=changed),
+        max_delta=Max(F('new_price') - F('price'), filter=changed),
+    )
+    old_total = totals['old_total']
+    totals['change_percent'] = (
+        round((totals['new_total'] - old_total) * 100 / old_total, 2) if old_total else Decimal('0')
+    )
+    return totals
+
+
+def start_job(job):
+    """
+    Запускает переоценку в фоне после коммита; total - число подходящих товаров на момент запуска.
+    Остановленная или упавшая задача продолжается с last_id.
+    """
+    if job.status == RepricingJob.DRAFT:
+        job.total = target_products(job).count()
+    job.status = RepricingJob.PENDING
+    job.error = ''
+    job.save(update_fields=['status', 'total', 'error'])
+    transaction.on_commit(lambda: _send(job.id))
+
+
+def _send(job_id):
+    try:
+        current_app.send_task(RUN_TASK, args=[job_id])
+    except Exception as exc:
+        # Задача останется в статусе pending, ее можно запустить из админки повторно
+        logger.warning(f"Не удалось поставить переоценку {job_id} в очередь: {exc}")
+
+
+def cancel_job(job):
+    return RepricingJob.objects.filter(
+        id=job.id, status__in=[RepricingJob.PENDING, RepricingJob.RUNNING]
+    ).update(status=RepricingJob.CANCELED, finished_at=timezone.now())
+
+
+def process_chunk(job_id, chunk_size=None):
+    """
+    Переоценивает следующую часть товаров. Возвращает False, когда продолжать не нужно:
+    все товары обработаны или задача отменена.
+    """
+    chunk_size = chunk_size or settings.REPRICING_CHUNK_SIZE
+    with transaction.atomic():
+        # Блокировка строки задачи не дает двум воркерам обработать одну часть дважды
+        job = RepricingJob.objects.select_for_update().get(id=job_id)
+        if job.status != RepricingJob.RUNNING:
+            return False
+        ids = list(
+            target_products(job).filter(id__gt=job.last_id).order_by('id').values_list('id', flat=True)[:chunk_size]
+        )
+        if not ids:
+            job.status = RepricingJob.DONE
+            job.finished_at = timezone.now()
+            job.save(update_fields=['status', 'finished_at'])
+            return False
+
+        new_price = price_expression(job)
+        changed = target_products(job).filter(id__gte=ids[0], id__lte=ids[-1]).exclude(price=new_price)
+        supplier_ids = [job.supplier_id] if job.supplier_id else list(
+            changed.order_by().values_list('supplier_id', flat=True).distinct()
+        )
+        updated = changed.update(price=new_price)
+        if updated:
+            invalidate_catalog(supplier_ids)
+
+        job.processed += len(ids)
+        job.updated += updated
+        job.last_id = ids[-1]
+        job.save(update_fields=['processed', 'updated', 'last_id'])
+    return True
+
+
+def run_job(job_id, chunk_size=None):
+    """
+    Выполняет переоценку целиком; вызывается задачей run_repricing_job.
+    """
+    RepricingJob.objects.filter(id=job_id, status=RepricingJob.PENDING).update(
+        status=RepricingJob.RUNNING, started_at=timezone.now()
+    )
+    try:
+        while process_chunk(job_id, chunk_size):
+            pass
+    except Exception as exc:
+        logger.exception(f"Переоценка {job_id} прервана")
+        RepricingJob.objects.filter(id=job_id).update(
+            status=RepricingJob.FAILED, error=str(exc), finished_at=timezone.now()
+        )
+    return RepricingJob.objects.get(id=job_id)
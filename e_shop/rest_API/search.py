@@ -0,0 +1,42 @@
+"""
+Полнотекстовый поиск по каталогу.
+
+Product.search_vector заполняется триггером Postgres из title (вес A) и description (вес B)
+с русской морфологией и индексируется GIN, поэтому поиск не сканирует таблицу.
+Последнее слово запроса ищется по префиксу, что позволяет использовать поиск для подсказок.
+"""
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F
+
+
+SEARCH_CONFIG = 'russian'
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def build_search_query(text, prefix=True):
+    """
+    Строит tsquery из пользовательского ввода: все слова обязательны,
+    последнее сопоставляется по префиксу. Возвращает None, если слов нет.
+    """
+    words = WORD_RE.findall(text.lower())
+    if not words:
+        return None
+    if prefix:
+        words[-1] += ':*'
+    return SearchQuery(' & '.join(words), config=SEARCH_CONFIG, search_type='raw')
+
+
+def search_products(queryset, text, prefix=True):
+    """
+    Фильтрует товары по запросу и сортирует по релевантности.
+    """
+    query = build_search_query(text, prefix)
+    if query is None:
+        return queryset.none()
+    return (
+        queryset.filter(search_vector=query)
+        .annotate(rank=SearchRank(F('search_vector'), query))
+        .order_by('-rank', 'id')
+    )
@@ -1,7 +1,9 @@
-from .models import Supplier, Product, Order, OrderItem
+from decimal import Decimal
+
+from .models import Supplier, Product, Order, OrderItem, PriceHistory
 from django.contrib.auth.models import User
 from rest_framework import serializers
-from .models import Cart
+from .models import Cart, CartItem
 from .models import Contact
 
 class ContactSerializer(serializers.ModelSerializer):
@@ -24,25 +26,109 @@ class SupplierSerializer(serializers.ModelSerializer):
         model = Supplier
         fields = ['id', 'name', 'is_active']
 
-class ProductSerializer(serializers.ModelSerializer):
+class SparseFieldsetMixin:
+    """
+    Оставляет в выводе только поля, перечисленные в context['fields'] (если они заданы).
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = self.context.get('fields')
+        if requested:
+            for name in set(self.fields) - set(requested):
+                self.fields.pop(name)
+
+class ProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = ['id', 'title', 'description', 'supplier', 'price', 'quantity', 'parameters']
 
+class ProductSnapshotSerializer(serializers.ModelSerializer):
+    """
+    Товар с ценой и остатком на момент времени (см. history.catalog_snapshot).
+    """
+    class Meta:
+        model = Product
+        fields = ['id', 'title', 'supplier', 'price', 'quantity']
+
+class PriceHistorySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PriceHistory
+        fields = ['recorded_at', 'price', 'old_price', 'quantity', 'old_quantity']
+
+class PriceHistoryQuerySerializer(serializers.Serializer):
+    since = serializers.DateTimeField(required=False)
+    until = serializers.DateTimeField(required=False)
+
+class OrderQuerySerializer(serializers.Serializer):
+    since = serializers.DateTimeField(required=False)
+
+class SnapshotQuerySerializer(serializers.Serializer):
+    at = serializers.DateTimeField()
+    supplier = serializers.IntegerField(required=False)
+
 class OrderItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = OrderItem
         fields = ['product', 'quantity', 'price']
 
+class OrderProductSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Product
+        fields = ['id', 'title', 'supplier']
+
+class ExpandedOrderItemSerializer(OrderItemSerializer):
+    product = OrderProductSerializer(read_only=True)
+
 class OrderSerializer(serializers.ModelSerializer):
+    """
+    Заказ с позициями. context['expand'] может содержать 'product' (краткие данные товара
+    вместо id) и 'contact_info' (контакт вместо id); связанные объекты должны быть выбраны
+    заранее (см. views.order_queryset), иначе сериализация выполнит запрос на каждую позицию.
+    """
+    EXPANDABLE = ('product', 'contact_info')
+
     items = OrderItemSerializer(many=True)
 
     class Meta:
         model = Order
-        fields = ['id', 'buyer', 'contact_info', 'created_timestamp', 'updated_timestamp', 'status', 'items']
-        read_only_fields = ['buyer', 'created_timestamp', 'updated_timestamp', 'items']
+        fields = ['id', 'buyer', 'contact_info', 'created_timestamp', 'updated_timestamp', 'status',
+                  'total_amount', 'item_count', 'items']
+        read_only_fields = ['buyer', 'created_timestamp', 'updated_timestamp', 'total_amount', 'item_count', 'items']
+
+    def get_fields(self):
+        fields = super().get_fields()
+        expand = self.context.get('expand', ())
+        if 'product' in expand:
+            fields['items'] = ExpandedOrderItemSerializer(many=True, read_only=True)
+        if 'contact_info' in expand:
+            fields['contact_info'] = ContactSerializer(read_only=True)
+        return fields
+
+class CartItemSerializer(serializers.ModelSerializer):
+    title = serializers.CharField(source='product.title', read_only=True)
+    price = serializers.DecimalField(source='product.price', max_digits=10, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = CartItem
+        fields = ['product', 'title', 'price', 'quantity']
+
+class CartItemWriteSerializer(serializers.Serializer):
+    product = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1, default=1)
 
 class CartSerializer(serializers.ModelSerializer):
+    """
+    Корзина с позициями; позиции передаются в context['items'] уже выбранными (см. carts.cart_items).
+    """
+    items = serializers.SerializerMethodField()
+    total = serializers.SerializerMethodField()
+
     class Meta:
         model = Cart
-        fields = ['id', 'owner', 'product', 'quantity']
\ No newline at end of file
+        fields = ['id', 'owner', 'items', 'total']
+
+    def get_items(self, cart):
+        return CartItemSerializer(self.context['items'], many=True).data
+
+    def get_total(self, cart):
+        return str(sum((item.product.price * item.quantity for item in self.context['items']), Decimal(0)))
\ No newline at end of file
@@ -0,0 +1,31 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import token_cache
+from .cache import invalidate_catalog
+from .models import Product, Supplier
+
+
+@receiver([post_save, post_delete], sender=Product)
+def product_changed(sender, instance, **kwargs):
+    invalidate_catalog([instance.supplier_id])
+
+
+@receiver([post_save, post_delete], sender=Supplier)
+def supplier_changed(sender, instance, **kwargs):
+    invalidate_catalog([instance.id], suppliers=True)
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    token_cache.invalidate([instance.key])
+
+
+@receiver(post_save, sender=get_user_model())
+def user_changed(sender, instance, created, update_fields=None, **kwargs):
+    # Пароль, is_active и другие поля пользователя хранятся в кэше вместе с токеном
+    if created or update_fields == frozenset(['last_login']):
+        return
+    token_cache.invalidate(Token.objects.filter(user_id=instance.pk).values_list('key', flat=True))
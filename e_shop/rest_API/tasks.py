@@ -1,16 +1,153 @@
 # rest_API/tasks.py
-from celery import shared_task
-from django.core.mail import send_mail
+import logging
+
+from celery import chord, shared_task
 from django.conf import settings
 
+from .archive import archive_orders as archive_old_orders
+from .emails import drain_outbox, enqueue_order_email
+from .events import order_event, publish_pending
+from .importer import ProductImporter
+from .inventory import get_inventory, reservations_enabled
+from .models import OrderEvent
+from .partitions import create_partitions as create_monthly_partitions
+from .repricing import run_job
+
+
+logger = logging.getLogger(__name__)
+
+
 @shared_task
 def send_order_email(order_id, recipient_email):
     """
-    Отправляет письмо с подтверждением заказа.
+    Ставит письмо с подтверждением заказа в outbox.
+    Оставлена для задач, поставленных в очередь до перехода на outbox (см. emails.py).
     order_id - ID заказа
     recipient_email - email получателя
     """
-    subject = f"Подтверждение заказа #{order_id}"
-    message = f"Ваш заказ #{order_id} успешно оформлен!"
-    from_email = settings.DEFAULT_FROM_EMAIL  # Убедитесь, что настроен DEFAULT_FROM_EMAIL
-    send_mail(subject, message, from_email, [recipient_email])
\ No newline at end of file
+    enqueue_order_email(order_id, recipient_email)
+
+
+@shared_task
+def send_order_emails():
+    """
+    Отправляет накопившиеся письма по заказам пачками, пока очередь не опустеет.
+    """
+    totals = {'sent': 0, 'retried': 0, 'failed': 0}
+    while True:
+        result = drain_outbox()
+        for key, value in result.items():
+            totals[key] += value
+        if sum(result.values()) < settings.EMAIL_OUTBOX_BATCH_SIZE:
+            return totals
+
+
+@shared_task
+def process_order_events(events):
+    """
+    Передает пачку событий заказов получателям сигнала events.order_event.
+    """
+    for event in events:
+        order_event.send(sender=OrderEvent, event=event)
+    return len(events)
+
+
+@shared_task
+def publish_order_events():
+    """
+    Публикует события заказов, которые не удалось опубликовать сразу после коммита.
+    """
+    return publish_pending()
+
+
+@shared_task
+def run_repricing_job(job_id):
+    """
+    Выполняет массовую переоценку по частям (см. repricing.py).
+    """
+    job = run_job(job_id)
+    return {'job': job.id, 'status': job.status, 'processed': job.processed, 'updated': job.updated}
+
+
+@shared_task
+def create_partitions():
+    """
+    Создает секции секционированных таблиц на PARTITION_MONTHS_AHEAD месяцев вперед (см. partitions.py).
+    """
+    return create_monthly_partitions()
+
+
+@shared_task
+def archive_orders():
+    """
+    Выгружает в файлы и удаляет секции заказов старше ORDER_ARCHIVE_AFTER_MONTHS (см. archive.py).
+    """
+    return [
+        {'month': f'{month:%Y-%m}', 'path': path, 'orders': count}
+        for month, path, count in archive_old_orders()
+    ]
+
+
+@shared_task
+def import_price_list(path, sync=False):
+    """
+    Импортирует один прайс-лист в отдельной транзакции.
+    Ошибка возвращается в результате, чтобы не срывать остальные задачи группы.
+    """
+    try:
+        stats = ProductImporter().import_path(path, sync=sync)
+    except Exception as exc:
+        logger.exception(f"Ошибка импорта {path}")
+        return {'source': path, 'error': str(exc)}
+    return stats.as_dict()
+
+
+@shared_task
+def summarize_price_list_imports(results):
+    """
+    Сводит результаты параллельного импорта прайс-листов.
+    """
+    failures = [result for result in results if 'error' in result]
+    return {
+        'files': len(results),
+        'failed': failures,
+        'rows': sum(result.get('created', 0) + result.get('updated', 0) + result.get('unchanged', 0) for result in results),
+        'deactivated': sum(result.get('deactivated', 0) for result in results),
+    }
+
+
+def import_price_lists(paths, sync=False):
+    """
+    Раздает прайс-листы воркерам Celery (по задаче на файл) и собирает сводку.
+    """
+    return chord(import_price_list.s(path, sync) for path in paths)(summarize_price_list_imports.s())
+
+
+@shared_task
+def flush_inventory():
+    """
+    Применяет накопленные в Redis списания остатков к базе.
+    """
+    if not reservations_enabled():
+        return 0
+    return get_inventory().flush()
+
+
+@shared_task
+def release_expired_reservations():
+    """
+    Возвращает в остаток резервы корзин с истекшим сроком.
+    """
+    if not reservations_enabled():
+        return 0
+    return get_inventory().release_expired()
+
+
+@shared_task
+def reconcile_inventory():
+    """
+    Сверяет остатки в Redis с базой и исправляет расхождения.
+    """
+    if not reservations_enabled():
+        return 0
+    return get_inventory().reconcile()
@@ -1,11 +1,92 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+import time
+import unittest
+from queue import Queue
+from datetime import datetime, time as datetime_time, timedelta, timezone as datetime_timezone
+from decimal import Decimal
+from unittest import mock
+
+import yaml
+from asgiref.sync import sync_to_async
+from celery import current_app
+try:
+    import fakeredis
+except ImportError:  # fakeredis нужен только для тестов резервирования
+    fakeredis = None
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import caches
+from django.core.mail import get_connection
+from django.core.management import call_command
+from django.db import IntegrityError, connection, router
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 from rest_framework import status
 
-from .models import Supplier, Product
+from . import metrics
+from .archive import archivable_months, archive_orders
+from .authentication import KEY_PREFIX, token_cache
+from .benchmarks import (SCENARIOS, Measurement, compare_with_baseline, generate_catalog, generate_orders,
+                         make_supplier)
+from .cache import CatalogCache, catalog_cache, supplier_scope
+from .carts import get_cart
+from .emails import drain_outbox, enqueue_order_email
+from .events import order_event, publish_pending
+from .importer import ParallelImportRunner, ProductImporter, open_feed, parse_feed_file
+from .inventory import InventoryService, ReservationError
+from .models import (Cart, CartItem, Contact, Order, OrderEmail, OrderEvent, OrderItem, PriceHistory, RepricingJob,
+                     Supplier, Product)
+from .pagination import estimate_table_rows
+from .partitions import create_partitions, list_partitions
+from .replicas import catalog_scope, choose_replica, pins, replica_reads, routed_reads
+from .repricing import cancel_job, preview, process_chunk, run_job, start_job
+from .summary import rebuild_order_summary
+from .tasks import import_price_list, process_order_events
+from .urls import api_router
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+class CatalogCacheMixin:
+    """
+    Очищает кэш каталога перед каждым тестом: товары, созданные bulk_create,
+    не вызывают сигналов и не меняют версии кэша.
+    """
+    def setUp(self):
+        super().setUp()
+        catalog_cache.clear()
+
+
+class QueryBudgetMixin:
+    """
+    Проверка числа SQL-запросов эндпоинта: тест падает, если запрос к API
+    выполнил больше запросов к базе, чем заявлено в бюджете.
+    """
+    def assertQueryBudget(self, budget, path, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path, params or {})
+            if response.streaming:
+                # Запросы потокового ответа выполняются при чтении тела
+                b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, f'{path}: {response.status_code}')
+        self.assertLessEqual(
+            len(queries), budget,
+            f'{path}: {len(queries)} запросов при бюджете {budget}:\n' + '\n'.join(query['sql'] for query in queries),
+        )
+        return response
 
 
-class ProductsListTest(TestCase):
+class ProductsListTest(CatalogCacheMixin, TestCase):
     """
     тестовый класс, который регистрирует и авторизует пользователя,
     создаёт тестовый товар, а затем отправляет запрос GET к эндпоинту
@@ -13,6 +94,7 @@ class ProductsListTest(TestCase):
     бы одним товаром.
     """
     def setUp(self):
+        super().setUp()
         self.client = APIClient()
         # Регистрируем пользователя
         response = self.client.post(
@@ -54,6 +136,1324 @@ class ProductsListTest(TestCase):
     def test_get_products(self):
         response = self.client.get('/products/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        # Проверяем, что возвращается список товаров с хотя бы одним товаром.
-        self.assertTrue(isinstance(response.data, list))
-        self.assertTrue(len(response.data) >= 1)
\ No newline at end of file
+        # Проверяем, что возвращается страница со списком товаров с хотя бы одним товаром.
+        self.assertTrue(isinstance(response.data['results'], list))
+        self.assertTrue(len(response.data['results']) >= 1)
+
+
+class FeedFileMixin:
+    """
+    Загружает прайс-лист из data/shop1.yaml и записывает измененные копии во временные файлы.
+    """
+    def setUp(self):
+        with open(os.path.join(DATA_DIR, 'shop1.yaml'), encoding='utf-8') as file:
+            self.feed = yaml.safe_load(file)
+
+    def write_feed(self, data, suffix='.yaml'):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(handle, 'w', encoding='utf-8') as file:
+            yaml.safe_dump(data, file, allow_unicode=True)
+        self.addCleanup(os.remove, path)
+        return path
+
+
+class ImportProductsTest(FeedFileMixin, TestCase):
+    """
+    Проверяет, что импорт прайс-листа сопоставляет товары по внешнему id,
+    не создает дубликаты при повторном запуске и обновляет только изменившиеся строки.
+    """
+    def test_reimport_does_not_duplicate(self):
+        call_command('import_products', stdout=open(os.devnull, 'w'))
+        call_command('import_products', stdout=open(os.devnull, 'w'))
+        self.assertEqual(Product.objects.count(), len(self.feed['goods']))
+        product = Product.objects.get(external_id=4216292)
+        self.assertEqual(product.category.name, 'Смартфоны')
+        self.assertEqual(product.parameters['Цвет'], 'золотистый')
+
+    def test_only_changed_rows_are_updated(self):
+        importer = ProductImporter(batch_size=5)
+        importer.import_path(os.path.join(DATA_DIR, 'shop1.yaml'))
+        self.feed['goods'][0]['price'] = 99990
+        self.feed['goods'][1]['parameters']['Цвет'] = 'белый'
+        stats = importer.import_path(self.write_feed(self.feed))
+        self.assertEqual((stats.created, stats.updated), (0, 2))
+        self.assertEqual(stats.unchanged, len(self.feed['goods']) - 2)
+        self.assertEqual(Product.objects.get(external_id=self.feed['goods'][0]['id']).price, 99990)
+
+    def test_csv_feed(self):
+        handle, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(handle, 'w', encoding='utf-8') as file:
+            file.write('shop,id,category,name,price,price_rrc,quantity,parameters\n')
+            file.write('CSV Shop,1,,Кабель USB,150,199,40,"{""Длина (м)"": 1}"\n')
+        self.addCleanup(os.remove, path)
+        stats = ProductImporter().import_path(path)
+        self.assertEqual(stats.created, 1)
+        self.assertEqual(Product.objects.get(supplier__name='CSV Shop').parameters, {'Длина (м)': 1})
+
+
+class CatalogExportTest(FeedFileMixin, CatalogCacheMixin, TestCase):
+    """
+    Проверяет потоковую выгрузку каталога: YAML повторно импортируется без изменений,
+    эндпоинт отдает CSV и сжатый JSON Lines частями.
+    """
+    def setUp(self):
+        super().setUp()
+        ProductImporter().import_path(os.path.join(DATA_DIR, 'shop1.yaml'))
+        self.supplier = Supplier.objects.get(name=self.feed['shop'])
+
+    def test_yaml_export_round_trips_through_import(self):
+        handle, path = tempfile.mkstemp(suffix='.yaml')
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        call_command('export_products', self.feed['shop'], '--output', path, stderr=open(os.devnull, 'w'))
+
+        with open(path, encoding='utf-8') as file:
+            exported = yaml.safe_load(file)
+        self.assertEqual(exported['shop'], self.feed['shop'])
+        self.assertEqual(sorted(category['id'] for category in exported['categories']),
+                         sorted(category['id'] for category in self.feed['categories']))
+        self.assertEqual(sorted(good['id'] for good in exported['goods']),
+                         sorted(good['id'] for good in self.feed['goods']))
+        stats = ProductImporter().import_path(path, sync=True)
+        self.assertEqual((stats.created, stats.updated, stats.deactivated), (0, 0, 0))
+        self.assertEqual(stats.unchanged, len(self.feed['goods']))
+
+    def test_endpoint_streams_csv_and_gzip(self):
+        path = f'/suppliers/{self.supplier.id}/export/'
+        response = self.client.get(path, {'output': 'csv'})
+        self.assertTrue(response.streaming)
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode('utf-8'))))
+        self.assertEqual(len(rows), len(self.feed['goods']))
+        self.assertEqual(rows[0]['shop'], self.feed['shop'])
+
+        response = self.client.get(path, {'output': 'jsonl', 'gzip': '1'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        lines = gzip.decompress(b''.join(response.streaming_content)).decode('utf-8').splitlines()
+        self.assertEqual(json.loads(lines[0])['id'], Product.objects.order_by('id').first().external_id)
+        self.assertEqual(len(lines), len(self.feed['goods']))
+        self.assertEqual(self.client.get(path, {'output': 'xml'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RepricingTest(CatalogCacheMixin, TestCase):
+    """
+    Проверяет массовую переоценку: предпросмотр агрегатами, выполнение по частям
+    с прогрессом только для товаров под фильтрами и запуск из админки.
+    """
+    def setUp(self):
+        super().setUp()
+        self.supplier = Supplier.objects.create(name='Supplier A')
+        self.other = Supplier.objects.create(name='Supplier B')
+        Product.objects.bulk_create([
+            Product(title=f'Phone {number}', description='', supplier=supplier, price=Decimal('995.00') + number,
+                    price_rrc=Decimal('1200.00') if number % 2 else None, quantity=1,
+                    parameters={'Цвет': 'черный' if number < 4 else 'белый'})
+            for supplier in (self.supplier, self.other) for number in range(5)
+        ])
+        patcher = mock.patch.object(current_app, 'send_task')
+        self.send_task = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def prices(self, supplier):
+        return list(Product.objects.filter(supplier=supplier).order_by('id').values_list('price', flat=True))
+
+    def test_markup_runs_in_chunks_within_filters(self):
+        job = RepricingJob.objects.create(percent=10, rounding='10', supplier=self.supplier,
+                                          parameters={'Цвет': 'черный'})
+        totals = preview(job)
+        self.assertEqual((totals['products'], totals['changed'], totals['raised']), (4, 4, 4))
+        self.assertEqual(totals['new_total'], Decimal('4390.00'))  # 1094.50 -> 1090, 1095.60.. -> 1100
+
+        with self.captureOnCommitCallbacks(execute=True):
+            start_job(job)
+        self.send_task.assert_called_once_with('rest_API.tasks.run_repricing_job', args=[job.id])
+        job = run_job(job.id, chunk_size=3)
+        self.assertEqual((job.status, job.total, job.processed, job.updated, job.progress), ('done', 4, 4, 4, 100))
+        self.assertEqual(self.prices(self.supplier), [Decimal('1090.00')] + [Decimal('1100.00')] * 3 + [Decimal('999.00')])
+        self.assertEqual(self.prices(self.other), [Decimal('995.00') + number for number in range(5)])
+
+    def test_set_to_rrc_and_cancel(self):
+        job = RepricingJob.objects.create(base=RepricingJob.BASE_RRC, status=RepricingJob.RUNNING)
+        self.assertTrue(process_chunk(job.id, chunk_size=2))
+        cancel_job(job)
+        self.assertFalse(process_chunk(job.id, chunk_size=2))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed), ('canceled', 2))
+        self.assertEqual(Product.objects.filter(price=Decimal('1200.00')).count(), 2)
+
+    def test_admin_preview_and_start(self):
+        admin_user = User.objects.create_superuser(username='admin', password='qwerty12345')
+        self.client.force_login(admin_user)
+        data = {'base': 'price', 'percent': '-50', 'rounding': '1', 'supplier': self.other.id, 'parameters': '{}'}
+        response = self.client.post('/admin/rest_API/product/bulk-update/', {**data, 'preview': '1'})
+        self.assertContains(response, 'Изменится цена')
+        self.assertFalse(RepricingJob.objects.exists())
+
+        response = self.client.post('/admin/rest_API/product/bulk-update/', {**data, 'start': '1'})
+        job = RepricingJob.objects.get()
+        self.assertRedirects(response, f'/admin/rest_API/repricingjob/{job.id}/change/')
+        self.assertEqual((job.status, job.total), ('pending', 5))
+        self.assertEqual(self.client.get(f'/admin/rest_API/repricingjob/{job.id}/change/').status_code, 200)
+
+
+class AdminChangelistTest(TestCase):
+    """
+    Проверяет списки админки для больших таблиц: число запросов не зависит от числа строк,
+    при большой оценке COUNT(*) не выполняется, поиск по id и полнотекстовый.
+    """
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser(username='admin', password='qwerty12345'))
+        self.supplier = Supplier.objects.create(name='Supplier A')
+        generate_catalog(self.supplier, 5)
+        generate_orders(self.supplier, users=2, orders_per_user=2, items_per_order=1)
+
+    def changelist_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        for url in ('/admin/rest_API/product/', '/admin/rest_API/order/', '/admin/rest_API/cart/'):
+            before = self.changelist_queries(url)
+            generate_catalog(make_supplier(), 5)
+            generate_orders(self.supplier, users=3, orders_per_user=2, items_per_order=1)
+            self.assertEqual(self.changelist_queries(url), before, url)
+
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=0)
+    def test_large_table_uses_estimated_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/admin/rest_API/product/', {'is_active__exact': '1'})
+        self.assertEqual(response.status_code, 200)
+        sql = [query['sql'] for query in queries]
+        self.assertTrue(any(statement.startswith('EXPLAIN') for statement in sql))
+        self.assertFalse(any('COUNT(*)' in statement and 'rest_api_product' in statement.lower() for statement in sql))
+
+    def test_partitioned_table_estimate_without_parent_analyze(self):
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                CREATE TABLE estimate_test (id int, created date) PARTITION BY RANGE (created);
+                CREATE TABLE estimate_test_p1 PARTITION OF estimate_test FOR VALUES FROM ('2020-01-01') TO ('2020-02-01');
+                CREATE TABLE estimate_test_p2 PARTITION OF estimate_test FOR VALUES FROM ('2020-02-01') TO ('2020-03-01');
+                CREATE TABLE estimate_test_p3 PARTITION OF estimate_test FOR VALUES FROM ('2020-03-01') TO ('2020-04-01');
+            """)
+            self.assertIsNone(estimate_table_rows('default', 'estimate_test'))
+            cursor.execute("""
+                INSERT INTO estimate_test SELECT n, date '2020-01-01' + n % 40 FROM generate_series(1, 1000) AS n;
+                ANALYZE estimate_test_p1;
+                ANALYZE estimate_test_p2;
+            """)
+            # Как после autovacuum: секции проанализированы, родитель и новая секция - нет
+            cursor.execute("SELECT reltuples FROM pg_class WHERE oid = 'estimate_test'::regclass")
+            self.assertEqual(cursor.fetchone()[0], -1)
+        self.assertEqual(estimate_table_rows('default', 'estimate_test'), 1000)
+        self.assertIsNotNone(estimate_table_rows('default', 'rest_API_product'))
+
+    def test_search_by_id_and_text(self):
+        product = Product.objects.filter(supplier=self.supplier).first()
+        response = self.client.get('/admin/rest_API/product/', {'q': str(product.id)})
+        self.assertEqual(response.context['cl'].result_count, 1)
+        Product.objects.filter(id=product.id).update(title='Уникальный смартфон')
+        response = self.client.get('/admin/rest_API/product/', {'q': 'уникальн'})
+        self.assertEqual([item.id for item in response.context['cl'].result_list], [product.id])
+        order = Order.objects.first()
+        response = self.client.get('/admin/rest_API/order/', {'q': order.buyer.username})
+        self.assertTrue(all(item.buyer_id == order.buyer_id for item in response.context['cl'].result_list))
+
+
+class PriceHistoryTest(CatalogCacheMixin, TestCase):
+    """
+    Проверяет историю цен: запись триггером одной командой на пачку товаров,
+    историю товара и состояние каталога на момент времени через API.
+    """
+    def setUp(self):
+        super().setUp()
+        self.supplier = Supplier.objects.create(name='Supplier A')
+        self.products = Product.objects.bulk_create([
+            Product(title=f'Phone {price}', description='', supplier=self.supplier, price=price, quantity=5,
+                    parameters={})
+            for price in (Decimal('100.00'), Decimal('200.00'), Decimal('300.00'))
+        ])
+
+    def age_history(self, delta):
+        # В тесте вся история пишется в одной транзакции с одним now(); сдвигаем ее в прошлое
+        PriceHistory.objects.update(recorded_at=F('recorded_at') - delta)
+
+    def test_bulk_changes_are_recorded_per_statement(self):
+        self.assertEqual(PriceHistory.objects.filter(old_price__isnull=True).count(), 3)
+        with CaptureQueriesContext(connection) as queries:
+            Product.objects.filter(supplier=self.supplier).update(price=F('price') + 1)
+        self.assertEqual(len(queries), 1)
+        Product.objects.filter(supplier=self.supplier).update(title='Renamed')
+        changes = PriceHistory.objects.filter(old_price__isnull=False)
+        self.assertEqual(sorted(changes.values_list('old_price', 'price')), [
+            (Decimal('100.00'), Decimal('101.00')), (Decimal('200.00'), Decimal('201.00')),
+            (Decimal('300.00'), Decimal('301.00')),
+        ])
+
+        job = RepricingJob.objects.create(percent=10, status=RepricingJob.RUNNING, supplier=self.supplier)
+        self.assertTrue(process_chunk(job.id))
+        self.assertEqual(PriceHistory.objects.filter(price=Decimal('111.10')).count(), 1)
+
+    def test_history_and_snapshot_api(self):
+        first, second, _ = self.products
+        self.age_history(timedelta(days=3))
+        Product.objects.filter(id=first.id).update(price=Decimal('150.00'))
+        self.age_history(timedelta(days=1))  # создание - 4 дня назад, первая переоценка - 1 день назад
+        Product.objects.filter(id=first.id).update(price=Decimal('180.00'), quantity=4)
+        new = Product.objects.create(title='New phone', description='', supplier=self.supplier, price=50,
+                                     quantity=1, parameters={})
+        now = timezone.now()
+
+        response = self.client.get(f'/products/{first.id}/history/')
+        self.assertEqual([row['price'] for row in response.data['results']], ['180.00', '150.00', '100.00'])
+        self.assertEqual(response.data['results'][0]['old_quantity'], 5)
+        response = self.client.get(f'/products/{first.id}/history/', {'since': (now - timedelta(days=2)).isoformat()})
+        self.assertEqual(len(response.data['results']), 2)
+
+        response = self.client.get('/products/snapshot/', {'at': (now - timedelta(days=2)).isoformat()})
+        self.assertEqual(
+            [(row['id'], row['price'], row['quantity']) for row in response.data['results']],
+            [(first.id, '100.00', 5), (second.id, '200.00', 5), (self.products[2].id, '300.00', 5)],
+        )
+        response = self.client.get('/products/snapshot/', {'at': (now - timedelta(hours=12)).isoformat(),
+                                                           'supplier': self.supplier.id})
+        self.assertEqual(response.data['results'][0]['price'], '150.00')
+        response = self.client.get('/products/snapshot/', {'at': now.isoformat()})
+        self.assertEqual(response.data['results'][-1]['id'], new.id)
+        self.assertEqual(self.client.get('/products/snapshot/').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_monthly_partitions(self):
+        created = create_partitions(months_ahead=6)
+        self.assertEqual(created['rest_API_pricehistory'], 3)  # миграция создала текущий месяц и 3 следующих
+        names = [name for name, _ in list_partitions('rest_API_pricehistory')]
+        self.assertEqual(len(names), 8)
+        self.assertIn(f'rest_API_pricehistory_p{timezone.now():%Y%m}', names)
+        self.assertEqual(create_partitions(months_ahead=6)['rest_API_pricehistory'], 0)
+
+
+class OrderPartitionTest(TestCase):
+    """
+    Проверяет секционирование заказов: запрос с since читает только свежие секции,
+    старые месяцы выгружаются в архив и удаляются вместе с позициями.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', password='qwerty12345')
+        self.contact = Contact.objects.create(user=self.user, fname='Иван', lname='Иванов',
+                                              email='ivan@example.com', phone='+79000000000', address='Калуга')
+        supplier = Supplier.objects.create(name='Supplier A')
+        self.product = Product.objects.create(title='Phone', description='', supplier=supplier, price=100,
+                                              quantity=5, parameters={})
+        self.old_month = (timezone.now().replace(day=1) - timedelta(days=31 * 30)).date().replace(day=1)
+        create_partitions(months_ahead=0, start=self.old_month)
+        self.old_order = self.make_order(datetime.combine(
+            self.old_month + timedelta(days=14), datetime_time(12), tzinfo=datetime_timezone.utc))
+        self.new_order = self.make_order(timezone.now())
+
+    def make_order(self, created):
+        order = Order.objects.create(buyer=self.user, contact_info=self.contact, total_amount=100, item_count=1)
+        Order.objects.filter(id=order.id).update(created_timestamp=created)
+        OrderItem.objects.create(order=order, product=self.product, quantity=1, price=100, created_timestamp=created)
+        return order
+
+    def test_recent_orders_read_only_recent_partitions(self):
+        since = timezone.now() - timedelta(days=1)
+        plan = Order.objects.filter(buyer=self.user, created_timestamp__gte=since).explain()
+        self.assertIn(f'rest_API_order_p{timezone.now():%Y%m}', plan)
+        self.assertNotIn(f'rest_API_order_p{self.old_month:%Y%m}', plan)
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get('/orders/', {'since': since.isoformat()})
+        self.assertEqual([order['id'] for order in response.data], [self.new_order.id])
+        self.assertEqual(len(response.data[0]['items']), 1)
+        self.assertEqual(len(client.get('/orders/').data), 2)
+        self.assertEqual(client.get('/orders/', {'since': 'yesterday'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_archive_exports_and_drops_old_partitions(self):
+        self.assertEqual(archivable_months(), [self.old_month])
+        with tempfile.TemporaryDirectory() as directory:
+            [(month, path, count)] = archive_orders(directory=directory)
+            with gzip.open(path, 'rt', encoding='utf-8') as file:
+                archived = [json.loads(line) for line in file]
+        self.assertEqual((month, count), (self.old_month, 1))
+        self.assertEqual(archived[0]['id'], self.old_order.id)
+        self.assertEqual(archived[0]['items'][0]['product'], self.product.id)
+        self.assertEqual(list(Order.objects.values_list('id', flat=True)), [self.new_order.id])
+        self.assertFalse(OrderItem.objects.filter(order_id=self.old_order.id).exists())
+        self.assertNotIn(f'rest_API_order_p{self.old_month:%Y%m}', [name for name, _ in list_partitions('rest_API_order')])
+        self.assertEqual(archivable_months(), [])
+
+
+class CatalogSyncTest(FeedFileMixin, TestCase):
+    """
+    Проверяет режим синхронизации: применяется только разница с прошлым импортом,
+    пропавшие товары деактивируются, dry-run ничего не записывает.
+    """
+    def setUp(self):
+        super().setUp()
+        self.importer = ProductImporter()
+        self.importer.sync_feed(open_feed(os.path.join(DATA_DIR, 'shop1.yaml')))
+
+    def changed_feed(self):
+        removed = self.feed['goods'].pop()
+        self.feed['goods'][0]['quantity'] += 1
+        self.feed['goods'].append({**removed, 'id': 1, 'name': 'Новый товар'})
+        return self.write_feed(self.feed)
+
+    def test_sync_applies_only_delta(self):
+        path = self.changed_feed()
+        with self.assertNumQueries(9):
+            stats = self.importer.import_path(path, sync=True)
+        self.assertEqual((stats.created, stats.updated, stats.deactivated), (1, 1, 1))
+        self.assertEqual(stats.unchanged, len(self.feed['goods']) - 2)
+        self.assertEqual(Product.objects.filter(is_active=False).count(), 1)
+        self.assertEqual(Product.objects.get(external_id=self.feed['goods'][0]['id']).quantity,
+                         self.feed['goods'][0]['quantity'])
+
+    def test_dry_run_reports_diff_without_writing(self):
+        stats = self.importer.import_path(self.changed_feed(), dry_run=True)
+        self.assertEqual(stats.diff['created'], [1])
+        self.assertEqual(stats.diff['updated'], [self.feed['goods'][0]['id']])
+        self.assertEqual(len(stats.diff['deactivated']), 1)
+        self.assertFalse(Product.objects.filter(external_id=1).exists())
+        self.assertFalse(Product.objects.filter(is_active=False).exists())
+
+
+class ParallelImportTest(FeedFileMixin, TransactionTestCase):
+    """
+    Проверяет параллельный импорт: разбор в процессах, запись в потоках,
+    ошибка одного прайс-листа не мешает импорту остальных.
+    """
+    def test_broken_feed_is_isolated(self):
+        second = self.write_feed({**self.feed, 'shop': 'Второй магазин'})
+        broken = self.write_feed({'shop': 'Сломанный', 'goods': [{'id': 'abc', 'name': 'x'}]})
+        summary = ParallelImportRunner(workers=2, writers=2).run(
+            [os.path.join(DATA_DIR, 'shop1.yaml'), second, broken]
+        )
+        self.assertEqual(len(summary.results), 2)
+        self.assertEqual([path for path, _ in summary.failures], [broken])
+        self.assertEqual(summary.total, 2 * len(self.feed['goods']))
+        self.assertEqual(Product.objects.count(), 2 * len(self.feed['goods']))
+        self.assertFalse(Supplier.objects.filter(name='Сломанный').exists())
+
+    def test_feed_is_streamed_in_batches(self):
+        channel = Queue()
+        parse_feed_file(os.path.join(DATA_DIR, 'shop1.yaml'), channel, batch_size=2)
+        messages = [channel.get() for _ in range(channel.qsize())]
+        self.assertEqual(messages[0][0], 'header')
+        self.assertEqual(messages[-1], ('end', None))
+        batches = [payload for kind, payload in messages[1:-1]]
+        self.assertTrue(all(kind == 'goods' for kind, _ in messages[1:-1]))
+        self.assertTrue(all(len(batch) <= 2 for batch in batches))
+        self.assertEqual(sum(map(len, batches)), len(self.feed['goods']))
+
+        parse_feed_file(self.write_feed({'goods': []}), channel)
+        self.assertEqual(channel.get()[0], 'error')
+
+    def test_task_returns_unexpected_errors(self):
+        path = os.path.join(DATA_DIR, 'shop1.yaml')
+        with mock.patch.object(ProductImporter, 'import_path', side_effect=IntegrityError('duplicate key')), \
+                self.assertLogs('rest_API.tasks', 'ERROR'):
+            result = import_price_list(path)
+        self.assertEqual(result, {'source': path, 'error': 'duplicate key'})
+
+
+class CheckoutFixtureMixin:
+    """
+    Пользователь с контактом и 25 товаров по 5 штук; confirm() оформляет заказ из корзины пользователя.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', password='qwerty12345')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.contact = Contact.objects.create(user=self.user, fname='Иван', lname='Иванов',
+                                              email='ivan@example.com', phone='+79000000000', address='Калуга')
+        supplier = Supplier.objects.create(name='Test Supplier')
+        self.products = Product.objects.bulk_create([
+            Product(title=f'Product {number}', description='', supplier=supplier,
+                    price=100 + number, quantity=5, parameters={})
+            for number in range(25)
+        ])
+        self.cart = get_cart(self.user)
+
+    def confirm(self, size, quantity=2):
+        CartItem.objects.bulk_create([
+            CartItem(cart=self.cart, product=product, quantity=quantity) for product in self.products[:size]
+        ])
+        return self.client.post('/orders/confirm/', {'cart_id': self.cart.id, 'contact_id': self.contact.id}, format='json')
+
+
+class ConfirmOrderTest(CheckoutFixtureMixin, TestCase):
+    """
+    Проверяет оформление заказа: постоянное число запросов независимо от размера корзины,
+    списание остатков и отказ без изменений при нехватке товара.
+    """
+
+    def test_query_count_does_not_depend_on_cart_size(self):
+        with CaptureQueriesContext(connection) as small:
+            response = self.confirm(1)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        with CaptureQueriesContext(connection) as large:
+            response = self.confirm(25)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(small), len(large))
+
+        order = Order.objects.get(id=response.data['order_id'])
+        self.assertEqual(order.items.count(), 25)
+        self.assertEqual(Product.objects.get(id=self.products[0].id).quantity, 1)
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_insufficient_stock_rolls_back(self):
+        response = self.confirm(3, quantity=6)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(len(response.data['items']), 3)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(CartItem.objects.count(), 3)
+        self.assertTrue(all(product.quantity == 5 for product in Product.objects.all()))
+
+
+class ShoppingCartTest(CheckoutFixtureMixin, TestCase):
+    """
+    Проверяет корзину: одна корзина на пользователя, повторное добавление товара
+    меняет количество без дублей, GET выполняется за постоянное число запросов.
+    """
+    def add(self, product, quantity):
+        return self.client.post('/cart/', {'product': product.id, 'quantity': quantity}, format='json')
+
+    def test_upsert_keeps_single_item(self):
+        self.assertEqual(self.add(self.products[0], 2).status_code, status.HTTP_201_CREATED)
+        response = self.add(self.products[0], 4)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['quantity'], 4)
+        self.assertEqual(Cart.objects.filter(owner=self.user).count(), 1)
+        self.assertEqual(list(CartItem.objects.values_list('quantity', flat=True)), [4])
+
+        self.assertEqual(self.add(self.products[1], 0).status_code, status.HTTP_400_BAD_REQUEST)
+        Product.objects.filter(id=self.products[1].id).update(is_active=False)
+        self.assertEqual(self.add(self.products[1], 1).status_code, status.HTTP_404_NOT_FOUND)
+
+        self.assertEqual(self.client.delete(f'/cart/{self.products[0].id}/').status_code,
+                         status.HTTP_204_NO_CONTENT)
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_get_query_count_does_not_depend_on_cart_size(self):
+        self.add(self.products[0], 1)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get('/cart/')
+        for product in self.products[1:]:
+            self.add(product, 2)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get('/cart/')
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(len(response.data['items']), 25)
+        self.assertEqual(response.data['items'][1]['title'], 'Product 1')
+        self.assertEqual(Decimal(response.data['total']), sum(100 + number for number in range(1, 25)) * 2 + 100)
+
+    def test_confirm_order_uses_user_cart(self):
+        self.add(self.products[0], 2)
+        response = self.client.post('/orders/confirm/', {'contact_id': self.contact.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.client.get('/cart/').data['items'], [])
+
+
+class OrderSummaryTest(CheckoutFixtureMixin, TestCase):
+    """
+    Проверяет суммы заказа, заполняемые при оформлении, и сводку /orders/summary/,
+    которую триггер обновляет при создании заказа и смене статуса.
+    """
+    def test_totals_and_summary_follow_orders(self):
+        self.confirm(2, quantity=2)
+        response = self.confirm(1, quantity=1)
+        order = Order.objects.get(id=response.data['order_id'])
+        self.assertEqual((order.total_amount, order.item_count), (100, 1))
+        self.assertEqual(self.client.get(f'/orders/{order.id}/').data['total_amount'], '100.00')
+
+        summary = self.client.get('/orders/summary/').data
+        self.assertEqual(summary['orders'], 2)
+        self.assertEqual(summary['by_status']['confirmed'], 2)
+        self.assertEqual(Decimal(summary['lifetime_spend']), (100 + 101) * 2 + 100)
+
+        self.client.patch(f'/orders/{order.id}/update-status/', {'status': 'canceled'}, format='json')
+        summary = self.client.get('/orders/summary/').data
+        self.assertEqual((summary['by_status']['confirmed'], summary['by_status']['canceled']), (1, 1))
+        self.assertEqual(Decimal(summary['lifetime_spend']), (100 + 101) * 2)
+
+    def test_rebuild_matches_incremental_summary(self):
+        self.confirm(3)
+        Order.objects.filter(buyer=self.user).update(status='delivered')
+        incremental = self.client.get('/orders/summary/').data
+        rebuild_order_summary([self.user.id])
+        self.assertEqual(self.client.get('/orders/summary/').data, incremental)
+
+
+@override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=2, EMAIL_OUTBOX_RETRY_DELAY=60)
+class OrderEmailOutboxTest(CheckoutFixtureMixin, TestCase):
+    """
+    Проверяет очередь писем: заказ ставит письмо в outbox, задача отправляет пачку
+    через одно соединение, повторный запуск и повторная постановка не дублируют письма,
+    ошибки отправки повторяются с задержкой.
+    """
+    def test_batch_is_sent_over_one_connection_once(self):
+        for _ in range(3):
+            self.assertEqual(self.confirm(2, quantity=1).status_code, status.HTTP_201_CREATED)
+        order = Order.objects.order_by('id').first()
+        enqueue_order_email(order.id, self.contact.email)
+        self.assertEqual(OrderEmail.objects.count(), 3)
+
+        with mock.patch('rest_API.emails.get_connection', wraps=get_connection) as connect, \
+                self.assertNumQueries(5):
+            self.assertEqual(drain_outbox(), {'sent': 3, 'retried': 0, 'failed': 0})
+        self.assertEqual(connect.call_count, 1)
+        self.assertEqual(len(mail.outbox), 3)
+        message = mail.outbox[0]
+        self.assertEqual(message.subject, f'Подтверждение заказа #{order.id}')
+        self.assertIn('Product 1 - 1 шт. x 101.00 руб.', message.body)
+        self.assertIn(f'Сумма заказа: {order.total_amount} руб.', message.body)
+
+        self.assertEqual(drain_outbox(), {'sent': 0, 'retried': 0, 'failed': 0})
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_failures_are_retried_with_backoff(self):
+        self.confirm(1)
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages',
+                        side_effect=ConnectionError('smtp down')):
+            self.assertEqual(drain_outbox()['retried'], 1)
+            email = OrderEmail.objects.get()
+            self.assertEqual((email.status, email.attempts, email.last_error), (OrderEmail.PENDING, 1, 'smtp down'))
+            # До истечения задержки письмо не выбирается
+            self.assertEqual(drain_outbox()['retried'], 0)
+            self.assertEqual(drain_outbox(now=email.next_attempt_at)['failed'], 1)
+        self.assertEqual(OrderEmail.objects.get().status, OrderEmail.FAILED)
+        self.assertEqual(len(mail.outbox), 0)
+
+
+@override_settings(ORDER_EVENTS_ASYNC_RELAY=False)
+class OrderEventOutboxTest(CheckoutFixtureMixin, TestCase):
+    """
+    Проверяет outbox событий заказов: событие пишется в транзакции заказа,
+    публикуется пачкой после коммита и не теряется при недоступном брокере.
+    """
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(current_app, 'send_task')
+        self.send_task = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def published(self):
+        return [event for call in self.send_task.call_args_list for event in call.kwargs['args'][0]]
+
+    def test_events_are_published_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.confirm(1)
+            self.send_task.assert_not_called()
+        order_id = response.data['order_id']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/orders/{order_id}/update-status/', {'status': 'shipped'}, format='json')
+            self.client.patch(f'/orders/{order_id}/update-status/', {'status': 'shipped'}, format='json')
+
+        events = self.published()
+        self.assertEqual([(event['order'], event['type']) for event in events],
+                         [(order_id, 'order_confirmed'), (order_id, 'status_changed')])
+        self.assertEqual(events[1]['payload'], {'old': 'confirmed', 'new': 'shipped'})
+        self.assertFalse(OrderEvent.objects.filter(published_at__isnull=True).exists())
+
+    def test_broker_outage_keeps_events_for_bulk_retry(self):
+        self.send_task.side_effect = ConnectionError('broker down')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.confirm(1).status_code, status.HTTP_201_CREATED)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.confirm(1).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(OrderEvent.objects.filter(published_at__isnull=True).count(), 2)
+
+        self.send_task.reset_mock(side_effect=True)
+        self.assertEqual(publish_pending(), 2)
+        self.assertEqual(self.send_task.call_count, 1)
+        self.assertEqual(len(self.published()), 2)
+
+    def test_worker_dispatches_events_to_receivers(self):
+        receiver = mock.Mock()
+        order_event.connect(receiver, dispatch_uid='test-receiver')
+        self.addCleanup(order_event.disconnect, dispatch_uid='test-receiver')
+        self.assertEqual(process_order_events([{'id': 1, 'type': 'order_confirmed'}]), 1)
+        self.assertEqual(receiver.call_args.kwargs['event'], {'id': 1, 'type': 'order_confirmed'})
+
+
+@unittest.skipIf(fakeredis is None, 'fakeredis не установлен')
+@override_settings(INVENTORY_RESERVATIONS_ENABLED=True)
+class InventoryReservationTest(CheckoutFixtureMixin, TestCase):
+    """
+    Проверяет резервирование остатков в Redis: резерв уменьшает свободный остаток,
+    оформление заказа списывает его без изменения базы до flush, reconcile чинит расхождения.
+    """
+    def setUp(self):
+        super().setUp()
+        self.inventory = InventoryService(fakeredis.FakeRedis(), reservation_ttl=60)
+        patcher = mock.patch('rest_API.checkout.get_inventory', return_value=self.inventory)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.product = self.products[0]
+
+    def test_reservation_limits_available_stock(self):
+        self.assertEqual(self.inventory.reserve(self.cart.id, self.product.id, 4), 1)
+        with self.assertRaises(ReservationError):
+            self.inventory.reserve(self.cart.id + 1, self.product.id, 2)
+        self.assertEqual(self.inventory.reserve(self.cart.id, self.product.id, 1), 4)
+        self.assertEqual(self.inventory.release_expired(now=time.time() + 120), 1)
+        self.assertEqual(self.inventory.available(self.product.id), 5)
+
+    def test_checkout_defers_database_update_until_flush(self):
+        response = self.confirm(2, quantity=3)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Product.objects.get(id=self.product.id).quantity, 5)
+        self.assertEqual(self.inventory.available(self.product.id), 2)
+        self.assertEqual(self.inventory.flush(), 2)
+        self.assertEqual(Product.objects.get(id=self.product.id).quantity, 2)
+        self.assertEqual(self.confirm(1, quantity=3).status_code, status.HTTP_409_CONFLICT)
+
+    def test_cart_reserves_stock(self):
+        with mock.patch('rest_API.carts.get_inventory', return_value=self.inventory):
+            response = self.client.post('/cart/', {'product': self.product.id, 'quantity': 4}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(self.inventory.available(self.product.id), 1)
+            response = self.client.post('/cart/', {'product': self.product.id, 'quantity': 6}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+            self.assertEqual(CartItem.objects.get().quantity, 4)
+            self.client.delete('/cart/')
+            self.assertEqual(self.inventory.available(self.product.id), 5)
+
+    def test_reconcile_repairs_drift(self):
+        self.inventory.load([self.product.id])
+        Product.objects.filter(id=self.product.id).update(quantity=50)
+        self.assertEqual(self.inventory.reconcile(), len(self.products))
+        self.assertEqual(self.inventory.available(self.product.id), 50)
+        self.assertEqual(self.inventory.reconcile(), 0)
+
+
+class ProductPaginationTest(CatalogCacheMixin, TestCase):
+    """
+    Проверяет keyset-пагинацию /products/ и параметр fields.
+    """
+    def setUp(self):
+        super().setUp()
+        supplier = Supplier.objects.create(name='Test Supplier')
+        Product.objects.bulk_create([
+            Product(title=f'Product {number}', description='x' * 1000, supplier=supplier,
+                    price=1000 - number, quantity=1, parameters={'n': number})
+            for number in range(7)
+        ])
+
+    def test_cursor_walks_all_pages_by_price(self):
+        prices = []
+        url = '/products/?ordering=price&page_size=3'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data['results']), 3)
+            prices += [float(item['price']) for item in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(prices, sorted(prices))
+        self.assertEqual(len(prices), 7)
+
+    def test_sparse_fieldset_narrows_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/products/?fields=id,title')
+        self.assertEqual(set(response.data['results'][0]), {'id', 'title'})
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('description', queries[0]['sql'])
+        self.assertEqual(self.client.get('/products/?fields=secret').status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ProductFacetFilterTest(CatalogCacheMixin, TestCase):
+    """
+    Проверяет фильтрацию каталога по атрибутам parameters и подсчет фасетов.
+    """
+    def setUp(self):
+        super().setUp()
+        supplier = Supplier.objects.create(name='Test Supplier')
+        rows = [('черный', 64, 100), ('черный', 256, 200), ('белый', 128, 300), ('красный', 512, 400)]
+        Product.objects.bulk_create([
+            Product(title=f'Phone {number}', description='', supplier=supplier, price=price, quantity=1,
+                    parameters={'Цвет': color, 'Встроенная память (Гб)': memory, 'Разрешение (пикс)': '1792x828'})
+            for number, (color, memory, price) in enumerate(rows)
+        ])
+
+    def titles(self, query):
+        response = self.client.get('/products/', query)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return sorted(item['title'] for item in response.data['results'])
+
+    def test_equality_range_and_price(self):
+        self.assertEqual(self.titles({'param.Цвет': 'черный,белый'}), ['Phone 0', 'Phone 1', 'Phone 2'])
+        self.assertEqual(self.titles({'param.Встроенная память (Гб)': '512'}), ['Phone 3'])
+        self.assertEqual(self.titles({'param.Встроенная память (Гб)__min': '128',
+                                      'param.Встроенная память (Гб)__max': '256'}), ['Phone 1', 'Phone 2'])
+        # Строковые значения не попадают в числовой диапазон
+        self.assertEqual(self.titles({'param.Разрешение (пикс)__min': '0'}), [])
+        self.assertEqual(self.titles({'param.Цвет': 'черный', 'price_min': '150'}), ['Phone 1'])
+        self.assertEqual(self.client.get('/products/', {'price_max': 'abc'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+    def test_facet_counts_in_one_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/products/facets/', {'price_max': '300'})
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(response.data['Цвет'], [{'value': 'черный', 'count': 2}, {'value': 'белый', 'count': 1}])
+        self.assertEqual(response.data['Разрешение (пикс)'], [{'value': '1792x828', 'count': 3}])
+        response = self.client.get('/products/facets/', {'keys': 'Цвет'})
+        self.assertEqual(list(response.data), ['Цвет'])
+
+
+class ProductSearchTest(CatalogCacheMixin, TestCase):
+    """
+    Проверяет полнотекстовый поиск: русская морфология, поиск по префиксу
+    и более высокий ранг совпадений в названии.
+    """
+    def setUp(self):
+        super().setUp()
+        supplier = Supplier.objects.create(name='Test Supplier')
+        Product.objects.create(title='Чехол для смартфона', description='Силиконовый, черный',
+                               supplier=supplier, price=500, quantity=10, parameters={})
+        Product.objects.create(title='Смартфон Apple iPhone XR', description='Подходит черный чехол',
+                               supplier=supplier, price=65000, quantity=3, parameters={})
+        Product.objects.create(title='Телевизор Samsung', description='', supplier=supplier,
+                               price=90000, quantity=1, parameters={})
+
+    def search(self, text):
+        response = self.client.get('/products/search/', {'q': text})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['title'] for item in response.data['results']]
+
+    def test_stemming_prefix_and_ranking(self):
+        self.assertEqual(len(self.search('смартфоны')), 2)
+        self.assertEqual(self.search('iph'), ['Смартфон Apple iPhone XR'])
+        # Совпадение в названии (вес A) выше совпадения в описании (вес B)
+        self.assertEqual(self.search('чехол')[0], 'Чехол для смартфона')
+        self.assertEqual(self.search('!!!'), [])
+        self.assertEqual(self.client.get('/products/search/').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_search_vector_follows_title_changes(self):
+        product = Product.objects.get(title='Телевизор Samsung')
+        product.title = 'Монитор Samsung'
+        product.save()
+        self.assertEqual(self.search('монитор'), ['Монитор Samsung'])
+        self.assertEqual(self.search('телевизор'), [])
+
+
+class CatalogCacheTest(CatalogCacheMixin, TestCase):
+    """
+    Проверяет кэширование ответов каталога: повторный запрос не обращается к базе,
+    ETag дает 304, а изменение товаров поставщика делает устаревшими только его ответы.
+    """
+    def setUp(self):
+        super().setUp()
+        self.supplier = Supplier.objects.create(name='Supplier A')
+        self.other = Supplier.objects.create(name='Supplier B')
+        self.product = Product.objects.create(title='Phone', description='', supplier=self.supplier,
+                                              price=100, quantity=1, parameters={})
+        Product.objects.create(title='TV', description='', supplier=self.other,
+                               price=200, quantity=1, parameters={})
+
+    def test_repeated_request_is_served_from_cache(self):
+        response = self.client.get('/products/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        with CaptureQueriesContext(connection) as queries:
+            cached = self.client.get('/products/')
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(cached['X-Cache'], 'HIT')
+        self.assertEqual(cached.json(), response.json())
+
+        not_modified = self.client.get('/products/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_change_invalidates_only_affected_supplier(self):
+        own = f'/products/?supplier={self.supplier.id}'
+        other = f'/products/?supplier={self.other.id}'
+        for url in (own, other, '/products/'):
+            self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.price = 150
+            self.product.save()
+
+        response = self.client.get(own)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(float(response.json()['results'][0]['price']), 150)
+        self.assertEqual(self.client.get('/products/')['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get(other)['X-Cache'], 'HIT')
+
+    @override_settings(CACHES={
+        **settings.CACHES,
+        'catalog': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'catalog-tests'},
+        'broken': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost:1/0'},
+    })
+    @mock.patch('rest_API.cache.GENERATION_RETRY_AFTER', 0)
+    def test_invalidation_during_outage_reaches_other_processes(self):
+        process = CatalogCache()  # кэш этого процесса; у другого процесса - свой экземпляр
+        with mock.patch('rest_API.cache.catalog_cache', process):
+            self.assertEqual(self.client.get('/products/')['X-Cache'], 'MISS')
+            self.assertEqual(self.client.get('/products/')['X-Cache'], 'HIT')
+
+            # Redis недоступен, пока товар меняется: версии меняются только локально
+            with mock.patch.object(process, 'primary', 'broken'), self.assertLogs('rest_API.cache', 'ERROR'):
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.product.price = 150
+                    self.product.save()
+                self.assertEqual(float(self.client.get('/products/').json()['results'][0]['price']), 150)
+
+            # Redis восстановлен: первое обращение процесса меняет общую версию
+            process.get('any')
+
+        # Другой процесс читает Redis и не видит страницу, сохраненную до изменения
+        with mock.patch('rest_API.cache.catalog_cache', CatalogCache()):
+            response = self.client.get('/products/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(float(response.json()['results'][0]['price']), 150)
+
+
+@override_settings(CACHES={
+    **settings.CACHES,
+    'auth': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'auth-tests'},
+    'broken': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost:1/0'},
+})
+class TokenCacheTest(TestCase):
+    """
+    Проверяет кэш токенов: повторный запрос не читает токен из базы, общий уровень
+    заполняет локальный, удаление токена и деактивация пользователя действуют сразу.
+    """
+    def setUp(self):
+        super().setUp()
+        token_cache.clear()
+        caches['auth'].clear()
+        self.user = User.objects.create_user(username='buyer', password='qwerty12345')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_repeated_requests_skip_token_query(self):
+        self.assertEqual(self.client.get('/contacts/').status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/contacts/').status_code, status.HTTP_200_OK)
+        token_cache.clear()  # другой процесс: пусто локально, есть в Redis
+        with self.assertNumQueries(1):
+            self.client.get('/contacts/')
+        self.assertEqual(token_cache.stats(), {'local_hits': 0, 'shared_hits': 1, 'misses': 0, 'hit_ratio': 1.0})
+
+    def test_invalidation(self):
+        self.client.get('/contacts/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.set_password('new-password-123')
+            self.user.save()
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get('/contacts/').status_code, status.HTTP_200_OK)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.client.get('/contacts/').status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.user.is_active = True
+        self.user.save()
+        self.client.get('/contacts/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.token.delete()
+        self.assertEqual(self.client.get('/contacts/').status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @mock.patch('rest_API.authentication.INVALIDATION_RETRY_AFTER', 0.2)
+    def test_revocation_during_outage_fails_closed(self):
+        shared_key = KEY_PREFIX + self.token.key
+        self.client.get('/contacts/')
+        with mock.patch.object(token_cache, 'alias', 'broken'), self.assertLogs('rest_API.authentication', 'ERROR'):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.token.delete()
+
+        # Redis снова доступен, в нем осталась запись отозванного токена, но процесс ее не читает
+        self.assertEqual(self.client.get('/contacts/').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIsNotNone(caches['auth'].get(shared_key))
+        # Повтор удаляет запись - другие процессы токен тоже не примут
+        time.sleep(0.25)
+        self.assertEqual(self.client.get('/contacts/').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIsNone(caches['auth'].get(shared_key))
+
+
+@override_settings(DATABASE_REPLICAS=['default'], CACHES={
+    **settings.CACHES,
+    'routing': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'routing-tests'},
+})
+class ReplicaRoutingTest(CatalogCacheMixin, TestCase):
+    """
+    Проверяет маршрутизацию чтений на реплику: каталог и заказы читаются с реплики,
+    после записи пользователь и после изменения товаров каталог читаются из основной базы.
+    Роль реплики играет сама основная база, поэтому проверяются решения маршрутизатора.
+    """
+    def setUp(self):
+        super().setUp()
+        pins.clear()
+        self.user = User.objects.create_user(username='buyer', password='qwerty12345')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.supplier = Supplier.objects.create(name='Test Supplier')
+        self.product = Product.objects.create(title='Phone', description='', supplier=self.supplier,
+                                              price=100, quantity=5, parameters={})
+
+    def routed(self, method, path, data=None, client=None):
+        before = routed_reads()
+        response = getattr(client or self.client, method)(path, data or {}, format='json')
+        self.assertLess(response.status_code, 400, f'{method} {path}: {response.status_code}')
+        after = routed_reads()
+        return {target: after.get(target, 0) - before.get(target, 0) for target in ('primary', 'replica')}
+
+    def test_reads_follow_writes_of_the_user(self):
+        for path in ('/products/', f'/products/{self.product.id}/', '/suppliers/', '/orders/', '/orders/summary/'):
+            self.assertGreater(self.routed('get', path)['replica'], 0, path)
+
+        self.routed('post', '/cart/', {'product': self.product.id, 'quantity': 1})
+        self.assertEqual(self.routed('get', '/orders/')['replica'], 0)
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user(username='other', password='qwerty12345'))
+        self.assertGreater(self.routed('get', '/orders/', client=other)['replica'], 0)
+
+        pins.clear()  # окно закрепления истекло
+        self.assertGreater(self.routed('get', '/orders/')['replica'], 0)
+
+    def test_catalog_changes_pin_changed_scopes(self):
+        other = Supplier.objects.create(name='Other Supplier')
+        pins.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.price = 150
+            self.product.save()
+        self.assertIsNone(choose_replica(None, [catalog_scope(supplier_scope(self.supplier.id))]))
+        self.assertEqual(self.routed('get', '/products/', {'_': 1})['replica'], 0)
+        self.assertEqual(self.routed('get', '/products/', {'supplier': self.supplier.id})['replica'], 0)
+        # Товары других поставщиков и список поставщиков не менялись
+        self.assertGreater(self.routed('get', '/products/', {'supplier': other.id})['replica'], 0)
+        self.assertGreater(self.routed('get', '/suppliers/')['replica'], 0)
+        self.assertGreater(self.routed('get', '/orders/')['replica'], 0)
+
+    def test_checkout_keeps_suppliers_on_replica(self):
+        contact = Contact.objects.create(user=self.user, fname='Ivan', lname='Ivanov', email='buyer@example.com',
+                                         phone='+70000000000', address='-')
+        self.routed('post', '/cart/', {'product': self.product.id, 'quantity': 1})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.routed('post', '/orders/confirm/', {'contact_id': contact.id})
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user(username='other', password='qwerty12345'))
+        self.assertEqual(self.routed('get', '/products/', client=other)['replica'], 0)
+        self.assertGreater(self.routed('get', '/suppliers/', client=other)['replica'], 0)
+
+    def test_admin_changelist(self):
+        admin_client = APIClient()
+        admin_client.force_login(User.objects.create_superuser(username='admin', password='qwerty12345'))
+        self.assertGreater(self.routed('get', '/admin/rest_API/product/', client=admin_client)['replica'], 0)
+
+    def test_writes_go_to_primary(self):
+        with replica_reads('replica'):
+            self.assertEqual(router.db_for_read(Product), 'replica')
+            self.assertEqual(router.db_for_write(Product, instance=self.product), 'default')
+        self.assertEqual(router.db_for_read(Product), 'default')
+
+    @override_settings(CACHES={
+        **settings.CACHES,
+        'routing': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost:1/0'},
+    })
+    def test_unavailable_pin_cache_reads_primary(self):
+        self.addCleanup(pins.clear)
+        with self.assertLogs('rest_API.replicas', 'WARNING'):
+            self.assertIsNone(choose_replica(self.user))
+        self.assertIsNone(choose_replica(self.user))
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_disabled_without_replicas(self):
+        self.assertIsNone(choose_replica(self.user))
+        self.assertEqual(self.routed('get', '/products/')['replica'], 0)
+
+    def test_benchmark_reduces_primary_reads(self):
+        results = {measurement.name: measurement for measurement in SCENARIOS['replica'](repeat=2, rows=20)}
+        self.assertGreater(results['replica-off'].queries, 0)
+        # Заказ закрепляет только общий список товаров, остальные чтения каталога остаются на реплике
+        self.assertLess(results['replica-on'].queries, results['replica-off'].queries * 2 / 3)
+
+
+class RequestMetricsTest(CatalogCacheMixin, TestCase):
+    """
+    Проверяет метрики запросов: гистограммы по маршрутам на /metrics/, журнал
+    медленных запросов с SQL и отключение замеров при нулевой доле.
+    """
+    def setUp(self):
+        super().setUp()
+        metrics.registry.reset()
+        supplier = Supplier.objects.create(name='Test Supplier')
+        Product.objects.create(title='Phone', description='', supplier=supplier, price=100, quantity=1, parameters={})
+
+    def test_route_histograms_are_exported(self):
+        self.client.get('/products/')
+        self.assertEqual(metrics.request_duration.count('product-list', 'GET'), 1)
+        self.assertEqual(metrics.requests_total.value('product-list', 'GET', '200'), 1)
+
+        response = self.client.get('/metrics/')
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode('utf-8')
+        self.assertIn('http_request_db_queries_count{route="product-list",method="GET"} 1', body)
+        self.assertIn('http_request_serializer_seconds_bucket{route="product-list",method="GET",le="+Inf"} 1', body)
+        self.assertIn('# TYPE auth_token_cache_lookups_total counter', body)
+
+    async def test_asgi_requests_count_sql(self):
+        product = await Product.objects.aget()
+        await self.async_client.get('/products/')
+        await self.async_client.get(f'/async/products/{product.pk}/')
+        body = metrics.registry.render()
+        self.assertIn('http_request_db_queries_sum{route="product-list",method="GET"} 1', body)
+        self.assertIn('http_request_db_queries_sum{route="async-product-detail",method="GET"} 1', body)
+
+    @override_settings(PERF_SLOW_REQUEST_MS=0)
+    def test_slow_request_log_contains_sql(self):
+        with self.assertLogs('rest_API.instrumentation', 'WARNING') as logs:
+            self.client.get('/products/')
+        self.assertIn('(product-list)', logs.output[0])
+        self.assertIn('FROM "rest_API_product"', logs.output[0])
+
+    @override_settings(PERF_METRICS_SAMPLE_RATE=0)
+    def test_disabled_sampling_records_nothing(self):
+        self.client.get('/products/')
+        self.assertEqual(metrics.request_duration.count('product-list', 'GET'), 0)
+
+
+class ApiQueryBudgetTest(QueryBudgetMixin, CatalogCacheMixin, TestCase):
+    """
+    Бюджеты SQL-запросов GET-эндпоинтов API. Бюджет не должен зависеть от объема данных,
+    поэтому проверка повторяется после добавления заказов и товаров.
+    Новый GET-эндпоинт роутера должен получить бюджет в QUERY_BUDGETS.
+    """
+    # имя маршрута -> (параметры запроса, бюджет)
+    QUERY_BUDGETS = {
+        'product-list': ({}, 1),
+        'product-detail': ({}, 1),
+        'product-facets': ({}, 1),
+        'product-search': ({'q': 'product'}, 1),
+        'product-history': ({}, 2),
+        'product-snapshot': ({'at': '2020-01-01T00:00:00Z'}, 2),
+        'supplier-list': ({}, 1),
+        'supplier-detail': ({}, 1),
+        'supplier-export': ({'output': 'yaml'}, 3),
+        'order-list': ({}, 2),
+        'order-list-expanded': ({'expand': 'product,contact_info'}, 2),
+        'order-detail': ({'expand': 'product'}, 2),
+        'order-summary': ({}, 1),
+        'cart': ({}, 2),
+        'contacts': ({}, 1),
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='buyer', password='qwerty12345')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.contact = Contact.objects.create(user=self.user, fname='Иван', lname='Иванов',
+                                              email='ivan@example.com', phone='+79000000000', address='Калуга')
+        self.supplier = Supplier.objects.create(name='Test Supplier')
+        self.seed(1)
+
+    def seed(self, count):
+        products = Product.objects.bulk_create([
+            Product(title=f'Product {number}', description='', supplier=self.supplier,
+                    price=100, quantity=5, parameters={'Цвет': 'черный'})
+            for number in range(count)
+        ])
+        orders = Order.objects.bulk_create([
+            Order(buyer=self.user, contact_info=self.contact, status='confirmed') for _ in range(count)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, quantity=1, price=product.price)
+            for order in orders for product in products
+        ])
+        CartItem.objects.bulk_create([CartItem(cart=get_cart(self.user), product=product, quantity=1)
+                                      for product in products])
+        catalog_cache.clear()
+
+    def paths(self):
+        product = Product.objects.order_by('id').first()
+        order = Order.objects.order_by('id').first()
+        return {
+            'product-list': '/products/',
+            'product-detail': f'/products/{product.id}/',
+            'product-facets': '/products/facets/',
+            'product-search': '/products/search/',
+            'product-history': f'/products/{product.id}/history/',
+            'product-snapshot': '/products/snapshot/',
+            'supplier-list': '/suppliers/',
+            'supplier-detail': f'/suppliers/{self.supplier.id}/',
+            'supplier-export': f'/suppliers/{self.supplier.id}/export/',
+            'order-list': '/orders/',
+            'order-list-expanded': '/orders/',
+            'order-detail': f'/orders/{order.id}/',
+            'order-summary': '/orders/summary/',
+            'cart': '/cart/',
+            'contacts': '/contacts/',
+        }
+
+    def test_router_get_routes_have_budgets(self):
+        routes = {
+            pattern.name for pattern in api_router.urls
+            if 'get' in getattr(pattern.callback, 'actions', {})
+        }
+        self.assertEqual(routes - set(self.QUERY_BUDGETS), set())
+
+    def test_endpoints_within_budget(self):
+        for count in (1, 10):
+            if count > 1:
+                self.seed(count)
+            paths = self.paths()
+            for name, (params, budget) in self.QUERY_BUDGETS.items():
+                with self.subTest(endpoint=name, rows=count):
+                    self.assertQueryBudget(budget, paths[name], params)
+
+    def test_expanded_order_items(self):
+        response = self.client.get('/orders/', {'expand': 'product,contact_info'})
+        item = response.data[0]['items'][0]
+        self.assertEqual(item['product']['title'], 'Product 0')
+        self.assertEqual(response.data[0]['contact_info']['email'], 'ivan@example.com')
+        self.assertEqual(self.client.get('/orders/', {'expand': 'buyer'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BenchmarkSuiteTest(CatalogCacheMixin, TestCase):
+    """
+    Проверяет сценарии бенчмарка на маленьких данных и сравнение с базовыми результатами.
+    """
+    def test_browse_and_import_scenarios(self):
+        browse = {measurement.name: measurement for measurement in SCENARIOS['browse'](repeat=2, rows=300)}
+        self.assertEqual(browse['browse-list'].queries, 1)
+        self.assertEqual(browse['browse-cached'].queries, 0)
+
+        imported = {measurement.name: measurement for measurement in SCENARIOS['import'](repeat=1, rows=50)}
+        self.assertEqual(imported['import-create'].rows, 50)
+        self.assertGreater(imported['import-sync'].rows_per_sec, 0)
+
+    def test_auth_measurement_names_match_baseline(self):
+        auth = {measurement.name: measurement for measurement in SCENARIOS['auth'](repeat=2)}
+        self.assertEqual(set(auth), {'auth-db', 'auth-cached'})
+        # Промах прогрева и два попадания
+        self.assertEqual(auth['auth-cached'].notes, ['попаданий в кэш токенов 67%'])
+
+    def test_regressions_against_baseline(self):
+        measurement = Measurement('browse-list', samples=[0.010, 0.012], queries=2)
+        baseline = {'browse-list': {**measurement.as_dict(), 'queries': 1}}
+        self.assertEqual(compare_with_baseline([measurement], baseline), ['browse-list: запросов 2 (было 1)'])
+
+        baseline['browse-list'].update(queries=2, p50=0.005)
+        self.assertEqual(compare_with_baseline([measurement], baseline), [])
+        self.assertEqual(len(compare_with_baseline([measurement], baseline, check_latency=True)), 1)
+        self.assertEqual(compare_with_baseline([measurement], baseline, tolerance=2, check_latency=True), [])
+
+        throughput = Measurement('import-sync', samples=[2.0], rows=1000)
+        baseline['import-sync'] = {**throughput.as_dict(), 'rows_per_sec': 1000}
+        self.assertEqual(compare_with_baseline([throughput], baseline), ['import-sync: 500 строк/с (было 1000)'])
+        self.assertEqual(compare_with_baseline([Measurement('new', samples=[1.0])], baseline), [])
+
+
+class ExplainIndexTest(CatalogCacheMixin, TestCase):
+    """
+    Проверяет планы запросов API на синтетических данных: запросы горячих путей
+    должны читать большие таблицы по индексам, без последовательного сканирования.
+    """
+    HOT_TABLES = ('rest_API_order', 'rest_API_orderitem', 'rest_API_ordersummary', 'rest_API_product',
+                  'rest_API_contact', 'rest_API_cart', 'rest_API_cartitem')
+
+    @classmethod
+    def setUpTestData(cls):
+        suppliers = [Supplier.objects.create(name=f'Supplier {number}') for number in range(3)]
+        for supplier in suppliers:
+            generate_catalog(supplier, 5000)
+        cls.supplier = suppliers[0]
+        cls.user = User.objects.get(id=generate_orders(cls.supplier, users=2000, orders_per_user=10)[0])
+        # Покупатели без заказов: контактов в магазине намного больше, чем заказов у одного покупателя.
+        # Секции заказов без статистики добавляют по строке к оценке, и на маленькой таблице
+        # контактов планировщик выбрал бы hash join вместо поиска по индексу
+        generate_orders(cls.supplier, users=10000, orders_per_user=0)
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def seq_scans(self, path, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path, params or {})
+        self.assertEqual(response.status_code, status.HTTP_200_OK, path)
+        scans = []
+        with connection.cursor() as cursor:
+            for query in queries:
+                if not query['sql'].startswith('SELECT'):
+                    continue
+                cursor.execute('EXPLAIN ' + query['sql'])
+                plan = '\n'.join(row[0] for row in cursor.fetchall())
+                scans += [f'{query["sql"]}\n{plan}' for table in self.HOT_TABLES if f'Seq Scan on "{table}"' in plan]
+        return scans
+
+    def test_hot_paths_use_indexes(self):
+        product = Product.objects.filter(supplier=self.supplier).order_by('id').first()
+        order = Order.objects.filter(buyer=self.user).first()
+        endpoints = [
+            ('/products/', None),
+            ('/products/', {'supplier': self.supplier.id}),
+            ('/products/', {'supplier': self.supplier.id, 'ordering': 'price'}),
+            (f'/products/{product.id}/', None),
+            ('/products/search/', {'q': 'смартфон'}),
+            ('/orders/', {'expand': 'product,contact_info'}),
+            ('/orders/', {'status': 'pending'}),
+            (f'/orders/{order.id}/', None),
+            ('/orders/summary/', None),
+            ('/cart/', None),
+            ('/contacts/', None),
+        ]
+        for path, params in endpoints:
+            with self.subTest(path=path, params=params):
+                self.assertEqual(self.seq_scans(path, params), [])
+
+    def test_composite_indexes_are_chosen(self):
+        orders = Order.objects.filter(buyer=self.user, status='pending').order_by('-created_timestamp')[:20]
+        # Индекс секционированной таблицы в плане называется по секции: <секция>_buyer_id_status_created_timestamp_idx
+        self.assertIn('buyer_id_status_created_timestamp_idx', orders.explain())
+        products = Product.objects.filter(supplier=self.supplier, is_active=True).order_by('price', 'id')[:50]
+        self.assertIn('product_active_sup_price_idx', products.explain())
+
+
+class AsyncCatalogTest(CatalogCacheMixin, TestCase):
+    """
+    Проверяет асинхронные эндпоинты каталога: потоковый JSON совпадает
+    с ответами синхронных представлений, страницы задаются параметром after.
+    """
+    def setUp(self):
+        super().setUp()
+        self.supplier = Supplier.objects.create(name='Test Supplier')
+        Product.objects.bulk_create([
+            Product(title=f'Смартфон {number}', description='', supplier=self.supplier,
+                    price=100 + number, quantity=1, parameters={'Цвет': 'черный'})
+            for number in range(5)
+        ])
+
+    async def get_json(self, path, params=None):
+        response = await self.async_client.get(path, params or {})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        if response.streaming:
+            return json.loads(b''.join([chunk async for chunk in response.streaming_content]))
+        return response.json()
+
+    async def test_list_pages_and_detail(self):
+        first = await self.get_json('/async/products/', {'page_size': 3})
+        self.assertEqual(len(first['results']), 3)
+        second = await self.get_json(first['next'])
+        self.assertEqual(len(second['results']), 2)
+        self.assertIsNone(second['next'])
+
+        product = first['results'][0]
+        sync = (await sync_to_async(self.client.get)(f'/products/{product["id"]}/')).json()
+        self.assertEqual(product, sync)
+        self.assertEqual(await self.get_json(f'/async/products/{product["id"]}/'), sync)
+        self.assertEqual((await self.async_client.get('/async/products/0/')).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual((await self.async_client.get('/async/products/', {'after': 'x'})).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+    async def test_search_and_suppliers(self):
+        results = (await self.get_json('/async/products/search/', {'q': 'смартфоны', 'limit': 2}))['results']
+        self.assertEqual(len(results), 2)
+        suppliers = (await self.get_json('/async/suppliers/'))['results']
+        self.assertEqual(suppliers, [{'id': self.supplier.id, 'name': 'Test Supplier', 'is_active': True}])
@@ -1,6 +1,8 @@
 from django.urls import path, include
 from django.contrib import admin
 from rest_framework.routers import DefaultRouter
+from . import async_views
+from .instrumentation import metrics_view
 from .views import ProductViewSet, OrderViewSet, SupplierViewSet, ContactView, OrderListView, RegisterView, ShoppingCartView
 from rest_framework.authtoken.views import obtain_auth_token
 from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
@@ -18,9 +20,16 @@ urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
     path('api-token-auth/', obtain_auth_token, name='api_token_auth'),
     path('cart/', ShoppingCartView.as_view(), name='cart'),
+    path('cart/<int:product_id>/', ShoppingCartView.as_view(), name='cart-item'),
     path('contacts/', ContactView.as_view(), name='contacts'),
     path('orders/', OrderListView.as_view(), name='order-list'),
     path('contacts/<int:contact_id>/', ContactView.as_view(), name='contact-delete'),
+    # Асинхронные эндпоинты каталога (ASGI), см. async_views.py
+    path('async/products/', async_views.product_list, name='async-product-list'),
+    path('async/products/search/', async_views.product_search, name='async-product-search'),
+    path('async/products/<int:pk>/', async_views.product_detail, name='async-product-detail'),
+    path('async/suppliers/', async_views.supplier_list, name='async-supplier-list'),
+    path('metrics/', metrics_view, name='metrics'),  # Prometheus, см. instrumentation.py
     path('', include(api_router.urls)),
     # drf-spectacular:
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),  # основная схема
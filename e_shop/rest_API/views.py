@@ -3,50 +3,68 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 import logging
 
-from .models import Product, Order, Supplier, OrderItem, Contact, Cart
+from .cache import ALL_PRODUCTS, SUPPLIERS, CachedResponseMixin, supplier_scope
+from .carts import CartError, ProductUnavailableError, cart_items, get_cart, remove_item, set_item
+from .checkout import CheckoutError, InsufficientStockError, checkout
+from .events import record_event
+from .export import CONTENT_TYPES, EXPORT_FORMATS, encode_export, export_filename, iter_export
+from .models import Product, Order, OrderEvent, OrderItem, Supplier, Contact, Cart
+from .filters import ProductFacetFilterBackend, facet_counts
+from .history import catalog_snapshot, product_history
+from .pagination import PriceHistoryCursorPagination, ProductCursorPagination, SnapshotCursorPagination
+from .replicas import ReplicaReadMixin, catalog_scope
+from .search import search_products
 from .serializers import (
     ProductSerializer, OrderSerializer, SupplierSerializer,
-    ContactSerializer, UserSerializer, CartSerializer
+    ContactSerializer, UserSerializer, CartSerializer, CartItemSerializer, CartItemWriteSerializer,
+    PriceHistorySerializer, PriceHistoryQuerySerializer, ProductSnapshotSerializer, SnapshotQuerySerializer,
+    OrderQuerySerializer
 )
-from .tasks import send_order_email
+from .summary import get_order_summary
 
 
 logger = logging.getLogger(__name__)
 
+SEARCH_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+
 
 class ShoppingCartView(APIView):
     """
-    Представление для управления корзиной покупок.
+    Представление для управления корзиной покупок (у пользователя одна корзина, см. carts.py).
 
-    GET: Возвращает список элементов корзины текущего пользователя.
-    POST: Добавляет или обновляет элемент корзины.
-    DELETE: Удаляет элемент корзины по ID.
+    GET: Возвращает корзину текущего пользователя с позициями.
+    POST: Добавляет товар в корзину или меняет его количество.
+    DELETE: Удаляет товар из корзины (/cart/<product_id>/) или очищает корзину (/cart/).
     """
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        cart_items = Cart.objects.filter(owner=request.user)
-        serializer = CartSerializer(cart_items, many=True)
+        cart = get_cart(request.user)
+        serializer = CartSerializer(cart, context={'items': list(cart_items(cart))})
         return Response(serializer.data)
 
     def post(self, request):
-        product_id = request.data.get('product')
-        quantity = int(request.data.get('quantity', 1))
-        product = get_object_or_404(Product, id=product_id)
-
-        cart_item, created = Cart.objects.get_or_create(owner=request.user, product=product)
-        cart_item.quantity = quantity
-        cart_item.save()
-
-        serializer = CartSerializer(cart_item)
+        data = CartItemWriteSerializer(data=request.data)
+        data.is_valid(raise_exception=True)
+        try:
+            item = set_item(get_cart(request.user), data.validated_data['product'], data.validated_data['quantity'])
+        except ProductUnavailableError as exc:
+            return Response({"error": exc.message, **exc.details}, status=status.HTTP_404_NOT_FOUND)
+        except CartError as exc:
+            return Response({"error": exc.message, **exc.details}, status=status.HTTP_409_CONFLICT)
+        serializer = CartItemSerializer(item)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-    def delete(self, request, cart_id):
-        cart_item = get_object_or_404(Cart, id=cart_id, owner=request.user)
-        cart_item.delete()
+    def delete(self, request, product_id=None):
+        remove_item(get_cart(request.user), product_id)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -67,89 +85,262 @@ class RegisterView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(ReplicaReadMixin, CachedResponseMixin, viewsets.ModelViewSet):
     """
     Представление для работы с товарами.
 
     Позволяет выполнять CRUD-операции, а также фильтровать товары по ID поставщика.
+    Деактивированные при синхронизации прайс-листа товары не отображаются.
+
+    Список отдается постранично (keyset-пагинация, параметры cursor, page_size, ordering).
+    Параметр fields=id,title,price сужает и вывод, и список выбираемых из БД колонок.
+    Фильтры по категории, цене и атрибутам - см. filters.py; /products/facets/ возвращает
+    число товаров по значениям атрибутов для тех же фильтров.
+    /products/search/?q=... - полнотекстовый поиск с сортировкой по релевантности.
+    /products/<id>/history/?since=&until= - история цены и остатка товара,
+    /products/snapshot/?at=...&supplier= - цены и остатки каталога на момент at (см. history.py).
+    GET-ответы кэшируются до изменения товаров (см. cache.py) и читаются с реплики (см. replicas.py).
     """
-    queryset = Product.objects.all()
+    queryset = Product.objects.filter(is_active=True).defer('search_vector')
     serializer_class = ProductSerializer
+    pagination_class = ProductCursorPagination
+    filter_backends = [ProductFacetFilterBackend]
+
+    def get_cache_scopes(self, request, kwargs):
+        # Список, отфильтрованный по поставщику, зависит только от его товаров
+        supplier_id = request.GET.get('supplier')
+        return [supplier_scope(supplier_id)] if supplier_id and 'pk' not in kwargs else [ALL_PRODUCTS]
+
+    def get_replica_pin_scopes(self, request):
+        # Ответ попадает в кэш каталога: пока его области закреплены, читаем из основной базы
+        return [catalog_scope(scope) for scope in self.get_cache_scopes(request, self.kwargs)]
+
+    def get_requested_fields(self):
+        raw = self.request.query_params.get('fields')
+        if not raw or self.action not in ('list', 'retrieve'):
+            return None
+        fields = [name.strip() for name in raw.split(',') if name.strip()]
+        unknown = set(fields) - set(ProductSerializer.Meta.fields)
+        if unknown:
+            raise ValidationError({'fields': f"Неизвестные поля: {', '.join(sorted(unknown))}"})
+        return fields
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = self.get_requested_fields()
+        return context
 
     def get_queryset(self):
+        queryset = self.queryset
         supplier_id = self.request.query_params.get('supplier')
         if supplier_id:
-            return self.queryset.filter(supplier_id=supplier_id)
-        return self.queryset
-
+            queryset = queryset.filter(supplier_id=supplier_id)
+        fields = self.get_requested_fields()
+        if fields:
+            # id и price нужны курсору пагинации, иначе каждая строка догружала бы их отдельным запросом
+            queryset = queryset.only('id', 'price', *fields)
+        return queryset
+
+    @action(detail=False, methods=['get'], url_path='facets')
+    def facets(self, request):
+        keys = [key for key in request.query_params.get('keys', '').split(',') if key]
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response(facet_counts(queryset, keys or None))
+
+    @action(detail=False, methods=['get'], url_path='search')
+    def search(self, request):
+        text = request.query_params.get('q', '').strip()
+        if not text:
+            return Response({"error": "Не указан поисковый запрос q"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(int(request.query_params.get('limit', SEARCH_LIMIT)), SEARCH_MAX_LIMIT)
+        except ValueError:
+            return Response({"error": "limit должен быть числом"}, status=status.HTTP_400_BAD_REQUEST)
+        queryset = search_products(self.filter_queryset(self.get_queryset()), text)[:max(limit, 1)]
+        serializer = self.get_serializer(queryset, many=True)
+        return Response({"results": serializer.data})
+
+    @action(detail=True, methods=['get'], url_path='history')
+    def history(self, request, pk=None):
+        params = PriceHistoryQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        # История доступна и для деактивированных товаров
+        product = get_object_or_404(Product.objects.only('id'), pk=pk)
+        paginator = PriceHistoryCursorPagination()
+        page = paginator.paginate_queryset(product_history(product.id, **params.validated_data), request, view=self)
+        return paginator.get_paginated_response(PriceHistorySerializer(page, many=True).data)
+
+    @action(detail=False, methods=['get'], url_path='snapshot')
+    def snapshot(self, request):
+        params = SnapshotQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        queryset = Product.objects.only('id', 'title', 'supplier', 'price', 'quantity')
+        if 'supplier' in params.validated_data:
+            queryset = queryset.filter(supplier_id=params.validated_data['supplier'])
+        paginator = SnapshotCursorPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        products = catalog_snapshot(page, params.validated_data['at'])
+        return paginator.get_paginated_response(ProductSnapshotSerializer(products, many=True).data)
+
+
+def order_queryset(user, expand=(), since=None):
+    """
+    Заказы пользователя для чтения: позиции (и при необходимости товары и контакт)
+    выбираются заранее, поэтому число запросов не зависит от числа заказов и позиций.
+    since ограничивает заказы и позиции по created_timestamp - тогда читаются только
+    секции таблиц начиная с этого месяца.
+    """
+    items = OrderItem.objects.only('id', 'order_id', 'product_id', 'quantity', 'price').order_by('id')
+    if 'product' in expand:
+        items = items.select_related('product').only(
+            'id', 'order_id', 'quantity', 'price', 'product__id', 'product__title', 'product__supplier_id'
+        )
+    orders = Order.objects.filter(buyer=user)
+    if since is not None:
+        items = items.filter(created_timestamp__gte=since)
+        orders = orders.filter(created_timestamp__gte=since)
+    orders = orders.prefetch_related(Prefetch('items', queryset=items))
+    if 'contact_info' in expand:
+        orders = orders.select_related('contact_info')
+    return orders.order_by('-created_timestamp', '-id')
+
+
+class OrderReadMixin(ReplicaReadMixin):
+    """
+    Общий путь чтения заказов для OrderViewSet и OrderListView.
+    Параметр expand=product,contact_info разворачивает связанные объекты, status - фильтр по статусу,
+    since - только заказы, созданные начиная с этого момента.
+    GET-запросы читаются с реплики, если пользователь недавно ничего не менял (см. replicas.py).
+    """
+    def get_expand(self):
+        raw = self.request.query_params.get('expand', '')
+        expand = {name.strip() for name in raw.split(',') if name.strip()}
+        unknown = expand - set(OrderSerializer.EXPANDABLE)
+        if unknown:
+            raise ValidationError({'expand': f"Неизвестные значения: {', '.join(sorted(unknown))}"})
+        return expand
 
-class OrderViewSet(viewsets.ModelViewSet):
+    def get_queryset(self):
+        params = OrderQuerySerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        orders = order_queryset(self.request.user, self.get_expand(), params.validated_data.get('since'))
+        order_status = self.request.query_params.get('status')
+        if order_status:
+            if order_status not in dict(Order.STATUS_CHOICES):
+                raise ValidationError({'status': 'Неверный статус'})
+            orders = orders.filter(status=order_status)
+        return orders
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['expand'] = self.get_expand()
+        return context
+
+
+class OrderViewSet(OrderReadMixin, viewsets.ModelViewSet):
     """
     Представление для управления заказами.
 
     GET: Возвращает заказы текущего пользователя.
+    GET (action summary): Возвращает сводку заказов пользователя.
     POST (action confirm): Подтверждает заказ, создавая заказ по данным корзины и контакта.
     PATCH (action update-status): Обновляет статус заказа.
     """
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
 
-    def get_queryset(self):
-        return Order.objects.filter(buyer=self.request.user)
-
     @action(detail=False, methods=['post'], url_path='confirm')
     def confirm_order(self, request):
         cart_id = request.data.get('cart_id')
         contact_id = request.data.get('contact_id')
         logger.debug(f"Confirm order request: cart_id={cart_id}, contact_id={contact_id}")
 
-        if not cart_id or not contact_id:
-            return Response({"error": "Необходимы ID корзины и контакта."}, status=status.HTTP_400_BAD_REQUEST)
+        if not contact_id:
+            return Response({"error": "Необходим ID контакта."}, status=status.HTTP_400_BAD_REQUEST)
 
-        cart = get_object_or_404(Cart, id=cart_id, owner=request.user)
+        # У пользователя одна корзина, cart_id можно не передавать
+        cart = get_object_or_404(Cart, id=cart_id, owner=request.user) if cart_id else get_cart(request.user)
         contact = get_object_or_404(Contact, id=contact_id, user=request.user)
-        logger.debug(f"Получена корзина: {cart}, получен контакт: {contact}")
-
-        order = Order.objects.create(buyer=request.user, contact_info=contact, status='confirmed')
-        for cart_item in cart.items.all():
-            logger.debug(f"Обработка элемента корзины: {cart_item}")
-            OrderItem.objects.create(
-                order=order,
-                product=cart_item.product,
-                quantity=cart_item.quantity,
-                price=cart_item.product.price
-            )
-
-        # Очищаем корзину после подтверждения заказа
-        cart.items.all().delete()
-        logger.debug(f"Корзина {cart_id} очищена после подтверждения заказа.")
-        # send_order_mail_confirm(order, contact.email)
-        send_order_email.delay(order.id, contact.email)
+
+        # Заказ создается, остатки списываются и корзина очищается в одной транзакции
+        try:
+            order = checkout(request.user, cart, contact)
+        except InsufficientStockError as exc:
+            return Response({"error": exc.message, "items": exc.details}, status=status.HTTP_409_CONFLICT)
+        except CheckoutError as exc:
+            return Response({"error": exc.message}, status=status.HTTP_400_BAD_REQUEST)
+        logger.debug(f"Корзина {cart.id} оформлена в заказ {order.id}.")
         return Response({"status": "Заказ успешно подтвержден", "order_id": order.id}, status=status.HTTP_201_CREATED)
 
+    @action(detail=False, methods=['get'], url_path='summary')
+    def summary(self, request):
+        """
+        Число заказов по статусам и сумма покупок (без отмененных) текущего пользователя.
+        """
+        return Response(get_order_summary(request.user))
+
     @action(detail=True, methods=['patch'], url_path='update-status')
     def update_status(self, request, pk=None):
-        order = get_object_or_404(Order, id=pk, buyer=request.user)
         new_status = request.data.get('status')
         if new_status not in dict(Order.STATUS_CHOICES):
             return Response({"error": "Неверный статус"}, status=status.HTTP_400_BAD_REQUEST)
-        order.status = new_status
-        order.save()
+        with transaction.atomic():
+            order = get_object_or_404(Order.objects.select_for_update(), id=pk, buyer=request.user)
+            old_status = order.status
+            order.status = new_status
+            order.save(update_fields=['status', 'updated_timestamp'])
+            if old_status != new_status:
+                record_event(order, OrderEvent.STATUS_CHANGED, old=old_status, new=new_status)
         return Response({"status": f"Статус заказа обновлен на {new_status}"}, status=status.HTTP_200_OK)
 
-    def retrieve(self, request, pk=None):
-        order = get_object_or_404(Order, id=pk, buyer=request.user)
-        serializer = OrderSerializer(order)
-        return Response(serializer.data)
 
-
-class SupplierViewSet(viewsets.ModelViewSet):
+class SupplierViewSet(ReplicaReadMixin, CachedResponseMixin, viewsets.ModelViewSet):
     """
     Представление для работы с поставщиками.
+
+    Параметр is_active=true|false отбирает активных или отключенных поставщиков.
+    GET-запросы читаются с реплики (см. replicas.py); потоковая выгрузка читает товары
+    уже после выхода из представления, поэтому - из основной базы.
     """
-    queryset = Supplier.objects.all()
+    queryset = Supplier.objects.order_by('id')
     serializer_class = SupplierSerializer
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        is_active = self.request.query_params.get('is_active')
+        if is_active in ('true', 'false'):
+            queryset = queryset.filter(is_active=is_active == 'true')
+        return queryset
+
+    def get_cache_scopes(self, request, kwargs):
+        # Выгрузка зависит от товаров поставщика; self.action здесь еще не задан
+        if self.action_map.get('get') == 'export':
+            return [SUPPLIERS, supplier_scope(kwargs['pk'])]
+        return [SUPPLIERS]
+
+    def get_replica_pin_scopes(self, request):
+        return [catalog_scope(scope) for scope in self.get_cache_scopes(request, self.kwargs)]
+
+    @action(detail=True, methods=['get'], url_path='export')
+    def export(self, request, pk=None):
+        """
+        Потоковая выгрузка активных товаров поставщика (см. export.py).
+        Параметры: output=jsonl|csv|yaml (по умолчанию jsonl), gzip=1 - сжать выгрузку.
+        """
+        export_format = request.query_params.get('output', 'jsonl')
+        if export_format not in EXPORT_FORMATS:
+            raise ValidationError({'output': f"Допустимые форматы: {', '.join(EXPORT_FORMATS)}"})
+        compress = request.query_params.get('gzip') in ('1', 'true')
+        supplier = self.get_object()
+        response = StreamingHttpResponse(
+            encode_export(iter_export(supplier, export_format), compress),
+            content_type='application/gzip' if compress else CONTENT_TYPES[export_format],
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="{export_filename(supplier, export_format, compress)}"'
+        )
+        return response
+
 
 class ContactView(APIView):
     """
@@ -188,12 +379,9 @@ class ContactView(APIView):
         return Response({"message": "Контакт успешно удален"}, status=status.HTTP_204_NO_CONTENT)
 
 
-class OrderListView(generics.ListAPIView):
+class OrderListView(OrderReadMixin, generics.ListAPIView):
     """
     Представление для получения списка заказов текущего пользователя.
     """
     permission_classes = [IsAuthenticated]
-    serializer_class = OrderSerializer
-
-    def get_queryset(self):
-        return Order.objects.filter(buyer=self.request.user)
\ No newline at end of file
+    serializer_class = OrderSerializer
\ No newline at end of file